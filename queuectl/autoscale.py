@@ -0,0 +1,128 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional
+
+
+def _host_load() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class Autoscaler:
+    
+    def __init__(self, manager, min_workers: int, max_workers: int):
+        if min_workers < 1 or max_workers < min_workers:
+            raise ValueError("Autoscale bounds must satisfy 1 <= min <= max")
+        
+        self.manager = manager
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        config = manager.config
+        self.interval = config.get("autoscale_interval", 5.0)
+        self.cooldown = config.get("autoscale_cooldown", 15.0)
+        self.backlog_per_worker = config.get("autoscale_backlog_per_worker", 2)
+        self.target_wait = config.get("autoscale_target_wait", 10.0)
+        self.max_load = config.get("autoscale_max_load", 0.9)
+        self.up_samples = 2
+        self.down_samples = 3
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.streak_direction = 0
+        self.streak = 0
+        self.last_change = float("-inf")
+        self.last_sample: Dict[str, object] = {}
+        self.decisions: Deque[Dict[str, object]] = deque(maxlen=20)
+    
+    def start(self):
+        if self.running:
+            return
+        
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.interval + 1)
+    
+    def _loop(self):
+        while self.running:
+            try:
+                self.evaluate()
+            except Exception as e:
+                print(f"Autoscaler error: {e}")
+            time.sleep(self.interval)
+    
+    def evaluate(self):
+        depth, oldest_wait = self.manager.storage.ready_stats()
+        load = _host_load()
+        current = self.manager.get_active_worker_count()
+        busy = len([w for w in self.manager.workers if w.running and w.current_job is not None])
+        
+        self.last_sample = {
+            "at": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "ready_depth": depth,
+            "oldest_wait": round(oldest_wait, 3),
+            "host_load": round(load, 3) if load is not None else None,
+            "workers": current,
+            "busy_workers": busy
+        }
+        
+        wanted = max(1, math.ceil(depth / self.backlog_per_worker))
+        overloaded = load is not None and load >= self.max_load
+        if current < self.max_workers and not overloaded and (
+            depth > current * self.backlog_per_worker or (depth and oldest_wait > self.target_wait)
+        ):
+            direction = 1
+            reason = f"backlog {depth}, oldest wait {oldest_wait:.1f}s"
+        elif current > self.min_workers and (overloaded or (depth == 0 and busy < current)):
+            direction = -1
+            reason = f"host load {load:.2f}" if overloaded else "queue drained"
+        else:
+            direction = 0
+            reason = ""
+        
+        # Hysteresis: a direction has to persist for several samples, and no
+        # change happens within the cooldown that follows the previous one.
+        if direction != self.streak_direction:
+            self.streak_direction = direction
+            self.streak = 0
+        self.streak += 1
+        
+        if direction == 0 or time.monotonic() - self.last_change < self.cooldown:
+            return
+        if self.streak < (self.up_samples if direction > 0 else self.down_samples):
+            return
+        
+        if direction > 0:
+            target = min(self.max_workers, max(current + 1, min(wanted, current * 2)))
+            self.manager.add_workers(target - current)
+        else:
+            target = current - 1
+            self.manager.retire_workers(1)
+        
+        self.last_change = time.monotonic()
+        self.streak = 0
+        self.decisions.append({
+            "at": self.last_sample["at"],
+            "from": current,
+            "to": target,
+            "reason": reason
+        })
+        print(f"Autoscale: {current} -> {target} worker(s) ({reason})")
+    
+    def status(self) -> Dict[str, object]:
+        return {
+            "enabled": self.running,
+            "min": self.min_workers,
+            "max": self.max_workers,
+            "last_sample": self.last_sample,
+            "decisions": list(self.decisions)
+        }
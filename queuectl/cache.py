@@ -0,0 +1,154 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .commit import FileLock, atomic_write
+
+# Lookups only count hits and misses in memory; the counters reach the file
+# with the next put, at most this many seconds later, or at exit.
+COUNTER_FLUSH_INTERVAL = 10.0
+
+# Environment variables that can change what a command does. Everything else
+# (terminal, shell level, session ids) differs between shells and restarts
+# and would make every lookup miss.
+KEY_ENV_VARS = ("PATH", "HOME", "USER", "SHELL", "LANG", "LC_ALL", "LC_CTYPE", "TZ", "PYTHONPATH")
+
+_caches: "weakref.WeakSet[ResultCache]" = weakref.WeakSet()
+
+
+class ResultCache:
+    
+    def __init__(self, cache_path: str = "results_cache.json", max_entries: int = 1000):
+        self.cache_path = Path(cache_path)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # Held from the re-read to the rename, so workers in other processes
+        # never write over each other's entries and counts.
+        self.file_lock = FileLock(self.cache_path.with_suffix(".lock"))
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._unsaved_entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._unsaved_hits = 0
+        self._unsaved_misses = 0
+        self._saved_at = time.monotonic()
+        self._stamp = None
+        self._load()
+        _caches.add(self)
+    
+    @staticmethod
+    def key_for(command: str) -> str:
+        # The same command can behave differently in another directory or
+        # environment, so both are part of the cache key.
+        fingerprint = json.dumps({
+            "command": command,
+            "cwd": os.getcwd(),
+            "env": [(name, os.environ.get(name)) for name in KEY_ENV_VARS]
+        })
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+    
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.cache_path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def _load(self, force: bool = False):
+        stamp = self._file_stamp()
+        if stamp == self._stamp and not force:
+            return
+        data = {}
+        if stamp:
+            try:
+                with open(self.cache_path, 'r') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                data = {}
+        self.entries = data.get("entries", {})
+        self.entries.update(self._unsaved_entries)
+        self.hits = data.get("hits", 0) + self._unsaved_hits
+        self.misses = data.get("misses", 0) + self._unsaved_misses
+        self._stamp = stamp
+    
+    def _save(self):
+        # Merges this process's new entries and counts into the file as it
+        # is now, not as it was when last read.
+        with self.file_lock:
+            self._load(force=True)
+            self._evict()
+            data = {"hits": self.hits, "misses": self.misses, "entries": self.entries}
+            try:
+                atomic_write(self.cache_path, json.dumps(data), sync=False)
+            except OSError as e:
+                raise RuntimeError(f"Failed to save result cache: {e}")
+            self._stamp = self._file_stamp()
+        self._unsaved_entries = {}
+        self._unsaved_hits = 0
+        self._unsaved_misses = 0
+        self._saved_at = time.monotonic()
+    
+    def _evict(self):
+        now = time.time()
+        self.entries = {key: entry for key, entry in self.entries.items() if entry["expires_at"] > now}
+        if len(self.entries) > self.max_entries:
+            newest = sorted(self.entries.items(), key=lambda item: item[1]["stored_at"], reverse=True)
+            self.entries = dict(newest[:self.max_entries])
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry and entry["expires_at"] > time.time():
+                self.hits += 1
+                self._unsaved_hits += 1
+            else:
+                entry = None
+                self.misses += 1
+                self._unsaved_misses += 1
+            if time.monotonic() - self._saved_at >= COUNTER_FLUSH_INTERVAL:
+                self._save()
+            return entry
+    
+    def flush(self):
+        with self.lock:
+            if self._unsaved_hits or self._unsaved_misses or self._unsaved_entries:
+                self._save()
+    
+    def put(self, key: str, result: Dict[str, Any], ttl: float):
+        with self.lock:
+            now = time.time()
+            self._unsaved_entries[key] = {
+                "stdout": result.get("stdout"),
+                "stderr": result.get("stderr"),
+                "execution_time": result.get("execution_time"),
+                "stored_at": now,
+                "expires_at": now + ttl
+            }
+            self._save()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            self._load()
+            now = time.time()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0,
+                "entries": len([e for e in self.entries.values() if e["expires_at"] > now])
+            }
+
+
+@atexit.register
+def _flush_all():
+    for cache in list(_caches):
+        try:
+            cache.flush()
+        except RuntimeError as e:
+            print(f"Warning: {e}")
@@ -1,14 +1,39 @@
 import json
 import sys
+import time
 import click
-from .storage import JobStorage
 from .models import Job, JobState
-from .worker import WorkerManager
-from .config import Config
 
-storage = JobStorage()
-app_config = Config()
-worker_manager = WorkerManager(storage, app_config)
+# Storage, config and the worker manager are built on first use, and the
+# modules behind them imported lazily, so that commands such as `--help` or
+# `config show` never touch the job store.
+_app_config = None
+_storage = None
+_worker_manager = None
+
+
+def get_config():
+    global _app_config
+    if _app_config is None:
+        from .config import Config
+        _app_config = Config()
+    return _app_config
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        from .storage import open_storage
+        _storage = open_storage(get_config())
+    return _storage
+
+
+def get_worker_manager():
+    global _worker_manager
+    if _worker_manager is None:
+        from .worker import WorkerManager
+        _worker_manager = WorkerManager(get_storage(), get_config())
+    return _worker_manager
 
 
 @click.group()
@@ -27,7 +52,7 @@ def enqueue(job_data):
             click.echo("Error: Job must have 'id' and 'command' fields", err=True)
             sys.exit(1)
         
-        existing_job = storage.get_job(job_dict["id"])
+        existing_job = get_storage().get_job(job_dict["id"])
         if existing_job:
             click.echo(f"Error: Job with id '{job_dict['id']}' already exists", err=True)
             sys.exit(1)
@@ -35,13 +60,30 @@ def enqueue(job_data):
         job = Job(
             job_id=job_dict["id"],
             command=job_dict["command"],
-            max_retries=job_dict.get("max_retries", app_config.get("max_retries", 3)),
+            max_retries=job_dict.get("max_retries", get_config().get("max_retries", 3)),
             priority=job_dict.get("priority", 5),
-            run_at=job_dict.get("run_at")
+            run_at=job_dict.get("run_at"),
+            idempotency_key=job_dict.get("idempotency_key"),
+            cache_ttl=job_dict.get("cache_ttl"),
+            depends_on=job_dict.get("depends_on"),
+            limits=job_dict.get("limits"),
+            retry_policy=job_dict.get("retry_policy"),
+            items=job_dict.get("items"),
+            item_mode=job_dict.get("item_mode"),
+            batch_size=job_dict.get("batch_size")
         )
+        if "items_file" in job_dict:
+            with open(job_dict["items_file"]) as f:
+                job.items = [line.rstrip("\n") for line in f if line.strip()]
         
-        storage.save_job(job)
-        click.echo(f"Job '{job.id}' enqueued successfully")
+        from .retry import RetryPolicy
+        RetryPolicy.for_job(job, get_config())
+        
+        job, created = get_storage().enqueue_job(job)
+        if created:
+            click.echo(f"Job '{job.id}' enqueued successfully")
+        else:
+            click.echo(f"Job collapsed onto in-flight job '{job.id}' (idempotency key '{job.idempotency_key}')")
     
     except json.JSONDecodeError:
         click.echo("Error: Invalid JSON format", err=True)
@@ -59,67 +101,279 @@ def worker():
 
 @worker.command()
 @click.option('--count', default=1, type=int, help='Number of workers to start')
-def start(count):
+@click.option('--min', 'min_workers', type=int, help='Autoscale: minimum number of workers')
+@click.option('--max', 'max_workers', type=int, help='Autoscale: maximum number of workers')
+@click.option('--remote', help='Pull jobs from a queuectl web server, e.g. http://host:5000')
+def start(count, min_workers, max_workers, remote):
+    if remote:
+        from .remote import RemoteStorage
+        from .worker import WorkerManager
+        # Remote workers serve another machine's queue, so any number of them
+        # may run here, next to local ones. They leave the supervisor socket
+        # and pid file to the local workers and are stopped with Ctrl+C.
+        worker_manager = WorkerManager(RemoteStorage(remote), get_config(), pid_file=None, socket_path=None)
+    else:
+        worker_manager = get_worker_manager()
     if count < 1:
         click.echo("Error: Worker count must be at least 1", err=True)
         sys.exit(1)
     
-    worker_manager.start_workers(count)
+    if min_workers is not None or max_workers is not None:
+        min_workers = min_workers if min_workers is not None else 1
+        max_workers = max_workers if max_workers is not None else max(min_workers, count)
+        if min_workers < 1 or max_workers < min_workers:
+            click.echo("Error: Autoscale bounds must satisfy 1 <= --min <= --max", err=True)
+            sys.exit(1)
+    
+    try:
+        if min_workers is not None:
+            worker_manager.start_autoscale(min_workers, max_workers)
+        else:
+            worker_manager.start_workers(count)
+    except (RuntimeError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    # SIGTERM (from kill, systemd or a container runtime) shuts down like
+    # Ctrl+C, so the socket, pid file and scheduler lock are cleaned up.
+    import signal
+    
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    
+    signal.signal(signal.SIGTERM, terminate)
     
+    # Runs until interrupted, or until `worker stop`/`worker drain` reach the
+    # supervisor from another process.
     try:
-        while worker_manager.running:
-            import time
-            time.sleep(1)
+        while not worker_manager.stopped.wait(1):
+            pass
     except KeyboardInterrupt:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
         worker_manager.stop_workers()
 
 
+def _send_supervisor(command, **params):
+    from .supervisor import send_command
+    try:
+        return send_command(command, **params)
+    except RuntimeError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+
+def _echo_reply(reply):
+    if "error" in reply:
+        click.echo(f"Error: {reply['error']}", err=True)
+        sys.exit(1)
+    click.echo(reply["message"])
+
+
 @worker.command()
 def stop():
-    worker_manager.stop_workers()
+    from .supervisor import supported
+    reply = _send_supervisor("stop")
+    if reply is not None:
+        _echo_reply(reply)
+        return
+    
+    from pathlib import Path
+    pid_file = Path("worker.pid")
+    if supported():
+        # Every running supervisor answers on its socket and holds a lock on
+        # the pid file, so a socket or unlocked pid file still here was left
+        # by one that crashed. Its pid may belong to an unrelated process by
+        # now, so nothing is signalled.
+        from .commit import try_lock_file, unlock_file
+        stale_pid_file = pid_file.exists()
+        fd = try_lock_file(pid_file)
+        if fd is None:
+            click.echo("Error: Workers are still starting up; try again in a moment", err=True)
+            sys.exit(1)
+        removed = _remove_files([Path("worker.sock")])
+        unlock_file(pid_file, fd)
+        if removed or stale_pid_file:
+            click.echo("No workers are running (removed stale worker files)")
+        else:
+            click.echo("No workers are running")
+        return
+    
+    # Without unix sockets the pid file says which process to interrupt,
+    # once that process is confirmed to still be queuectl.
+    import os
+    import signal
+    try:
+        pid = int(pid_file.read_text().strip())
+    except (FileNotFoundError, ValueError):
+        click.echo("No workers are running")
+        return
+    running = _is_queuectl_process(pid)
+    if running is None:
+        click.echo(f"Error: Cannot tell whether process {pid} is still a worker; stop it with Ctrl+C", err=True)
+        sys.exit(1)
+    if not running:
+        _remove_files([pid_file])
+        click.echo("No workers are running (removed a stale pid file)")
+        return
+    try:
+        os.kill(pid, signal.SIGINT)
+    except ProcessLookupError:
+        _remove_files([pid_file])
+        click.echo("No workers are running (removed a stale pid file)")
+    except PermissionError:
+        click.echo(f"Error: Not allowed to signal worker process {pid}", err=True)
+        sys.exit(1)
+    else:
+        click.echo(f"Sent an interrupt to worker process {pid}")
+
+
+def _remove_files(paths) -> bool:
+    removed = False
+    for path in paths:
+        try:
+            path.unlink()
+            removed = True
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _is_queuectl_process(pid):
+    # Pids are reused, so a pid file that outlived its worker can name any
+    # process. None where there is no /proc to check against.
+    from pathlib import Path
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    try:
+        cmdline = (proc / str(pid) / "cmdline").read_bytes()
+    except OSError:
+        return False
+    return b"queuectl" in cmdline
+
+
+@worker.command()
+def drain():
+    """Stop claiming jobs and exit once running jobs finish"""
+    reply = _send_supervisor("drain")
+    if reply is None:
+        click.echo("No workers are running")
+        return
+    _echo_reply(reply)
+
+
+@worker.command()
+@click.argument('count', type=int)
+def scale(count):
+    """Change the number of running workers"""
+    reply = _send_supervisor("scale", count=count)
+    if reply is None:
+        click.echo("No workers are running")
+        return
+    _echo_reply(reply)
+
+
+@worker.command()
+def stats():
+    """Show what each running worker is doing"""
+    reply = _send_supervisor("stats")
+    if reply is None:
+        click.echo("No workers are running")
+        return
+    if "error" in reply:
+        _echo_reply(reply)
+    
+    click.echo(f"Supervisor PID: {reply['pid']}")
+    if reply.get("autoscale"):
+        autoscale = reply["autoscale"]
+        click.echo(f"Autoscaling: {autoscale['min']}-{autoscale['max']} worker(s)")
+    click.echo(f"{'Worker':<8} {'State':<9} {'Current Job':<38} {'Done':>6} {'Failed':>6} {'Busy':>6} {'Claim ms':>9} {'p95 ms':>8}")
+    click.echo("-" * 97)
+    for stat in reply["workers"] + reply["retiring"]:
+        current = stat["current_job"] or "-"
+        if stat["current_job"]:
+            current = f"{current[:28]} ({stat['current_job_seconds']:.0f}s)"
+        latency = stat["claim_latency_ms"]
+        mean = f"{latency['mean']:.1f}" if latency["mean"] is not None else "-"
+        p95 = f"{latency['p95']:.1f}" if latency["p95"] is not None else "-"
+        click.echo(
+            f"{stat['id']:<8} {stat['state']:<9} {current:<38} {stat['jobs_done']:>6} {stat['jobs_failed']:>6} "
+            f"{stat['busy_fraction'] * 100:>5.0f}% {mean:>9} {p95:>8}"
+        )
 
 
 @cli.command()
 def status():
-    all_jobs = storage.get_all_jobs()
-    
-    counts = {
-        "pending": 0,
-        "processing": 0,
-        "completed": 0,
-        "failed": 0,
-        "dead": 0
-    }
-    
-    for job in all_jobs:
-        counts[job.state.value] = counts.get(job.state.value, 0) + 1
+    storage = get_storage()
+    counts = storage.count_by_state()
     
     click.echo("=== Queue Status ===")
-    click.echo(f"Total Jobs: {len(all_jobs)}")
+    click.echo(f"Total Jobs: {sum(counts.values())}")
     click.echo(f"Pending: {counts['pending']}")
     click.echo(f"Processing: {counts['processing']}")
     click.echo(f"Completed: {counts['completed']}")
     click.echo(f"Failed: {counts['failed']}")
     click.echo(f"Dead (DLQ): {counts['dead']}")
-    click.echo(f"Active Workers: {worker_manager.get_active_worker_count()}")
+    from .supervisor import send_command
+    try:
+        workers = send_command("stats")
+    except RuntimeError:
+        workers = None
+    if workers and "error" not in workers:
+        click.echo(f"Active Workers: {workers['active_count']} (pid {workers['pid']})")
+    else:
+        click.echo("Active Workers: 0")
+    
+    if storage.backend == "wal":
+        stats = storage.backend_stats()
+        click.echo(f"WAL Replay: {int(stats['replayed_records'])} records in {stats['replay_seconds'] * 1000:.1f}ms")
+        click.echo(f"WAL Records Since Snapshot: {int(stats['log_records'])}")
 
 
 @cli.command()
 @click.option('--state', type=click.Choice(['pending', 'processing', 'completed', 'failed', 'dead']), 
               help='Filter jobs by state')
-def list(state):
-    if state:
+@click.option('--graph', is_flag=True, help='Render job dependencies as a tree')
+@click.option('--search', help='Only jobs whose command or error message contains this text')
+@click.option('--since', help='Only jobs created (or completed, with --by completed) at or after this ISO 8601 time')
+@click.option('--until', help='Only jobs created (or completed, with --by completed) at or before this ISO 8601 time')
+@click.option('--by', 'time_field', type=click.Choice(['created', 'completed']), default='created',
+              help='Timestamp that --since/--until filter on')
+@click.option('--limit', type=int, help='Show at most this many jobs')
+def list(state, graph, search, since, until, time_field, limit):
+    if graph:
+        _render_graph(get_storage().get_all_jobs(), state)
+        return
+    
+    # The search index is only needed to search or filter by time; a plain
+    # listing reads the store directly.
+    if search or since or until:
+        try:
+            jobs = get_storage().search_jobs(
+                text=search,
+                states=[JobState(state)] if state else None,
+                since=since,
+                until=until,
+                time_field=f"{time_field}_at",
+                limit=limit
+            )
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+    elif limit:
+        _, jobs = get_storage().page_jobs([JobState(state)] if state else None, 0, limit)
+    elif state:
         state_enum = JobState(state)
-        jobs = storage.get_jobs_by_state(state_enum)
+        jobs = get_storage().get_jobs_by_state(state_enum)
+        jobs.sort(key=lambda j: j.created_at)
     else:
-        jobs = storage.get_all_jobs()
+        jobs = get_storage().get_all_jobs()
+        jobs.sort(key=lambda j: j.created_at)
     
     if not jobs:
         click.echo("No jobs found")
         return
     
-    jobs.sort(key=lambda j: j.created_at)
-    
     click.echo(f"\n{'ID':<20} {'State':<12} {'Attempts':<10} {'Command':<40}")
     click.echo("-" * 82)
     
@@ -128,6 +382,58 @@ def list(state):
         click.echo(f"{job.id:<20} {job.state.value:<12} {job.attempts}/{job.max_retries:<9} {command_preview:<40}")
 
 
+def _render_graph(jobs, state=None):
+    by_id = {job.id: job for job in jobs}
+    children = {}
+    for job in sorted(jobs, key=lambda j: j.created_at):
+        for parent_id in job.depends_on:
+            if parent_id in by_id:
+                children.setdefault(parent_id, []).append(job.id)
+    
+    in_graph = {job.id for job in jobs if job.depends_on} | children.keys()
+    roots = [
+        job for job in sorted(jobs, key=lambda j: j.created_at)
+        if job.id in in_graph and not any(p in by_id for p in job.depends_on)
+    ]
+    
+    def subtree(job_id, seen):
+        ids = {job_id}
+        for child_id in children.get(job_id, []):
+            if child_id not in seen:
+                ids |= subtree(child_id, seen | {job_id})
+        return ids
+    
+    if state:
+        roots = [root for root in roots if any(by_id[i].state.value == state for i in subtree(root.id, frozenset()))]
+    
+    if not roots:
+        click.echo("No job dependencies found")
+        return
+    
+    expanded = {}
+    
+    def label(job):
+        text = f"{job.id} [{job.state.value}]"
+        if job.state == JobState.PENDING and job.unmet_dependencies:
+            text += f" waiting on {job.unmet_dependencies}"
+        return text
+    
+    def render(job_id, prefix, connector, child_prefix):
+        job = by_id[job_id]
+        if job_id in expanded:
+            click.echo(f"{prefix}{connector}{label(job)} (see above)")
+            return
+        expanded[job_id] = True
+        click.echo(f"{prefix}{connector}{label(job)}")
+        kids = children.get(job_id, [])
+        for i, child_id in enumerate(kids):
+            last = i == len(kids) - 1
+            render(child_id, prefix + child_prefix, "└── " if last else "├── ", "    " if last else "│   ")
+    
+    for root in roots:
+        render(root.id, "", "", "")
+
+
 @cli.group()
 def dlq():
     pass
@@ -135,7 +441,7 @@ def dlq():
 
 @dlq.command()
 def list():
-    dead_jobs = storage.get_dead_jobs()
+    dead_jobs = get_storage().get_dead_jobs()
     
     if not dead_jobs:
         click.echo("No jobs in Dead Letter Queue")
@@ -154,9 +460,29 @@ def list():
 
 
 @dlq.command()
-@click.argument('job_id', type=str)
-def retry(job_id):
-    job = storage.get_job(job_id)
+@click.argument('job_id', type=str, required=False)
+@click.option('--all', 'retry_all', is_flag=True, help='Retry every matching job in the DLQ')
+@click.option('--error-contains', help='Only jobs whose error message contains this text')
+@click.option('--since', help='Only jobs that failed at or after this ISO 8601 time')
+@click.option('--until', help='Only jobs that failed at or before this ISO 8601 time')
+@click.option('--rate', type=float, help='Make requeued jobs ready at this many jobs per second')
+def retry(job_id, retry_all, error_contains, since, until, rate):
+    if not job_id:
+        if not (retry_all or error_contains or since or until):
+            click.echo("Error: Give a job id, --all or a filter", err=True)
+            sys.exit(1)
+        if rate is not None and rate <= 0:
+            click.echo("Error: --rate must be positive", err=True)
+            sys.exit(1)
+        try:
+            retried = get_storage().retry_dead_jobs(error_contains=error_contains, since=since, until=until, rate=rate)
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+        click.echo(f"Moved {len(retried)} job(s) back to queue for retry")
+        return
+    
+    job = get_storage().get_job(job_id)
     
     if not job:
         click.echo(f"Error: Job '{job_id}' not found", err=True)
@@ -166,16 +492,54 @@ def retry(job_id):
         click.echo(f"Error: Job '{job_id}' is not in Dead Letter Queue", err=True)
         sys.exit(1)
     
-    job.state = JobState.PENDING
-    job.attempts = 0
-    job.error_message = None
-    job.next_retry_at = None
-    job.updated_at = job._now()
-    
-    storage.save_job(job)
+    if not get_storage().retry_dead_jobs(job_ids=[job_id]):
+        click.echo(f"Error: Job '{job_id}' changed while it was being retried", err=True)
+        sys.exit(1)
     click.echo(f"Job '{job_id}' moved back to queue for retry")
 
 
+@dlq.command()
+@click.option('--error-contains', help='Only jobs whose error message contains this text')
+@click.option('--since', help='Only jobs that failed at or after this ISO 8601 time')
+@click.option('--until', help='Only jobs that failed at or before this ISO 8601 time')
+@click.option('--older-than', help='Only jobs that failed longer ago than this, e.g. 7d or 12h')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+def purge(error_contains, since, until, older_than, yes):
+    _bulk_delete([JobState.DEAD], error_contains, since, until, older_than, yes)
+
+
+def _bulk_filters(states, error_contains, since, until, older_than):
+    from .storage import parse_duration
+    try:
+        return {
+            "states": states,
+            "error_contains": error_contains,
+            "since": since,
+            "until": until,
+            "older_than": parse_duration(older_than) if older_than else None
+        }
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+
+def _bulk_delete(states, error_contains, since, until, older_than, yes):
+    filters = _bulk_filters(states, error_contains, since, until, older_than)
+    try:
+        count = len(get_storage().select_jobs(**filters))
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    if not count:
+        click.echo("No matching jobs")
+        return
+    if not yes and not click.confirm(f"Delete {count} job(s)?"):
+        return
+    
+    deleted = get_storage().delete_jobs(**filters)
+    click.echo(f"Deleted {len(deleted)} job(s)")
+
+
 @cli.group()
 def config():
     pass
@@ -185,26 +549,8 @@ def config():
 @click.argument('key', type=str)
 @click.argument('value', type=str)
 def set(key, value):
-    key_map = {
-        "max-retries": "max_retries",
-        "backoff-base": "backoff_base",
-        "worker-poll-interval": "worker_poll_interval",
-        "job-timeout": "job_timeout"
-    }
-    
-    internal_key = key_map.get(key, key)
-    
-    try:
-        if internal_key in ["max_retries", "job_timeout"]:
-            value = int(value)
-        elif internal_key in ["backoff_base", "worker_poll_interval"]:
-            value = float(value)
-    except ValueError:
-        click.echo(f"Error: Invalid value type for '{key}'", err=True)
-        sys.exit(1)
-    
     try:
-        app_config.set(internal_key, value)
+        _, value = get_config().set_option(key, value)
         click.echo(f"Configuration '{key}' set to {value}")
     except ValueError as e:
         click.echo(f"Error: {e}", err=True)
@@ -213,20 +559,13 @@ def set(key, value):
 
 @config.command()
 def show():
-    all_config = app_config.get_all()
+    all_config = get_config().get_all()
     click.echo("Current Configuration:")
     click.echo("-" * 40)
     
-    key_map = {
-        "max_retries": "max-retries",
-        "backoff_base": "backoff-base",
-        "worker_poll_interval": "worker-poll-interval",
-        "job_timeout": "job-timeout"
-    }
-    
+    from .config import display_key
     for key, value in all_config.items():
-        display_key = key_map.get(key, key)
-        click.echo(f"{display_key}: {value}")
+        click.echo(f"{display_key(key)}: {value}")
 
 
 @cli.group()
@@ -241,7 +580,7 @@ def job():
 @click.option('--stderr', is_flag=True, help='Show stderr only')
 def output(job_id, stdout, stderr):
     """View job output (stdout/stderr)"""
-    job = storage.get_job(job_id)
+    job = get_storage().get_job(job_id)
     if not job:
         click.echo(f"Error: Job '{job_id}' not found", err=True)
         sys.exit(1)
@@ -272,10 +611,264 @@ def output(job_id, stdout, stderr):
             click.echo("(no output available)")
 
 
+@job.command()
+@click.argument('job_id', type=str)
+def items(job_id):
+    """Show per-item progress of a fan-out job or one of its batches"""
+    storage = get_storage()
+    job = storage.get_job(job_id)
+    if not job:
+        click.echo(f"Error: Job '{job_id}' not found", err=True)
+        sys.exit(1)
+    
+    if job.fanout:
+        progress = storage.fanout_progress(job)
+        click.echo(f"=== Fan-out Job: {job_id} ({job.state.value}) ===")
+        click.echo(f"Items: {progress['items']} in {job.fanout['batches']} batch(es) of up to {job.fanout['batch_size']}")
+        click.echo(f"Succeeded: {progress['succeeded']}")
+        click.echo(f"Failed: {progress['failed']}")
+        click.echo(f"Pending: {progress['pending']}")
+        click.echo("Batches: " + ", ".join(f"{count} {state}" for state, count in progress["batches"].items() if count))
+        if progress["failed_items"]:
+            click.echo("Failed Items:")
+            for item in progress["failed_items"]:
+                click.echo(f"  {item}")
+    elif job.items is not None:
+        status = job.item_status or "." * len(job.items)
+        labels = {"+": "succeeded", "-": "failed", ".": "pending"}
+        for item, mark in zip(job.items, status):
+            click.echo(f"{labels[mark]:<10} {item}")
+    else:
+        click.echo(f"Job '{job_id}' has no items")
+
+
+@job.command()
+@click.option('--state', 'states', multiple=True, required=True,
+              type=click.Choice(['pending', 'processing', 'completed', 'failed', 'dead']),
+              help='Delete jobs in this state (repeatable)')
+@click.option('--error-contains', help='Only jobs whose error message contains this text')
+@click.option('--since', help='Only jobs last updated at or after this ISO 8601 time')
+@click.option('--until', help='Only jobs last updated at or before this ISO 8601 time')
+@click.option('--older-than', help='Only jobs last updated longer ago than this, e.g. 7d or 12h')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+def delete(states, error_contains, since, until, older_than, yes):
+    _bulk_delete([JobState(state) for state in states], error_contains, since, until, older_than, yes)
+
+
+@job.command()
+@click.option('--state', 'states', multiple=True, type=click.Choice(['pending', 'failed']),
+              help='Cancel jobs in this state (repeatable, default: pending and failed)')
+@click.option('--error-contains', help='Only jobs whose error message contains this text')
+@click.option('--since', help='Only jobs last updated at or after this ISO 8601 time')
+@click.option('--until', help='Only jobs last updated at or before this ISO 8601 time')
+@click.option('--older-than', help='Only jobs last updated longer ago than this, e.g. 7d or 12h')
+def cancel(states, error_contains, since, until, older_than):
+    filters = _bulk_filters([JobState(state) for state in states], error_contains, since, until, older_than)
+    try:
+        cancelled = get_storage().cancel_jobs(**filters)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Cancelled {len(cancelled)} job(s)")
+
+
+@cli.command()
+@click.argument('path', default='-')
+@click.option('--state', 'states', multiple=True,
+              type=click.Choice(['pending', 'processing', 'completed', 'failed', 'dead']),
+              help='Only export jobs in this state (repeatable)')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output (implied by a .gz file name)')
+def export(path, states, compress):
+    """Stream jobs as JSON lines to PATH, or to stdout"""
+    from .transfer import export_stream
+    storage = get_storage()
+    exported = 0
+    
+    def counted(jobs):
+        nonlocal exported
+        for job in jobs:
+            exported += 1
+            yield job
+    
+    jobs = counted(storage.iter_jobs([JobState(state) for state in states] or None))
+    chunks = export_stream(jobs, compress=compress or path.endswith('.gz'))
+    try:
+        if path == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+    except (OSError, RuntimeError) as e:
+        click.echo(f"Error: export failed after {exported} job(s): {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Exported {exported} job(s)", err=path == '-')
+
+
+@cli.group()
+def trace():
+    """Export job lifecycle traces"""
+    pass
+
+
+@trace.command(name='export')
+@click.argument('path', default='-')
+@click.option('--since', help='Only events at or after this ISO 8601 time, or this long ago (e.g. 15m)')
+@click.option('--job', 'job_ids', multiple=True, help='Only this job (repeatable)')
+def export_trace(path, since, job_ids):
+    """Write Chrome trace-event JSON for Perfetto or chrome://tracing"""
+    from datetime import datetime, timezone
+    from .storage import parse_duration
+    from .trace import chrome_trace
+    
+    since_ts = None
+    if since:
+        try:
+            since_ts = time.time() - parse_duration(since)
+        except ValueError:
+            try:
+                parsed = datetime.fromisoformat(since.replace('Z', '+00:00'))
+            except ValueError:
+                click.echo(f"Error: Invalid --since '{since}', expected an ISO 8601 time or a duration", err=True)
+                sys.exit(1)
+            since_ts = (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+    
+    data = chrome_trace(get_storage().tracer.events(since=since_ts, job_ids=job_ids or None))
+    spans = sum(1 for event in data["traceEvents"] if event["ph"] == "X")
+    try:
+        if path == '-':
+            json.dump(data, sys.stdout)
+            sys.stdout.flush()
+        else:
+            with open(path, 'w') as f:
+                json.dump(data, f)
+    except OSError as e:
+        click.echo(f"Error: trace export failed: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Exported {spans} span(s)", err=path == '-')
+
+
+@cli.command(name='import')
+@click.argument('path')
+@click.option('--state', 'states', multiple=True,
+              type=click.Choice(['pending', 'processing', 'completed', 'failed', 'dead']),
+              help='Only import jobs in this state (repeatable)')
+@click.option('--rewrite-state', 'rewrites', multiple=True, metavar='FROM=TO',
+              help='Import jobs in state FROM as state TO, e.g. processing=pending (repeatable)')
+@click.option('--chunk-size', default=1000, type=int, help='Jobs committed per batch')
+@click.option('--replace', is_flag=True, help='Overwrite existing jobs with the same id instead of skipping them')
+def import_jobs(path, states, rewrites, chunk_size, replace):
+    """Load jobs from a JSON lines export (gzipped or not); PATH may be - for stdin"""
+    from .transfer import read_jobs
+    rewrite_states = {}
+    for rewrite in rewrites:
+        source, _, target = rewrite.partition('=')
+        try:
+            rewrite_states[JobState(source.strip())] = JobState(target.strip())
+        except ValueError:
+            click.echo(f"Error: invalid state rewrite '{rewrite}', expected e.g. processing=pending", err=True)
+            sys.exit(1)
+    
+    try:
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    except OSError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    with stream:
+        jobs = read_jobs(stream, [JobState(state) for state in states] or None, rewrite_states)
+        try:
+            imported, skipped = get_storage().import_jobs(jobs, chunk_size=chunk_size, replace=replace)
+        except (OSError, ValueError, RuntimeError) as e:
+            click.echo(f"Error: import failed: {e}", err=True)
+            sys.exit(1)
+    click.echo(f"Imported {imported} job(s)")
+    if skipped:
+        click.echo(f"Skipped {skipped} job(s) that already exist (use --replace to overwrite)")
+
+
+@cli.group()
+def schedule():
+    """Manage recurring jobs"""
+    pass
+
+
+@schedule.command()
+@click.argument('schedule_data', type=str)
+def add(schedule_data):
+    """Add a recurring job from JSON with 'cron' or 'every'"""
+    from .schedule import ScheduleStore
+    try:
+        data = json.loads(schedule_data)
+        if data.get("retry_policy") is not None:
+            from .retry import RetryPolicy
+            RetryPolicy.for_job(Job(job_id="", command="", retry_policy=data["retry_policy"]), get_config())
+        definition = ScheduleStore().add(data)
+    except json.JSONDecodeError:
+        click.echo("Error: Invalid JSON format", err=True)
+        sys.exit(1)
+    except (ValueError, RuntimeError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Schedule '{definition['id']}' added, first run at {definition['next_fire_at']}")
+
+
+@schedule.command()
+def list():
+    from .schedule import ScheduleStore
+    schedules = ScheduleStore().load()
+    if not schedules:
+        click.echo("No schedules found")
+        return
+    
+    click.echo(f"\n{'ID':<20} {'Schedule':<18} {'Next Run':<28} {'Policies':<18} {'Fired':<7} {'Skipped':<8}")
+    click.echo("-" * 103)
+    for definition in schedules.values():
+        spec = definition["cron"] or f"every {definition['every']:g}s"
+        next_run = definition["next_fire_at"] if definition.get("enabled", True) else "(paused)"
+        policies = f"{definition['misfire']}/{definition['overlap']}"
+        click.echo(
+            f"{definition['id']:<20} {spec:<18} {next_run:<28} {policies:<18} "
+            f"{definition.get('fired', 0):<7} {definition.get('skipped', 0):<8}"
+        )
+
+
+@schedule.command()
+@click.argument('schedule_id', type=str)
+def remove(schedule_id):
+    from .schedule import ScheduleStore
+    if not ScheduleStore().remove(schedule_id):
+        click.echo(f"Error: Schedule '{schedule_id}' not found", err=True)
+        sys.exit(1)
+    click.echo(f"Schedule '{schedule_id}' removed")
+
+
+@schedule.command()
+@click.argument('schedule_id', type=str)
+def pause(schedule_id):
+    from .schedule import ScheduleStore
+    if not ScheduleStore().set_enabled(schedule_id, False):
+        click.echo(f"Error: Schedule '{schedule_id}' not found", err=True)
+        sys.exit(1)
+    click.echo(f"Schedule '{schedule_id}' paused")
+
+
+@schedule.command()
+@click.argument('schedule_id', type=str)
+def resume(schedule_id):
+    from .schedule import ScheduleStore
+    if not ScheduleStore().set_enabled(schedule_id, True):
+        click.echo(f"Error: Schedule '{schedule_id}' not found", err=True)
+        sys.exit(1)
+    click.echo(f"Schedule '{schedule_id}' resumed")
+
+
 @cli.command()
 def metrics():
     """Show execution metrics and statistics"""
-    all_jobs = storage.get_all_jobs()
+    all_jobs = get_storage().get_all_jobs()
     
     completed_jobs = [j for j in all_jobs if j.state == JobState.COMPLETED]
     failed_jobs = [j for j in all_jobs if j.state == JobState.FAILED]
@@ -314,6 +907,26 @@ def metrics():
             click.echo(f"Slowest Job: {slowest_job.id} ({slowest_job.execution_time:.3f}s)")
     else:
         click.echo("No execution time data available")
+    
+    from .executor import top_resource_consumers
+    top = top_resource_consumers(all_jobs)
+    click.echo("")
+    click.echo("=== Top Resource Consumers ===")
+    if any(top.values()):
+        for title, key, unit in (("CPU Time", "cpu_time", "s"), ("Max RSS", "max_rss_kb", " KB"), ("Block I/O", "io_blocks", " blocks")):
+            if top[key]:
+                click.echo(f"{title}: " + ", ".join(f"{entry['job_id']} ({entry['value']}{unit})" for entry in top[key]))
+    else:
+        click.echo("No resource usage data available")
+    
+    from .cache import ResultCache
+    cache_stats = ResultCache(max_entries=get_config().get("result_cache_max_entries", 1000)).stats()
+    click.echo("")
+    click.echo("=== Result Cache ===")
+    click.echo(f"Hits: {cache_stats['hits']}")
+    click.echo(f"Misses: {cache_stats['misses']}")
+    click.echo(f"Hit Rate: {cache_stats['hit_rate']:.2f}%")
+    click.echo(f"Cached Results: {cache_stats['entries']}")
 
 
 @cli.command()
@@ -0,0 +1,305 @@
+import atexit
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock a FileLock only keeps out the threads of this process.
+    fcntl = None
+
+DURABILITY_MODES = ("fsync", "write", "async")
+
+_committers: "weakref.WeakSet[GroupCommitter]" = weakref.WeakSet()
+
+
+def atomic_write(path: Path, data: str, sync: bool = True):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    
+    if sync and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(str(path.parent), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def try_lock_file(path: Path) -> Optional[int]:
+    # Takes an exclusive flock on `path` without waiting, for locks held as
+    # long as a process plays a role. Returns the open fd, or None if another
+    # process holds it. A file its holder removed while we waited is not the
+    # lock any more, so we retry on whatever is at `path` now.
+    while True:
+        fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+        if not fcntl:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            current = None
+        if current is not None and current.st_ino == os.fstat(fd).st_ino:
+            return fd
+        os.close(fd)
+
+
+def unlock_file(path: Path, fd: int):
+    # Removes the lock file before letting go of it, so nobody can take a
+    # lock on a file that is about to disappear.
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    os.close(fd)
+
+
+class FileLock:
+    # An exclusive lock on `path`, shared by the threads of this process and
+    # with other processes through flock. Reentrant within a thread. The file
+    # also holds a sequence number that holders bump to tell other processes
+    # that something changed.
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self.open_lock = threading.Lock()
+        self.depth = 0
+        self.fd: Optional[int] = None
+    
+    def _open(self) -> int:
+        with self.open_lock:
+            if self.fd is None:
+                self.fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+            return self.fd
+    
+    def __enter__(self):
+        self.lock.acquire()
+        if self.depth == 0 and fcntl:
+            try:
+                fcntl.flock(self._open(), fcntl.LOCK_EX)
+            except BaseException:
+                self.lock.release()
+                raise
+        self.depth += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0 and fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+    
+    def sequence(self) -> int:
+        # Readers do not need the lock.
+        fd = self._open()
+        if hasattr(os, "pread"):
+            data = os.pread(fd, 20, 0)
+        else:
+            with self.lock:
+                os.lseek(fd, 0, os.SEEK_SET)
+                data = os.read(fd, 20)
+        try:
+            return int(data)
+        except ValueError:
+            return 0
+    
+    def bump(self) -> int:
+        # Only while holding the lock.
+        value = self.sequence() + 1
+        data = b"%020d" % value
+        if hasattr(os, "pwrite"):
+            os.pwrite(self.fd, data, 0)
+        else:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            os.write(self.fd, data)
+        return value
+    
+    def close(self):
+        with self.lock, self.open_lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+class GroupCommitter:
+    
+    def __init__(
+        self,
+        write_batch: Callable[[Dict[str, Optional[dict]], bool, Dict[str, Optional[dict]]], List[str]],
+        window: float = 0.002,
+        max_batch: int = 64,
+        durability: str = "fsync"
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        
+        self.write_batch = write_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.durability = durability
+        self.cond = threading.Condition()
+        self.pending: Dict[str, Tuple[int, Optional[dict]]] = {}
+        # Pending writes that only land if the job is still stored as given
+        # (None: not stored at all). Writes that lose are reported to their
+        # waiter through `conflicts`, by ticket.
+        self.conditions: Dict[str, Optional[dict]] = {}
+        self.conflicts: Dict[int, Set[str]] = {}
+        self.submitted = 0
+        self.flushed = 0
+        self.writing = 0
+        self.failed: Optional[Tuple[int, int, Exception]] = None
+        self.batches = 0
+        self.records = 0
+        # Bumped whenever the pending set changes, so readers can tell whether
+        # an overlay they built earlier is still current.
+        self.generation = 0
+        # Bumped only when pending writes are dropped without reaching the
+        # file, which invalidates any view that already included them.
+        self.resets = 0
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+        _committers.add(self)
+    
+    def submit(self, ops: Dict[str, Optional[dict]], expected: Optional[Dict[str, Optional[dict]]] = None) -> int:
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("Storage writer is closed")
+            
+            self.submitted += 1
+            ticket = self.submitted
+            for job_id, job_data in ops.items():
+                previous = self.pending.get(job_id)
+                if expected is None or job_id not in expected:
+                    self.conditions.pop(job_id, None)
+                elif previous is None or previous[0] <= self.writing or previous[1] != expected[job_id]:
+                    self.conditions[job_id] = expected[job_id]
+                # Otherwise this builds on a queued write that will now never
+                # reach the file itself, and takes over that write's condition.
+                self.pending[job_id] = (ticket, job_data)
+            self.generation += 1
+            
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._write_loop, daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+            return ticket
+    
+    def _wait_flushed(self, ticket: int):
+        while self.flushed < ticket:
+            self.cond.wait()
+        if self.failed and self.failed[0] <= ticket <= self.failed[1]:
+            raise RuntimeError(f"Failed to save jobs: {self.failed[2]}")
+    
+    def wait(self, ticket: int, force: bool = False) -> Set[str]:
+        # Returns the jobs whose conditional writes under this ticket lost.
+        # Without `force`, async durability returns at once and reports none.
+        if self.durability == "async" and not force:
+            return set()
+        
+        with self.cond:
+            self._wait_flushed(ticket)
+            return self.conflicts.pop(ticket, set())
+    
+    def commit(self, ops: Dict[str, Optional[dict]]):
+        self.wait(self.submit(ops))
+    
+    def flush(self):
+        with self.cond:
+            self._wait_flushed(self.submitted)
+    
+    def overlay(self, jobs: Dict[str, dict]) -> Dict[str, dict]:
+        with self.cond:
+            if self.pending:
+                jobs = dict(jobs)
+            for job_id, (_, job_data) in self.pending.items():
+                if job_data is None:
+                    jobs.pop(job_id, None)
+                else:
+                    jobs[job_id] = job_data
+        return jobs
+    
+    def pending_ops(self) -> Dict[str, Optional[dict]]:
+        with self.cond:
+            return {job_id: job_data for job_id, (_, job_data) in self.pending.items()}
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+    
+    def _write_loop(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                
+                # Give concurrent writers a short window to join this batch.
+                deadline = time.monotonic() + self.window
+                while len(self.pending) < self.max_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                
+                upto = self.submitted
+                self.writing = upto
+                batch = {job_id: job_data for job_id, (_, job_data) in self.pending.items()}
+                tickets = {job_id: ticket for job_id, (ticket, _) in self.pending.items()}
+                conditions = {job_id: self.conditions[job_id] for job_id in batch if job_id in self.conditions}
+            
+            error = None
+            rejected: List[str] = []
+            try:
+                rejected = self.write_batch(batch, self.durability == "fsync", conditions)
+            except Exception as e:
+                error = e
+            
+            with self.cond:
+                for job_id in batch:
+                    entry = self.pending.get(job_id)
+                    if entry and entry[0] <= upto:
+                        del self.pending[job_id]
+                        self.conditions.pop(job_id, None)
+                for job_id in rejected:
+                    self.conflicts.setdefault(tickets[job_id], set()).add(job_id)
+                # Conflicts nobody waits for, e.g. under async durability.
+                while len(self.conflicts) > 1024:
+                    del self.conflicts[min(self.conflicts)]
+                self.generation += 1
+                if error is not None or rejected:
+                    self.resets += 1
+                if error is not None:
+                    self.failed = (self.flushed + 1, upto, error)
+                self.flushed = upto
+                self.batches += 1
+                self.records += len(batch)
+                self.cond.notify_all()
+
+
+@atexit.register
+def _close_all():
+    for committer in list(_committers):
+        committer.close()
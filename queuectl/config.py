@@ -1,7 +1,45 @@
 import json
 import os
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
+
+# Value types for keys given as strings (CLI) or loosely typed JSON (web).
+INTEGER_KEYS = frozenset([
+    "max_retries", "job_timeout", "storage_shards", "storage_commit_batch", "wal_compact_records",
+    "worker_prefetch", "worker_report_batch", "autoscale_backlog_per_worker", "result_cache_max_entries",
+    "job_memory_limit_mb", "job_max_open_files", "job_output_limit_bytes", "job_nice_step",
+    "circuit_failure_threshold"
+])
+NUMBER_KEYS = frozenset([
+    "backoff_base", "worker_poll_interval", "storage_commit_window_ms", "worker_lease_seconds",
+    "autoscale_interval", "autoscale_cooldown", "autoscale_target_wait", "autoscale_max_load",
+    "job_cpu_limit_seconds", "retry_max_delay", "circuit_window", "circuit_cooldown"
+])
+BOOLEAN_KEYS = frozenset(["retry_limit_breaches", "trace_enabled"])
+
+
+def config_key(name: str) -> str:
+    # The CLI and API spell keys with dashes; config.json uses underscores.
+    return name.replace("-", "_")
+
+
+def display_key(key: str) -> str:
+    return key.replace("_", "-")
+
+
+def parse_value(key: str, value: Any) -> Any:
+    try:
+        if key in INTEGER_KEYS:
+            return int(value)
+        if key in NUMBER_KEYS:
+            return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value type for '{display_key(key)}'")
+    if key in BOOLEAN_KEYS:
+        if str(value).lower() not in ("true", "false"):
+            raise ValueError(f"Invalid value type for '{display_key(key)}'")
+        return str(value).lower() == "true"
+    return value
 
 
 class Config:
@@ -12,7 +50,36 @@ class Config:
             "max_retries": 3,
             "backoff_base": 2.0,
             "worker_poll_interval": 1.0,
-            "job_timeout": 300
+            "job_timeout": 300,
+            "storage_shards": 1,
+            "storage_durability": "fsync",
+            "storage_commit_window_ms": 2.0,
+            "storage_commit_batch": 64,
+            "storage_backend": "json",
+            "wal_compact_records": 10000,
+            "worker_prefetch": 1,
+            "worker_report_batch": 1,
+            "worker_lease_seconds": 600,
+            "autoscale_interval": 5.0,
+            "autoscale_cooldown": 15.0,
+            "autoscale_backlog_per_worker": 2,
+            "autoscale_target_wait": 10.0,
+            "autoscale_max_load": 0.9,
+            "result_cache_max_entries": 1000,
+            "job_memory_limit_mb": 0,
+            "job_cpu_limit_seconds": 0,
+            "job_max_open_files": 0,
+            "job_output_limit_bytes": 0,
+            "job_nice_step": 0,
+            "job_cpu_affinity": "",
+            "retry_limit_breaches": False,
+            "retry_strategy": "exponential",
+            "retry_jitter": "full",
+            "retry_max_delay": 3600.0,
+            "circuit_failure_threshold": 5,
+            "circuit_window": 60.0,
+            "circuit_cooldown": 30.0,
+            "trace_enabled": True
         }
         self._config = self._load_config()
     
@@ -50,10 +117,71 @@ class Config:
             raise ValueError("worker_poll_interval must be a number")
         if key == "job_timeout" and not isinstance(value, int):
             raise ValueError("job_timeout must be an integer")
+        if key == "storage_shards" and (not isinstance(value, int) or value < 1):
+            raise ValueError("storage_shards must be a positive integer")
+        if key == "storage_durability" and value not in ("fsync", "write", "async"):
+            raise ValueError("storage_durability must be one of: fsync, write, async")
+        if key == "storage_commit_window_ms" and (not isinstance(value, (int, float)) or value < 0):
+            raise ValueError("storage_commit_window_ms must be a non-negative number")
+        if key == "storage_commit_batch" and (not isinstance(value, int) or value < 1):
+            raise ValueError("storage_commit_batch must be a positive integer")
+        if key == "storage_backend" and value not in ("json", "wal"):
+            raise ValueError("storage_backend must be one of: json, wal")
+        if key == "wal_compact_records" and (not isinstance(value, int) or value < 1):
+            raise ValueError("wal_compact_records must be a positive integer")
+        if key == "worker_prefetch" and (not isinstance(value, int) or value < 1):
+            raise ValueError("worker_prefetch must be a positive integer")
+        if key == "worker_report_batch" and (not isinstance(value, int) or value < 1):
+            raise ValueError("worker_report_batch must be a positive integer")
+        if key == "worker_lease_seconds" and (not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError("worker_lease_seconds must be a positive number")
+        if key in ("autoscale_interval", "autoscale_cooldown", "autoscale_target_wait", "autoscale_max_load") and (
+            not isinstance(value, (int, float)) or value <= 0
+        ):
+            raise ValueError(f"{key} must be a positive number")
+        if key == "autoscale_backlog_per_worker" and (not isinstance(value, int) or value < 1):
+            raise ValueError("autoscale_backlog_per_worker must be a positive integer")
+        if key == "result_cache_max_entries" and (not isinstance(value, int) or value < 1):
+            raise ValueError("result_cache_max_entries must be a positive integer")
+        if key in ("job_memory_limit_mb", "job_max_open_files", "job_output_limit_bytes", "job_nice_step") and (
+            not isinstance(value, int) or value < 0
+        ):
+            raise ValueError(f"{key} must be a non-negative integer (0 disables it)")
+        if key == "job_cpu_limit_seconds" and (not isinstance(value, (int, float)) or value < 0):
+            raise ValueError("job_cpu_limit_seconds must be a non-negative number (0 disables it)")
+        if key == "job_cpu_affinity":
+            from .executor import parse_cpu_list
+            try:
+                parse_cpu_list(value)
+            except ValueError:
+                raise ValueError("job_cpu_affinity must be a CPU list such as '0-3,6'")
+        if key == "retry_limit_breaches" and not isinstance(value, bool):
+            raise ValueError("retry_limit_breaches must be true or false")
+        if key == "trace_enabled" and not isinstance(value, bool):
+            raise ValueError("trace_enabled must be true or false")
+        if key == "retry_strategy" and value not in ("exponential", "fixed"):
+            raise ValueError("retry_strategy must be one of: exponential, fixed")
+        if key == "retry_jitter" and value not in ("full", "equal", "none"):
+            raise ValueError("retry_jitter must be one of: full, equal, none")
+        if key == "retry_max_delay" and (not isinstance(value, (int, float)) or value < 0):
+            raise ValueError("retry_max_delay must be a non-negative number")
+        if key == "circuit_failure_threshold" and (not isinstance(value, int) or value < 0):
+            raise ValueError("circuit_failure_threshold must be a non-negative integer (0 disables it)")
+        if key in ("circuit_window", "circuit_cooldown") and (not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"{key} must be a positive number")
         
         self._config[key] = value
         self._save_config()
     
+    def set_option(self, name: str, value: Any) -> Tuple[str, Any]:
+        # Parses a dashed or underscored key and its value, then validates and saves it.
+        key = config_key(name)
+        if key not in self.defaults:
+            raise ValueError(f"Unknown configuration key: {name}")
+        value = parse_value(key, value)
+        self.set(key, value)
+        return key, value
+    
     def get_all(self) -> dict:
         return self._config.copy()
     
@@ -1,8 +1,82 @@
+import math
+import os
+import shlex
+import signal
 import subprocess
+import sys
+import threading
 import time
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, List, Set
 from .models import Job
 from .config import Config
+from .trace import trace_clock
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESOURCE_FIELDS = ("cpu_user_time", "cpu_system_time", "max_rss_kb", "io_read_blocks", "io_write_blocks")
+
+LIMIT_FAILURES = ("memory_limit", "cpu_limit", "open_files_limit", "output_limit")
+
+ITEM_MODES = ("args", "stdin")
+
+_MEMORY_ERRORS = ("MemoryError", "Cannot allocate memory", "out of memory", "std::bad_alloc")
+
+# A job with limits starts as a shell blocked reading a line from its
+# stdin. The worker applies the limits to its pid, then writes that line
+# (and any input after it) so the shell execs the command ($2). `read`
+# takes a pipe a byte at a time, so the command sees only the input. The
+# open file limit ($1) is set by the shell itself, once past the read.
+_GATE = 'read -r _ || exit 126; [ -z "$1" ] || ulimit -n "$1" || exit 126; exec /bin/sh -c "$2"'
+
+
+def _rusage_data(usage) -> Dict[str, Any]:
+    # ru_maxrss is reported in kilobytes on Linux but in bytes on macOS.
+    max_rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return {
+        "cpu_user_time": round(usage.ru_utime, 6),
+        "cpu_system_time": round(usage.ru_stime, 6),
+        "max_rss_kb": max_rss,
+        "io_read_blocks": usage.ru_inblock,
+        "io_write_blocks": usage.ru_oublock
+    }
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def parse_cpu_list(value: str) -> Set[int]:
+    cpus = set()
+    for part in str(value).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def top_resource_consumers(jobs: List[Job], limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+    measured = [j for j in jobs if j.cpu_user_time is not None]
+    rankings = {
+        "cpu_time": lambda j: j.cpu_user_time + j.cpu_system_time,
+        "max_rss_kb": lambda j: j.max_rss_kb,
+        "io_blocks": lambda j: j.io_read_blocks + j.io_write_blocks
+    }
+    
+    top = {}
+    for name, value in rankings.items():
+        ranked = sorted(measured, key=value, reverse=True)[:limit]
+        top[name] = [{"job_id": j.id, "value": round(value(j), 3)} for j in ranked if value(j)]
+    return top
 
 
 class JobExecutor:
@@ -10,47 +84,295 @@ class JobExecutor:
     def __init__(self, config: Config):
         self.config = config
     
+    def resolve_limits(self, job: Job) -> Dict[str, Any]:
+        limits = {
+            "memory_mb": self.config.get("job_memory_limit_mb", 0),
+            "cpu_seconds": self.config.get("job_cpu_limit_seconds", 0),
+            "max_open_files": self.config.get("job_max_open_files", 0),
+            "output_bytes": self.config.get("job_output_limit_bytes", 0),
+            "cpu_affinity": self.config.get("job_cpu_affinity", "")
+        }
+        # Less important jobs run nicer; priority 10 keeps the worker's own niceness.
+        nice_step = self.config.get("job_nice_step", 0)
+        limits["nice"] = min(19, max(0, nice_step * (10 - job.priority)))
+        limits.update({key: value for key, value in (job.limits or {}).items() if value is not None})
+        return limits
+    
     def execute(self, job: Job) -> Tuple[bool, Optional[str], Dict[str, Any]]:
+        if job.items is not None:
+            return self._execute_items(job)
+        return self._execute(job, job.command, None)
+    
+    def _item_command(self, job: Job, items: List[str]) -> Tuple[str, Optional[str]]:
+        # Several items share one process: on stdin one per line, or as
+        # arguments in place of `{}` (appended when there is none), like xargs.
+        if job.item_mode == "stdin":
+            return job.command, "".join(f"{item}\n" for item in items)
+        arguments = " ".join(shlex.quote(str(item)) for item in items)
+        if "{}" in job.command:
+            return job.command.replace("{}", arguments), None
+        return f"{job.command} {arguments}", None
+    
+    def _execute_items(self, job: Job) -> Tuple[bool, Optional[str], Dict[str, Any]]:
+        status = list(job.item_status or "." * len(job.items))
+        todo = [i for i, mark in enumerate(status) if mark != "+"]
+        batch = self._execute(job, *self._item_command(job, [job.items[i] for i in todo]))
+        outcomes = [(todo, batch)]
+        runs = [batch]
+        if not batch[0] and len(todo) > 1 and batch[2]["failure_reason"] == "exit_code":
+            # A failed exit only says that some item failed; running the items
+            # one per process finds out which.
+            outcomes = [([i], self._execute(job, *self._item_command(job, [job.items[i]]))) for i in todo]
+            runs.extend(outcome for _, outcome in outcomes)
+        for indices, (succeeded, _, _) in outcomes:
+            for i in indices:
+                status[i] = "+" if succeeded else "-"
+        
+        execution_data: Dict[str, Any] = {"item_status": "".join(status), "failure_reason": None}
+        for key in ("stdout", "stderr"):
+            parts = [data[key] for _, _, data in runs if data.get(key)]
+            execution_data[key] = "".join(parts) if parts else None
+        execution_data["execution_time"] = sum(data["execution_time"] or 0 for _, _, data in runs)
+        execution_data["spawned_at"] = runs[0][2].get("spawned_at")
+        execution_data["exited_at"] = runs[-1][2].get("exited_at")
+        measured = [data for _, _, data in runs if data.get("cpu_user_time") is not None]
+        if measured:
+            for field in RESOURCE_FIELDS:
+                values = [data[field] for data in measured]
+                execution_data[field] = max(values) if field == "max_rss_kb" else sum(values)
+        
+        failed = [job.items[i] for i in todo if status[i] == "-"]
+        if not failed:
+            return True, None, execution_data
+        _, error_message, error_data = next(outcome for _, outcome in outcomes if not outcome[0])
+        execution_data["failure_reason"] = error_data["failure_reason"]
+        shown = ", ".join(str(item) for item in failed[:5]) + (", ..." if len(failed) > 5 else "")
+        return False, f"{len(failed)} of {len(todo)} items failed ({shown})\n{error_message}", execution_data
+    
+    def _execute(self, job: Job, command: str, input_data: Optional[str]) -> Tuple[bool, Optional[str], Dict[str, Any]]:
         start_time = time.time()
         execution_data = {
             "stdout": None,
             "stderr": None,
-            "execution_time": None
+            "execution_time": None,
+            "failure_reason": None
         }
         
         try:
             timeout = self.config.get("job_timeout", 300)
             
-            result = subprocess.run(
-                job.command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
+            if hasattr(os, "wait4"):
+                returncode, stdout, stderr = self._run_accounted(job, command, input_data, timeout, execution_data)
+            else:
+                execution_data["spawned_at"] = trace_clock()
+                result = subprocess.run(
+                    command,
+                    shell=True,
+                    capture_output=True,
+                    text=True,
+                    input=input_data,
+                    timeout=timeout
+                )
+                returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+                execution_data["exited_at"] = trace_clock()
             
             execution_time = time.time() - start_time
             execution_data["execution_time"] = execution_time
-            execution_data["stdout"] = result.stdout
-            execution_data["stderr"] = result.stderr
             
-            if result.returncode == 0:
+            reason = execution_data["failure_reason"]
+            if reason == "timeout":
+                return False, f"Job timed out after {timeout} seconds", execution_data
+            
+            execution_data["stdout"] = stdout
+            execution_data["stderr"] = stderr
+            
+            if reason in LIMIT_FAILURES:
+                return False, self._limit_message(reason, job), execution_data
+            if returncode == 0:
                 return True, None, execution_data
             else:
-                error_msg = result.stderr or result.stdout or f"Command failed with exit code {result.returncode}"
+                execution_data["failure_reason"] = "exit_code"
+                error_msg = stderr or stdout or f"Command failed with exit code {returncode}"
                 return False, error_msg.strip(), execution_data
         
         except subprocess.TimeoutExpired:
             execution_time = time.time() - start_time
             execution_data["execution_time"] = execution_time
+            execution_data["failure_reason"] = "timeout"
             return False, f"Job timed out after {timeout} seconds", execution_data
         
         except FileNotFoundError:
             execution_time = time.time() - start_time
             execution_data["execution_time"] = execution_time
+            execution_data["failure_reason"] = "not_found"
             return False, "Command not found", execution_data
         
         except Exception as e:
             execution_time = time.time() - start_time
             execution_data["execution_time"] = execution_time
+            execution_data["failure_reason"] = "error"
             return False, f"Execution error: {str(e)}", execution_data
+    
+    def _limit_message(self, reason: str, job: Job) -> str:
+        limits = self.resolve_limits(job)
+        if reason == "memory_limit":
+            return f"Memory limit of {limits['memory_mb']} MB exceeded"
+        if reason == "cpu_limit":
+            return f"CPU time limit of {limits['cpu_seconds']}s exceeded"
+        if reason == "open_files_limit":
+            return f"Open file limit of {limits['max_open_files']} exceeded"
+        return f"Output limit of {limits['output_bytes']} bytes exceeded"
+    
+    def _needs_limits(self, limits: Dict[str, Any], cpus: Set[int]) -> bool:
+        return bool(cpus) or any(limits[key] for key in ("memory_mb", "cpu_seconds", "max_open_files", "nice"))
+    
+    def _limit_process(self, pid: int, limits: Dict[str, Any], cpus: Set[int]):
+        # Applied from the worker by pid, since the worker is threaded and
+        # must not run Python code between fork and exec. The child waits at
+        # its gate meanwhile and everything it starts inherits the limits.
+        if resource is not None and hasattr(resource, "prlimit"):
+            if limits["memory_mb"]:
+                size = int(limits["memory_mb"] * 1024 * 1024)
+                resource.prlimit(pid, resource.RLIMIT_AS, (size, size))
+            if limits["cpu_seconds"]:
+                seconds = int(math.ceil(limits["cpu_seconds"]))
+                # SIGXCPU at the soft limit, SIGKILL a second later.
+                resource.prlimit(pid, resource.RLIMIT_CPU, (seconds, seconds + 1))
+        if limits["nice"] and hasattr(os, "setpriority"):
+            niceness = min(19, os.getpriority(os.PRIO_PROCESS, 0) + int(limits["nice"]))
+            os.setpriority(os.PRIO_PROCESS, pid, niceness)
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, cpus)
+    
+    def _run_accounted(
+        self,
+        job: Job,
+        command: str,
+        input_data: Optional[str],
+        timeout: float,
+        execution_data: Dict[str, Any]
+    ) -> Tuple[int, str, str]:
+        limits = self.resolve_limits(job)
+        cpus = parse_cpu_list(limits["cpu_affinity"]) if limits["cpu_affinity"] else set()
+        output_cap = int(limits["output_bytes"] or 0)
+        
+        # The job runs in its own session so a timeout kills the whole tree,
+        # and wait4 reports rusage for this child alone. getrusage(RUSAGE_CHILDREN)
+        # would mix in jobs finishing concurrently on other worker threads.
+        gated = self._needs_limits(limits, cpus)
+        process = subprocess.Popen(
+            ["/bin/sh", "-c", _GATE, "queuectl-job", str(int(limits["max_open_files"] or 0) or ""), command]
+            if gated else command,
+            shell=not gated,
+            stdin=subprocess.PIPE if gated or input_data is not None else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        if gated:
+            try:
+                self._limit_process(process.pid, limits, cpus)
+            except BaseException:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                raise
+            try:
+                process.stdin.write(b"\n")
+                process.stdin.flush()
+                if input_data is None:
+                    process.stdin.close()
+            except OSError:
+                pass
+        execution_data["spawned_at"] = trace_clock()
+        
+        output = {}
+        killed = []
+        
+        def kill(reason):
+            if not killed:
+                killed.append(reason)
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        
+        def read(name, stream):
+            chunks = []
+            size = 0
+            while True:
+                chunk = stream.read1(65536)
+                if not chunk:
+                    break
+                if output_cap and size + len(chunk) > output_cap:
+                    chunks.append(chunk[:output_cap - size])
+                    kill("output_limit")
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+            stream.close()
+            output[name] = b"".join(chunks).decode("utf-8", errors="replace").replace("\r\n", "\n")
+        
+        def write(stream):
+            # A command that exits without reading all of its input is not an error here.
+            try:
+                stream.write(input_data.encode("utf-8"))
+            except OSError:
+                pass
+            finally:
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+        
+        pipes = [
+            threading.Thread(target=read, args=("stdout", process.stdout), daemon=True),
+            threading.Thread(target=read, args=("stderr", process.stderr), daemon=True)
+        ]
+        if input_data is not None:
+            pipes.append(threading.Thread(target=write, args=(process.stdin,), daemon=True))
+        for pipe in pipes:
+            pipe.start()
+        
+        timer = threading.Timer(timeout, kill, args=("timeout",))
+        timer.start()
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        execution_data["exited_at"] = trace_clock()
+        process.returncode = _exit_code(status)
+        execution_data.update(_rusage_data(usage))
+        
+        for pipe in pipes:
+            pipe.join(timeout=5)
+        stdout, stderr = output.get("stdout", ""), output.get("stderr", "")
+        
+        if killed:
+            execution_data["failure_reason"] = killed[0]
+        elif process.returncode != 0:
+            execution_data["failure_reason"] = self._limit_breach(process.returncode, execution_data, limits, stderr)
+        return process.returncode, stdout, stderr
+    
+    def _limit_breach(self, returncode: int, usage: Dict[str, Any], limits: Dict[str, Any], stderr: str) -> Optional[str]:
+        # Only failures the limit can be shown to have caused count as
+        # breaches; any other crash is an ordinary failure and is retried.
+        # A shell that did not exec the command reports a fatal signal as 128 + N.
+        signum = -returncode if returncode < 0 else returncode - 128 if returncode > 128 else None
+        
+        # The kernel sends SIGXCPU at the soft limit and SIGKILL at the hard one.
+        cpu_time = usage["cpu_user_time"] + usage["cpu_system_time"]
+        if limits["cpu_seconds"] and (
+            signum == signal.SIGXCPU or (signum == signal.SIGKILL and cpu_time >= limits["cpu_seconds"])
+        ):
+            return "cpu_limit"
+        # An allocation past RLIMIT_AS fails rather than signalling, so it
+        # shows up as an out-of-memory error, or as a crash once the job had
+        # grown to within 10% of the limit.
+        if limits["memory_mb"] and (
+            any(marker in stderr for marker in _MEMORY_ERRORS)
+            or (signum is not None and usage["max_rss_kb"] >= limits["memory_mb"] * 1024 * 0.9)
+        ):
+            return "memory_limit"
+        if limits["max_open_files"] and "Too many open files" in stderr:
+            return "open_files_limit"
+        return None
@@ -0,0 +1,205 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+TIME_FIELDS = ("created_at", "completed_at")
+
+# Bumped whenever the tables change; an index built by another version is
+# dropped and rebuilt from the job store.
+SCHEMA_VERSION = 2
+
+# The index holds only what searches filter and sort on. Matching jobs are
+# read back from the job store, so job records are never stored twice.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    state TEXT,
+    created_at TEXT,
+    completed_at TEXT,
+    command TEXT,
+    error_message TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_shard ON jobs(shard);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs(created_at);
+CREATE INDEX IF NOT EXISTS jobs_completed_at ON jobs(completed_at);
+CREATE TABLE IF NOT EXISTS shards (
+    shard INTEGER PRIMARY KEY,
+    stamp TEXT NOT NULL
+);
+"""
+
+# The trigram tokenizer lets MATCH find arbitrary substrings of three or
+# more characters, which is what a search over shell commands needs.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+    command, error_message, content='jobs', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+    INSERT INTO jobs_fts(rowid, command, error_message) VALUES (new.rowid, new.command, new.error_message);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+    INSERT INTO jobs_fts(jobs_fts, rowid, command, error_message)
+    VALUES ('delete', old.rowid, old.command, old.error_message);
+END;
+"""
+
+
+def _sortable(value: Optional[str]) -> Optional[str]:
+    # Timestamps are compared as strings, so they are stored in one UTC
+    # format with fixed-width microseconds.
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat(timespec="microseconds")
+
+
+class JobIndex:
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        self.fts = False
+    
+    def exists(self) -> bool:
+        return self.path.exists()
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The index is derived data and is rebuilt from the job store
+            # whenever it falls behind, so it never needs to fsync.
+            conn.execute("PRAGMA synchronous=OFF")
+            # Lets INSERT OR REPLACE fire the delete trigger that keeps the
+            # full-text table in step with the rows it replaces.
+            conn.execute("PRAGMA recursive_triggers=ON")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript(
+                    "DROP TABLE IF EXISTS jobs_fts; DROP TABLE IF EXISTS jobs; DROP TABLE IF EXISTS shards;"
+                )
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+            conn.commit()
+            self.conn = conn
+        return self.conn
+    
+    def _insert(self, conn: sqlite3.Connection, shard: int, jobs):
+        conn.executemany(
+            "INSERT OR REPLACE INTO jobs (id, shard, state, created_at, completed_at, command, error_message) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    job_data["id"],
+                    shard,
+                    job_data.get("state"),
+                    _sortable(job_data.get("created_at")),
+                    _sortable(job_data.get("completed_at")),
+                    job_data.get("command"),
+                    job_data.get("error_message")
+                )
+                for job_data in jobs
+            )
+        )
+    
+    def stamp(self, shard: int) -> Optional[str]:
+        with self.lock:
+            row = self._connect().execute("SELECT stamp FROM shards WHERE shard = ?", (shard,)).fetchone()
+            return row[0] if row else None
+    
+    def apply(self, shard: int, ops: Dict[str, Optional[dict]], previous_stamp: str, stamp: str):
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute("SELECT stamp FROM shards WHERE shard = ?", (shard,)).fetchone()
+                if not row or row[0] != previous_stamp:
+                    # Someone changed the shard without indexing it; leave the
+                    # stamp stale so the next search rebuilds this shard.
+                    conn.execute("DELETE FROM shards WHERE shard = ?", (shard,))
+                    return
+                conn.executemany(
+                    "DELETE FROM jobs WHERE id = ?",
+                    [(job_id,) for job_id, job_data in ops.items() if job_data is None]
+                )
+                self._insert(conn, shard, [job_data for job_data in ops.values() if job_data is not None])
+                conn.execute("UPDATE shards SET stamp = ? WHERE shard = ?", (stamp, shard))
+    
+    def rebuild_shard(self, shard: int, jobs: Dict[str, dict], stamp: str):
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE shard = ?", (shard,))
+                self._insert(conn, shard, jobs.values())
+                conn.execute("INSERT OR REPLACE INTO shards (shard, stamp) VALUES (?, ?)", (shard, stamp))
+    
+    def drop_shards_from(self, count: int):
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE shard >= ?", (count,))
+                conn.execute("DELETE FROM shards WHERE shard >= ?", (count,))
+    
+    def search(
+        self,
+        text: Optional[str] = None,
+        states: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        time_field: str = "created_at",
+        limit: Optional[int] = None
+    ) -> List[str]:
+        # Returns the ids of the matching jobs, in order.
+        if time_field not in TIME_FIELDS:
+            raise ValueError(f"time_field must be one of: {', '.join(TIME_FIELDS)}")
+        
+        where = []
+        params: List[Any] = []
+        if text:
+            if self.fts and len(text) >= 3:
+                where.append("rowid IN (SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ?)")
+                params.append('"' + text.replace('"', '""') + '"')
+            else:
+                pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                where.append("(command LIKE ? ESCAPE '\\' OR error_message LIKE ? ESCAPE '\\')")
+                params.extend([pattern, pattern])
+        if states:
+            where.append(f"state IN ({', '.join('?' for _ in states)})")
+            params.extend(states)
+        for bound, operator in ((since, ">="), (until, "<=")):
+            if bound:
+                value = _sortable(bound)
+                if value is None:
+                    raise ValueError(f"Invalid timestamp: {bound}")
+                where.append(f"{time_field} {operator} ?")
+                params.append(value)
+        
+        sql = "SELECT id FROM jobs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {time_field}, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        
+        with self.lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [row[0] for row in rows]
+    
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
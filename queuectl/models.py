@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 
 class JobState(Enum):
@@ -12,6 +12,29 @@ class JobState(Enum):
     DEAD = "dead"
 
 
+# What a worker reports about a run, with the types each field may take.
+# Everything else about a job stays as the server stored it.
+RESULT_FIELDS = {
+    "state": (str,),
+    "stdout": (str, type(None)),
+    "stderr": (str, type(None)),
+    "execution_time": (int, float, type(None)),
+    "started_at": (str, type(None)),
+    "completed_at": (str, type(None)),
+    "updated_at": (str,),
+    "next_retry_at": (str, type(None)),
+    "error_message": (str, type(None)),
+    "failure_reason": (str, type(None)),
+    "cache_hit": (bool,),
+    "item_status": (str, type(None)),
+    "cpu_user_time": (int, float, type(None)),
+    "cpu_system_time": (int, float, type(None)),
+    "max_rss_kb": (int, type(None)),
+    "io_read_blocks": (int, type(None)),
+    "io_write_blocks": (int, type(None))
+}
+
+
 class Job:
     
     def __init__(
@@ -31,7 +54,28 @@ class Job:
         stderr: Optional[str] = None,
         execution_time: Optional[float] = None,
         started_at: Optional[str] = None,
-        completed_at: Optional[str] = None
+        completed_at: Optional[str] = None,
+        worker_id: Optional[str] = None,
+        lease_expires_at: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        cache_hit: bool = False,
+        depends_on: Optional[List[str]] = None,
+        unmet_dependencies: int = 0,
+        cpu_user_time: Optional[float] = None,
+        cpu_system_time: Optional[float] = None,
+        max_rss_kb: Optional[int] = None,
+        io_read_blocks: Optional[int] = None,
+        io_write_blocks: Optional[int] = None,
+        limits: Optional[Dict[str, Any]] = None,
+        failure_reason: Optional[str] = None,
+        retry_policy: Optional[Dict[str, Any]] = None,
+        items: Optional[List[str]] = None,
+        item_mode: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        item_status: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        fanout: Optional[Dict[str, Any]] = None
     ):
         self.id = job_id
         self.command = command
@@ -49,6 +93,27 @@ class Job:
         self.execution_time = execution_time
         self.started_at = started_at
         self.completed_at = completed_at
+        self.worker_id = worker_id
+        self.lease_expires_at = lease_expires_at
+        self.idempotency_key = idempotency_key
+        self.cache_ttl = cache_ttl
+        self.cache_hit = cache_hit
+        self.depends_on = depends_on or []
+        self.unmet_dependencies = unmet_dependencies
+        self.cpu_user_time = cpu_user_time
+        self.cpu_system_time = cpu_system_time
+        self.max_rss_kb = max_rss_kb
+        self.io_read_blocks = io_read_blocks
+        self.io_write_blocks = io_write_blocks
+        self.limits = limits
+        self.failure_reason = failure_reason
+        self.retry_policy = retry_policy
+        self.items = items
+        self.item_mode = item_mode
+        self.batch_size = batch_size
+        self.item_status = item_status
+        self.parent_id = parent_id
+        self.fanout = fanout
     
     @staticmethod
     def _now() -> str:
@@ -71,7 +136,28 @@ class Job:
             "stderr": self.stderr,
             "execution_time": self.execution_time,
             "started_at": self.started_at,
-            "completed_at": self.completed_at
+            "completed_at": self.completed_at,
+            "worker_id": self.worker_id,
+            "lease_expires_at": self.lease_expires_at,
+            "idempotency_key": self.idempotency_key,
+            "cache_ttl": self.cache_ttl,
+            "cache_hit": self.cache_hit,
+            "depends_on": self.depends_on,
+            "unmet_dependencies": self.unmet_dependencies,
+            "cpu_user_time": self.cpu_user_time,
+            "cpu_system_time": self.cpu_system_time,
+            "max_rss_kb": self.max_rss_kb,
+            "io_read_blocks": self.io_read_blocks,
+            "io_write_blocks": self.io_write_blocks,
+            "limits": self.limits,
+            "failure_reason": self.failure_reason,
+            "retry_policy": self.retry_policy,
+            "items": self.items,
+            "item_mode": self.item_mode,
+            "batch_size": self.batch_size,
+            "item_status": self.item_status,
+            "parent_id": self.parent_id,
+            "fanout": self.fanout
         }
     
     @classmethod
@@ -92,30 +178,92 @@ class Job:
             stderr=data.get("stderr"),
             execution_time=data.get("execution_time"),
             started_at=data.get("started_at"),
-            completed_at=data.get("completed_at")
+            completed_at=data.get("completed_at"),
+            worker_id=data.get("worker_id"),
+            lease_expires_at=data.get("lease_expires_at"),
+            idempotency_key=data.get("idempotency_key"),
+            cache_ttl=data.get("cache_ttl"),
+            cache_hit=data.get("cache_hit", False),
+            depends_on=data.get("depends_on"),
+            unmet_dependencies=data.get("unmet_dependencies", 0),
+            cpu_user_time=data.get("cpu_user_time"),
+            cpu_system_time=data.get("cpu_system_time"),
+            max_rss_kb=data.get("max_rss_kb"),
+            io_read_blocks=data.get("io_read_blocks"),
+            io_write_blocks=data.get("io_write_blocks"),
+            limits=data.get("limits"),
+            failure_reason=data.get("failure_reason"),
+            retry_policy=data.get("retry_policy"),
+            items=data.get("items"),
+            item_mode=data.get("item_mode"),
+            batch_size=data.get("batch_size"),
+            item_status=data.get("item_status"),
+            parent_id=data.get("parent_id"),
+            fanout=data.get("fanout")
         )
     
+    def result_dict(self) -> Dict[str, Any]:
+        data = self.to_dict()
+        result = {field: data[field] for field in RESULT_FIELDS}
+        result.update(id=self.id, worker_id=self.worker_id)
+        return result
+    
+    def apply_result(self, result: Dict[str, Any]):
+        # Applies a worker's report of a run to this job, as claimed. Every
+        # run that did not complete counts as an attempt.
+        for field, types in RESULT_FIELDS.items():
+            value = result.get(field, getattr(self, field) if field != "state" else None)
+            if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+                raise ValueError(f"{field} has an invalid value")
+        try:
+            state = JobState(result["state"])
+        except ValueError:
+            raise ValueError(f"state cannot be {result['state']}")
+        if state not in (JobState.COMPLETED, JobState.FAILED, JobState.DEAD):
+            raise ValueError(f"state cannot be {state.value}")
+        if self.items is not None and len(result.get("item_status", self.item_status) or "") != len(self.items):
+            raise ValueError("item_status must have one mark per item")
+        
+        for field in RESULT_FIELDS:
+            if field in result:
+                setattr(self, field, result[field])
+        self.state = state
+        if state != JobState.COMPLETED:
+            self.attempts += 1
+        self.lease_expires_at = None
+    
     def mark_processing(self):
         self.state = JobState.PROCESSING
         self.updated_at = self._now()
         self.started_at = self._now()
     
+    def release(self):
+        self.state = JobState.PENDING
+        self.updated_at = self._now()
+        self.started_at = None
+        self.worker_id = None
+        self.lease_expires_at = None
+    
     def mark_completed(self):
         self.state = JobState.COMPLETED
         self.updated_at = self._now()
         self.completed_at = self._now()
         self.error_message = None
+        self.failure_reason = None
+        self.lease_expires_at = None
     
     def mark_failed(self, error_message: str = None):
         self.state = JobState.FAILED
         self.attempts += 1
         self.updated_at = self._now()
         self.error_message = error_message
+        self.lease_expires_at = None
     
     def mark_dead(self, error_message: str = None):
         self.state = JobState.DEAD
         self.updated_at = self._now()
         self.error_message = error_message
+        self.lease_expires_at = None
     
     def should_retry(self) -> bool:
         return self.attempts < self.max_retries and self.state == JobState.FAILED
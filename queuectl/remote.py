@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+from .models import Job
+
+
+class RemoteStorage:
+    
+    def __init__(self, base_url: str, long_poll: float = 5.0, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.long_poll = long_poll
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.held: Dict[str, Tuple[str, float]] = {}
+        self.heartbeat_thread: Optional[threading.Thread] = None
+    
+    def _request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        conflict_ok: bool = False
+    ) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                body = json.loads(e.read().decode("utf-8"))
+            except ValueError:
+                body = {}
+            if conflict_ok and e.code == 409:
+                return body
+            message = body.get("error", e.reason) if isinstance(body, dict) else e.reason
+            raise RuntimeError(f"Remote queue error ({e.code}): {message}")
+        except (urllib.error.URLError, OSError) as e:
+            raise RuntimeError(f"Remote queue unavailable: {e}")
+    
+    def claim_jobs(
+        self,
+        limit: int,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        paused: Optional[Dict[str, int]] = None
+    ) -> List[Job]:
+        # The server holds the request open until a job is ready or the long
+        # poll expires, so idle workers do not hammer it with empty claims.
+        response = self._request("POST", "/api/claim", {
+            "worker_id": worker_id,
+            "limit": limit,
+            "lease_seconds": lease_seconds,
+            "paused": paused,
+            "wait": self.long_poll
+        }, timeout=self.timeout + self.long_poll)
+        jobs = [Job.from_dict(job_data) for job_data in response.get("jobs", [])]
+        
+        if jobs and lease_seconds:
+            with self.lock:
+                for job in jobs:
+                    self.held[job.id] = (worker_id, lease_seconds)
+            self._start_heartbeat(lease_seconds)
+        return jobs
+    
+    def release_jobs(self, jobs: List[Job], worker_id: Optional[str] = None):
+        self._forget(jobs)
+        self._request("POST", "/api/release", {"worker_id": worker_id, "job_ids": [job.id for job in jobs]})
+    
+    def save_jobs(self, jobs: List[Job]):
+        # A 409 names the results the server refused; the rest were saved.
+        response = self._request(
+            "POST", "/api/complete", {"jobs": [job.result_dict() for job in jobs]}, conflict_ok=True
+        )
+        self._forget(jobs)
+        for job_id in response.get("rejected", []):
+            print(f"Result for job '{job_id}' was rejected: its lease had expired")
+    
+    def save_job(self, job: Job):
+        self.save_jobs([job])
+    
+    def wait_for_work(self, timeout: float):
+        # claim_jobs already waited on the server for up to the long poll.
+        pass
+    
+    def ready_stats(self) -> Tuple[int, float]:
+        response = self._request("GET", "/api/ready")
+        return response.get("depth", 0), response.get("oldest_wait", 0.0)
+    
+    def _forget(self, jobs: List[Job]):
+        with self.lock:
+            for job in jobs:
+                self.held.pop(job.id, None)
+    
+    def _start_heartbeat(self, lease_seconds: float):
+        with self.lock:
+            if self.heartbeat_thread and self.heartbeat_thread.is_alive():
+                return
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, args=(lease_seconds,), daemon=True)
+            self.heartbeat_thread.start()
+    
+    def _heartbeat_loop(self, lease_seconds: float):
+        # Leases are renewed well before they expire, so a slow job is never
+        # reclaimed and run twice while this node is still alive. The server
+        # caps leases at a day, whatever was asked for.
+        while True:
+            time.sleep(max(1.0, min(lease_seconds, 24 * 3600) / 3))
+            with self.lock:
+                by_worker: Dict[str, List[str]] = {}
+                for job_id, (worker_id, _) in self.held.items():
+                    by_worker.setdefault(worker_id, []).append(job_id)
+                if not by_worker:
+                    self.heartbeat_thread = None
+                    return
+            
+            for worker_id, job_ids in by_worker.items():
+                try:
+                    response = self._request("POST", "/api/heartbeat", {
+                        "worker_id": worker_id,
+                        "job_ids": job_ids,
+                        "lease_seconds": lease_seconds
+                    })
+                except RuntimeError as e:
+                    print(f"Heartbeat failed: {e}")
+                    continue
+                
+                lost = set(job_ids) - set(response.get("held", []))
+                with self.lock:
+                    for job_id in lost:
+                        self.held.pop(job_id, None)
@@ -0,0 +1,174 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from .config import Config
+
+STRATEGIES = ("exponential", "fixed", "schedule")
+JITTER_MODES = ("full", "equal", "none")
+
+_VOLATILE = re.compile(r"0x[0-9a-fA-F]+|\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+
+
+def error_signature(error_message: Optional[str], failure_reason: Optional[str] = None) -> Optional[str]:
+    # Failures share a signature when their last error line matches once
+    # numbers, addresses and quoted values are masked, so "port 5432" and
+    # "port 5433" count as the same outage.
+    if not error_message:
+        return None
+    lines = [line.strip() for line in error_message.strip().splitlines() if line.strip()]
+    if not lines:
+        return None
+    normalized = _VOLATILE.sub("#", lines[-1])[:200]
+    return f"{failure_reason or 'error'}: {normalized}"
+
+
+class RetryPolicy:
+    
+    def __init__(
+        self,
+        strategy: str = "exponential",
+        base: float = 2.0,
+        max_delay: float = 3600.0,
+        jitter: str = "full",
+        schedule: Optional[List[float]] = None
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Retry strategy must be one of: {', '.join(STRATEGIES)}")
+        if jitter not in JITTER_MODES:
+            raise ValueError(f"Retry jitter must be one of: {', '.join(JITTER_MODES)}")
+        if not isinstance(base, (int, float)) or base <= 0:
+            raise ValueError("Retry base must be a positive number")
+        if not isinstance(max_delay, (int, float)) or max_delay < 0:
+            raise ValueError("Retry max_delay must be a non-negative number")
+        if strategy == "schedule" and (
+            not schedule or not all(isinstance(d, (int, float)) and d >= 0 for d in schedule)
+        ):
+            raise ValueError("A schedule retry policy needs a list of non-negative delays")
+        
+        self.strategy = strategy
+        self.base = base
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.schedule = schedule or []
+    
+    @classmethod
+    def for_job(cls, job, config: Config) -> "RetryPolicy":
+        options = {
+            "strategy": config.get("retry_strategy", "exponential"),
+            "base": config.get("backoff_base", 2.0),
+            "max_delay": config.get("retry_max_delay", 3600.0),
+            "jitter": config.get("retry_jitter", "full")
+        }
+        options.update(job.retry_policy or {})
+        return cls.from_dict(options)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RetryPolicy":
+        unknown = set(data) - {"strategy", "base", "max_delay", "jitter", "schedule"}
+        if unknown:
+            raise ValueError(f"Unknown retry policy fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+    
+    def delay(self, attempts: int) -> float:
+        if self.strategy == "schedule":
+            # Past the end of the schedule its last delay repeats.
+            ceiling = self.schedule[min(attempts, len(self.schedule)) - 1] if attempts > 0 else self.schedule[0]
+        elif self.strategy == "fixed":
+            ceiling = self.base
+        else:
+            try:
+                ceiling = self.base ** attempts
+            except OverflowError:
+                ceiling = float("inf")
+        ceiling = min(ceiling, self.max_delay)
+        
+        # Full jitter spreads retries over [0, delay] so jobs that failed
+        # together do not come back together; equal jitter keeps at least half.
+        if self.jitter == "full":
+            return random.uniform(0, ceiling)
+        if self.jitter == "equal":
+            return ceiling / 2 + random.uniform(0, ceiling / 2)
+        return ceiling
+
+
+class CircuitBreaker:
+    
+    def __init__(self, config: Config):
+        self.threshold = config.get("circuit_failure_threshold", 5)
+        self.window = config.get("circuit_window", 60.0)
+        self.cooldown = config.get("circuit_cooldown", 30.0)
+        self.lock = threading.Lock()
+        self.failures: Dict[str, Deque[float]] = {}
+        self.circuits: Dict[str, Dict[str, Any]] = {}
+    
+    def record(self, previous_signature: Optional[str], signature: Optional[str]):
+        # `previous_signature` is the error a job had before this run and
+        # `signature` the one it failed with now, or None if it succeeded.
+        if not self.threshold:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if signature is None:
+                self.failures.pop(previous_signature, None)
+                if self.circuits.pop(previous_signature, None):
+                    print(f"Circuit closed: {previous_signature}")
+                return
+            
+            previous = self.circuits.get(previous_signature)
+            if previous and previous["state"] == "half_open":
+                previous.update(state="open", opened_at=now, probe=None)
+                print(f"Circuit re-opened after failed probe: {previous_signature}")
+            if signature in self.circuits:
+                return
+            
+            failures = self.failures.setdefault(signature, deque())
+            failures.append(now)
+            while failures and now - failures[0] > self.window:
+                failures.popleft()
+            if len(failures) >= self.threshold:
+                self.circuits[signature] = {"state": "open", "opened_at": now, "probe": None}
+                del self.failures[signature]
+                print(f"Circuit opened after {self.threshold} failures: {signature}")
+    
+    def reserve(self) -> Dict[str, int]:
+        # Returns how many jobs of each tripped signature a claim may take:
+        # none while open, and a single probe once the cooldown has passed.
+        # A probe that never reports back (its worker died) is replaced after
+        # another cooldown.
+        now = time.monotonic()
+        allowance = {}
+        with self.lock:
+            for signature, circuit in self.circuits.items():
+                if circuit["state"] == "open" and now - circuit["opened_at"] >= self.cooldown:
+                    circuit["state"] = "half_open"
+                probe_lost = circuit["probe"] is not None and now - circuit["probe"] >= self.cooldown
+                if circuit["state"] == "half_open" and (circuit["probe"] is None or probe_lost):
+                    circuit["probe"] = now
+                    allowance[signature] = 1
+                else:
+                    allowance[signature] = 0
+        return allowance
+    
+    def settle(self, allowance: Dict[str, int], claimed_signatures: List[Optional[str]]):
+        # Probe slots that were reserved but not used are handed back.
+        with self.lock:
+            for signature, allowed in allowance.items():
+                circuit = self.circuits.get(signature)
+                if allowed and circuit and signature not in claimed_signatures:
+                    circuit["probe"] = None
+    
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "signature": signature,
+                    "state": circuit["state"],
+                    "open_for": round(now - circuit["opened_at"], 1),
+                    "probing": circuit["probe"] is not None
+                }
+                for signature, circuit in self.circuits.items()
+            ]
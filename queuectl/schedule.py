@@ -0,0 +1,404 @@
+import heapq
+import json
+import os
+import threading
+from functools import lru_cache
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from .commit import atomic_write, try_lock_file, unlock_file
+from .models import Job, JobState
+from .storage import JobStorage, parse_duration
+
+MISFIRE_POLICIES = ("coalesce", "skip", "queue")
+OVERLAP_POLICIES = ("queue", "skip", "coalesce")
+
+# Job fields a schedule may set on the instances it creates.
+TEMPLATE_FIELDS = (
+    "command", "max_retries", "priority", "cache_ttl", "limits", "retry_policy", "items", "item_mode", "batch_size"
+)
+
+# A fire this late counts as missed, e.g. because no scheduler was running.
+MISFIRE_GRACE_SECONDS = 60.0
+
+# With the `queue` misfire policy, at most this many missed fires are caught up.
+MAX_CATCHUP = 100
+
+# Past this many missed fires, e.g. a per-minute schedule after a week of
+# downtime, the rest are skipped without being enumerated.
+MAX_MISSED_SCAN = 10000
+
+_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *"
+}
+
+_MONTH_NAMES = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+_DAY_NAMES = ["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"]
+
+
+def _format_time(value: datetime) -> str:
+    return value.isoformat().replace('+00:00', 'Z')
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _parse_field(text: str, low: int, high: int, names: Optional[List[str]] = None) -> Set[int]:
+    def number(token: str) -> int:
+        if names and token.upper() in names:
+            return names.index(token.upper()) + low
+        return int(token)
+    
+    values: Set[int] = set()
+    for part in text.split(","):
+        body, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if body == "*":
+            start, end = low, high
+        elif "-" in body:
+            first, last = body.split("-", 1)
+            start, end = number(first), number(last)
+        else:
+            start = number(body)
+            end = high if step_text else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Invalid cron field '{text}'")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    
+    def __init__(self, expression: str):
+        fields = _MACROS.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have 5 fields: minute hour day month weekday")
+        try:
+            self.minutes = _parse_field(fields[0], 0, 59)
+            self.hours = _parse_field(fields[1], 0, 23)
+            self.days = _parse_field(fields[2], 1, 31)
+            self.months = _parse_field(fields[3], 1, 12, _MONTH_NAMES)
+            # Both 0 and 7 mean Sunday.
+            self.weekdays = {day % 7 for day in _parse_field(fields[4], 0, 7, _DAY_NAMES)}
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression '{expression}': {e}")
+        # As in cron, when both day fields are restricted either one matching is enough.
+        self.any_day = fields[2] != "*" and fields[4] != "*"
+    
+    def _day_matches(self, value: datetime) -> bool:
+        day = value.day in self.days
+        weekday = (value.weekday() + 1) % 7 in self.weekdays
+        return day or weekday if self.any_day else day and weekday
+    
+    def next_after(self, after: datetime) -> datetime:
+        # Jumps a whole month, day or hour at a time while that field does not
+        # match, so even a yearly expression takes a few hundred steps.
+        value = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after.year + 5
+        while value.year <= limit:
+            if value.month not in self.months:
+                value = (value.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(value):
+                value = value.replace(hour=0, minute=0) + timedelta(days=1)
+            elif value.hour not in self.hours:
+                value = value.replace(minute=0) + timedelta(hours=1)
+            else:
+                later = [minute for minute in self.minutes if minute >= value.minute]
+                if later:
+                    return value.replace(minute=min(later))
+                value = value.replace(minute=0) + timedelta(hours=1)
+        raise ValueError("Cron expression never fires")
+
+
+@lru_cache(maxsize=256)
+def _cron(expression: str) -> CronExpression:
+    return CronExpression(expression)
+
+
+def next_fire(definition: Dict[str, Any], after: datetime) -> datetime:
+    if definition.get("cron"):
+        return _cron(definition["cron"]).next_after(after)
+    # Intervals are counted from when the schedule was created, so fire
+    # times do not drift with however late each fire happened.
+    anchor = _parse_time(definition["created_at"])
+    every = definition["every"]
+    elapsed = max(0.0, (after - anchor).total_seconds())
+    return anchor + timedelta(seconds=(int(elapsed // every) + 1) * every)
+
+
+class ScheduleStore:
+    
+    def __init__(self, path: str = "schedules.json"):
+        self.path = Path(path)
+    
+    def stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, IOError):
+            return {}
+    
+    def save(self, schedules: Dict[str, Dict[str, Any]]):
+        try:
+            atomic_write(self.path, json.dumps(schedules, indent=2))
+        except OSError as e:
+            raise RuntimeError(f"Failed to save schedules: {e}")
+    
+    def add(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        schedule_id = data.get("id")
+        if not schedule_id or not data.get("command"):
+            raise ValueError("Schedule must have 'id' and 'command' fields")
+        if bool(data.get("cron")) == bool(data.get("every")):
+            raise ValueError("Schedule needs exactly one of 'cron' or 'every'")
+        misfire = data.get("misfire", "coalesce")
+        overlap = data.get("overlap", "queue")
+        if misfire not in MISFIRE_POLICIES:
+            raise ValueError(f"misfire must be one of: {', '.join(MISFIRE_POLICIES)}")
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"overlap must be one of: {', '.join(OVERLAP_POLICIES)}")
+        
+        now = datetime.now(timezone.utc)
+        definition = {
+            "id": schedule_id,
+            "cron": data.get("cron"),
+            "every": parse_duration(data["every"]) if data.get("every") else None,
+            "misfire": misfire,
+            "overlap": overlap,
+            "job": {field: data[field] for field in TEMPLATE_FIELDS if data.get(field) is not None},
+            "enabled": True,
+            "created_at": _format_time(now),
+            "last_fire_at": None,
+            "last_job_id": None,
+            "fired": 0,
+            "skipped": 0
+        }
+        if definition["every"] is not None and definition["every"] < 1:
+            raise ValueError("every must be at least one second")
+        definition["next_fire_at"] = _format_time(next_fire(definition, now))
+        
+        schedules = self.load()
+        if schedule_id in schedules:
+            raise ValueError(f"Schedule '{schedule_id}' already exists")
+        schedules[schedule_id] = definition
+        self.save(schedules)
+        return definition
+    
+    def remove(self, schedule_id: str) -> bool:
+        schedules = self.load()
+        if schedules.pop(schedule_id, None) is None:
+            return False
+        self.save(schedules)
+        return True
+    
+    def set_enabled(self, schedule_id: str, enabled: bool) -> bool:
+        schedules = self.load()
+        definition = schedules.get(schedule_id)
+        if definition is None:
+            return False
+        definition["enabled"] = enabled
+        if enabled:
+            # A resumed schedule starts from now rather than catching up on
+            # the time it was paused.
+            definition["next_fire_at"] = _format_time(next_fire(definition, datetime.now(timezone.utc)))
+        self.save(schedules)
+        return True
+
+
+class Scheduler:
+    
+    def __init__(self, storage: JobStorage, store: Optional[ScheduleStore] = None):
+        self.storage = storage
+        self.store = store or ScheduleStore()
+        self.lock_path = self.store.path.with_suffix(".lock")
+        self.lock_fd: Optional[int] = None
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        self.heap: List[Tuple[datetime, str]] = []
+        self.loaded_stamp = None
+        self.leader = False
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self._release_lock()
+        self.leader = False
+    
+    def _hold_lock(self) -> bool:
+        # Only one process fires schedules: the one holding an flock on the
+        # lock file, which the kernel releases if that process dies. Instance
+        # ids are derived from fire times and enqueued as conditional inserts,
+        # so a fire that both the old and new holder reach is enqueued once.
+        if self.lock_fd is None:
+            self.lock_fd = try_lock_file(self.lock_path)
+        return self.lock_fd is not None
+    
+    def _release_lock(self):
+        if self.lock_fd is not None:
+            unlock_file(self.lock_path, self.lock_fd)
+            self.lock_fd = None
+    
+    def _refresh(self, force: bool = False):
+        stamp = self.store.stamp()
+        if stamp == self.loaded_stamp and not force:
+            return
+        self.schedules = self.store.load()
+        self.loaded_stamp = stamp
+        self.heap = [
+            (_parse_time(definition["next_fire_at"]), schedule_id)
+            for schedule_id, definition in self.schedules.items()
+            if definition.get("enabled", True) and definition.get("next_fire_at")
+        ]
+        heapq.heapify(self.heap)
+    
+    def _run(self):
+        while not self.stop_event.is_set():
+            delay = 1.0
+            try:
+                leader = self._hold_lock()
+                if leader:
+                    self._refresh(force=not self.leader)
+                    now = datetime.now(timezone.utc)
+                    while self.heap and self.heap[0][0] <= now:
+                        _, schedule_id = heapq.heappop(self.heap)
+                        self._fire(schedule_id, now)
+                    if self.heap:
+                        delay = (self.heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+                self.leader = leader
+            except Exception as e:
+                print(f"Scheduler error: {e}")
+                # Rebuild the heap from the file, in case a schedule was
+                # popped but not pushed back.
+                self.loaded_stamp = None
+            # Waking at least once a second picks up schedules added by other
+            # processes, and lets a waiting process take over the lock soon
+            # after its holder stops.
+            self.stop_event.wait(min(max(delay, 0.01), 1.0))
+    
+    def _fire(self, schedule_id: str, now: datetime):
+        definition = self.schedules.get(schedule_id)
+        if not definition or not definition.get("enabled", True):
+            return
+        
+        due: Deque[datetime] = deque(maxlen=MAX_CATCHUP)
+        missed = 0
+        fire_at = _parse_time(definition["next_fire_at"])
+        while fire_at <= now:
+            due.append(fire_at)
+            missed += 1
+            if missed >= MAX_MISSED_SCAN:
+                fire_at = next_fire(definition, now)
+                break
+            fire_at = next_fire(definition, fire_at)
+        
+        # Normally exactly one fire is due. More than one means fires were
+        # missed, and the misfire policy decides how many instances they get.
+        misfire = definition.get("misfire", "coalesce")
+        if misfire == "queue":
+            planned = list(due)
+        elif misfire == "skip":
+            planned = [due[-1]] if (now - due[-1]).total_seconds() <= MISFIRE_GRACE_SECONDS else []
+        else:
+            planned = [due[-1]]
+        
+        fired = 0
+        for fire_time in planned:
+            if self._overlaps(definition):
+                continue
+            job = self._instance(definition, fire_time)
+            try:
+                if self.storage.get_job(job.id) is None:
+                    self.storage.enqueue_job(job)
+            except ValueError as e:
+                # Losing the insert to a previous lock holder that fired this
+                # same instance still counts as the fire.
+                if self.storage.get_job(job.id) is None:
+                    print(f"Schedule '{schedule_id}' could not enqueue '{job.id}': {e}")
+                    continue
+            definition["last_job_id"] = job.id
+            fired += 1
+        
+        definition["last_fire_at"] = _format_time(due[-1])
+        definition["next_fire_at"] = _format_time(fire_at)
+        definition["fired"] = definition.get("fired", 0) + fired
+        definition["skipped"] = definition.get("skipped", 0) + missed - fired
+        heapq.heappush(self.heap, (fire_at, schedule_id))
+        self._save(schedule_id, definition)
+    
+    def _overlaps(self, definition: Dict[str, Any]) -> bool:
+        overlap = definition.get("overlap", "queue")
+        if overlap == "queue" or not definition.get("last_job_id"):
+            return False
+        previous = self.storage.get_job(definition["last_job_id"])
+        if previous is None:
+            return False
+        if overlap == "coalesce":
+            # An instance that has not started yet will do this fire's work too.
+            return previous.state == JobState.PENDING
+        return previous.state in (JobState.PENDING, JobState.PROCESSING) or (
+            previous.state == JobState.FAILED and previous.should_retry()
+        )
+    
+    def _instance(self, definition: Dict[str, Any], fire_time: datetime) -> Job:
+        template = definition["job"]
+        return Job(
+            job_id=f"{definition['id']}@{fire_time.strftime('%Y%m%dT%H%M%SZ')}",
+            command=template["command"],
+            max_retries=template.get("max_retries", 3),
+            priority=template.get("priority", 5),
+            cache_ttl=template.get("cache_ttl"),
+            limits=template.get("limits"),
+            retry_policy=template.get("retry_policy"),
+            items=template.get("items"),
+            item_mode=template.get("item_mode"),
+            batch_size=template.get("batch_size")
+        )
+    
+    def _save(self, schedule_id: str, definition: Dict[str, Any]):
+        # Only this schedule's bookkeeping is written back, over a fresh read,
+        # so schedules added or paused meanwhile by the CLI are kept.
+        schedules = self.store.load()
+        current = schedules.get(schedule_id)
+        if current is None or current.get("created_at") != definition.get("created_at"):
+            return
+        if not current.get("enabled", True):
+            return
+        for key in ("last_fire_at", "next_fire_at", "last_job_id", "fired", "skipped"):
+            current[key] = definition[key]
+        self.store.save(schedules)
+        
+        # The heap stays valid unless someone else changed the file too;
+        # then the next pass rebuilds it.
+        others = {key: value for key, value in schedules.items() if key != schedule_id}
+        if others == {key: value for key, value in self.schedules.items() if key != schedule_id}:
+            self.schedules[schedule_id] = current
+            self.loaded_stamp = self.store.stamp()
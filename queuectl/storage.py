@@ -1,115 +1,1495 @@
+import bisect
+import heapq
 import json
 import os
+import re
 import threading
-from datetime import datetime, timezone
+import time
+import zlib
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple
+from .commit import FileLock, GroupCommitter, atomic_write
+from .config import Config
 from .models import Job, JobState
 
+# Everything else (sqlite3 for the search index, subprocess via the executor)
+# is imported where it is used, so that opening a store stays cheap.
+if TYPE_CHECKING:
+    from .index import JobIndex
 
-class JobStorage:
+
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _is_due(value: Optional[str], now: datetime) -> bool:
+    if not value:
+        return True
+    try:
+        return _parse_timestamp(value) <= now
+    except (ValueError, AttributeError):
+        return True
+
+
+def parse_duration(value: str) -> float:
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Invalid duration '{value}', expected e.g. 30s, 15m, 12h or 7d")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+
+
+def _iter_json_object(f: IO[str], chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    # Decodes a top-level JSON object one member at a time, so a shard file
+    # can be walked while holding only the current job in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
     
-    def __init__(self, storage_path: str = "jobs.json"):
-        self.storage_path = Path(storage_path)
-        self.lock = threading.Lock()
-        self._ensure_storage_file()
+    def read(size: int):
+        nonlocal buffer, pos, eof
+        chunk = f.read(size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+    
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            read(chunk_size)
+    
+    def decode() -> Any:
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number at the very end of the buffer may continue in the
+                # next chunk.
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            # Reading as much again as is buffered keeps large values linear.
+            read(max(chunk_size, len(buffer) - pos))
     
-    def _ensure_storage_file(self):
-        if not self.storage_path.exists():
-            with open(self.storage_path, 'w') as f:
+    skip_whitespace()
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != "{":
+        raise ValueError("Expected a JSON object")
+    pos += 1
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON object")
+        if buffer[pos] == "}":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            skip_whitespace()
+        key = decode()
+        skip_whitespace()
+        if pos >= len(buffer) or buffer[pos] != ":":
+            raise ValueError(f"Expected ':' after key {key!r}")
+        pos += 1
+        skip_whitespace()
+        yield key, decode()
+
+
+IN_FLIGHT_STATES = (JobState.PENDING.value, JobState.PROCESSING.value, JobState.FAILED.value)
+
+
+def _ready_key(job_data: dict) -> Tuple[int, str, str]:
+    return (-job_data.get("priority", 5), job_data.get("created_at") or "", job_data["id"])
+
+
+def _encode_line(job_id: str, job_data: dict) -> str:
+    return f"  {json.dumps(job_id)}: {json.dumps(job_data)}"
+
+
+def _join_lines(lines: Dict[str, str]) -> str:
+    return "{\n" + ",\n".join(lines.values()) + "\n}\n" if lines else "{}\n"
+
+
+def _created_key(job_data: dict) -> Tuple[str, str]:
+    return (job_data.get("created_at") or "", job_data["id"])
+
+
+def _rank_starts(runs: List[list], rank: int) -> List[int]:
+    # Positions in each sorted run (of distinct keys) that together skip the
+    # `rank` smallest keys overall. The key of that rank is binary searched
+    # for in each run in turn, ranking candidates by bisecting every run.
+    for run in runs:
+        low, high = 0, len(run)
+        while low < high:
+            middle = (low + high) // 2
+            starts = [bisect.bisect_left(other, run[middle]) for other in runs]
+            below = sum(starts)
+            if below == rank:
+                return starts
+            if below < rank:
+                low = middle + 1
+            else:
+                high = middle
+    return [len(run) for run in runs]
+
+
+def _sorted_update(entries: list, key: tuple, add: bool):
+    position = bisect.bisect_left(entries, key)
+    if add:
+        entries.insert(position, key)
+    elif position < len(entries) and entries[position] == key:
+        del entries[position]
+
+
+class StorageShard:
+    
+    def __init__(self, index: int, path: Path, committer_options: Optional[dict] = None):
+        self.index = index
+        self.path = path
+        self.lock = threading.RLock()
+        self.ready_index: List[Tuple[int, str, str]] = []
+        self.retry_index: List[Tuple[str, str]] = []
+        self.lease_index: List[Tuple[str, str]] = []
+        # state -> [(created_at, id)], sorted, for paging through listings.
+        self.created_index: Dict[str, List[Tuple[str, str]]] = {}
+        self.idempotency_index: Dict[str, Set[str]] = {}
+        # parent id -> {child id: times the child lists that parent}
+        self.dependents_index: Dict[str, Dict[str, int]] = {}
+        self.blocked_index: Set[str] = set()
+        self.state_counts: Dict[str, int] = {}
+        self.search_index: Optional["JobIndex"] = None
+        self.open_search_index: Optional[Callable[[], Optional["JobIndex"]]] = None
+        # `jobs` is the shard as this process last read or wrote it, as of
+        # `stamp`. `view` adds the writes still queued in the committer; it is
+        # what load() returns and what the indexes describe.
+        self.jobs: Dict[str, dict] = {}
+        self.stamp: Optional[str] = None
+        self.view: Dict[str, dict] = {}
+        self.view_resets: Optional[int] = None
+        self.lines: Optional[Dict[str, str]] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Held around every write, from the re-read to the rename, so that
+        # processes sharing the store never write over each other's changes.
+        # Take it before `lock`, never while holding it.
+        self.file_lock = FileLock(path.with_suffix(".lock"))
+        self.committer = GroupCommitter(self._write_batch, **(committer_options or {}))
+        self._ensure_file()
+    
+    def _ensure_file(self):
+        if not self.path.exists():
+            with open(self.path, 'w') as f:
                 json.dump({}, f)
     
-    def _load_jobs(self) -> Dict[str, dict]:
+    def _read_file(self) -> Dict[str, dict]:
+        try:
+            if not self.path.exists():
+                return {}
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, IOError):
+            return {}
+    
+    def load(self) -> Dict[str, dict]:
+        # The view follows this process's own writes as they are submitted,
+        # so it is only rebuilt when the files on disk changed underneath it
+        # or queued writes were dropped. Polling an idle store costs a stat.
+        # Callers must treat the returned dict as read-only.
         with self.lock:
+            stamp = self.file_stamp()
+            resets = self.committer.resets
+            if stamp == self.stamp and self.view_resets == resets:
+                self.cache_hits += 1
+                return self.view
+            
+            self.cache_misses += 1
+            if stamp != self.stamp:
+                self._absorb(self._reload())
+                self.stamp = stamp
+            if self.view_resets != resets:
+                self.view = dict(self.committer.overlay(self.jobs))
+                self._rebuild_indexes(self.view)
+                self.view_resets = resets
+            return self.view
+    
+    def _reload(self) -> Optional[Dict[str, Optional[dict]]]:
+        # Catches `jobs` up with the files. Returns the records that changed,
+        # or None when only a rebuild of the view will do.
+        self.jobs = self._read_file()
+        self.lines = None
+        return None
+    
+    def _absorb(self, changes: Optional[Dict[str, Optional[dict]]]):
+        # Records written by another process reach the view unless this
+        # process has a newer write of its own queued for the same job.
+        if changes is None:
+            self.view_resets = None
+            return
+        pending = self.committer.pending_ops() if changes else {}
+        for job_id, job_data in changes.items():
+            if job_id not in pending:
+                self._update_view(job_id, job_data)
+    
+    def existing(self, job_ids: Iterable[str]) -> List[str]:
+        with self.lock:
+            jobs = self.load()
+            return [job_id for job_id in job_ids if job_id in jobs]
+    
+    def _stream_file(self) -> Iterator[Tuple[str, dict]]:
+        try:
+            f = open(self.path, 'r')
+        except FileNotFoundError:
+            return
+        with f:
             try:
-                if not self.storage_path.exists():
-                    return {}
-                with open(self.storage_path, 'r') as f:
-                    data = json.load(f)
-                    return data if isinstance(data, dict) else {}
-            except (json.JSONDecodeError, IOError):
-                return {}
+                yield from _iter_json_object(f)
+            except ValueError as e:
+                raise RuntimeError(f"Failed to read {self.path}: {e}")
     
-    def _save_jobs(self, jobs: Dict[str, dict]):
+    def iter_jobs(self) -> Iterator[dict]:
+        # A current view is reused; otherwise the file is streamed rather
+        # than parsed whole, and never becomes the view. The lock is not held
+        # while the caller consumes the jobs.
         with self.lock:
+            if self.stamp == self.file_stamp() and self.view_resets == self.committer.resets:
+                cached = list(self.view.values())
+            else:
+                cached = None
+                # Taken before the file is opened, so a batch landing in
+                # between shows up in one or the other.
+                pending = self.committer.pending_ops()
+        
+        if cached is not None:
+            yield from cached
+            return
+        
+        for job_id, job_data in self._stream_file():
+            if job_id in pending:
+                job_data = pending.pop(job_id)
+                if job_data is None:
+                    continue
+            yield job_data
+        for job_data in pending.values():
+            if job_data is not None:
+                yield job_data
+    
+    def save(self, jobs: Dict[str, dict]):
+        self.committer.flush()
+        with self.file_lock, self.lock:
+            lines = {job_id: _encode_line(job_id, job_data) for job_id, job_data in jobs.items()}
             try:
-                with open(self.storage_path, 'w') as f:
-                    json.dump(jobs, f, indent=2)
-            except IOError as e:
+                atomic_write(self.path, _join_lines(lines))
+            except OSError as e:
                 raise RuntimeError(f"Failed to save jobs: {e}")
+            self.file_lock.bump()
+            self.jobs = dict(jobs)
+            self.lines = lines
+            self.stamp = self.file_stamp()
+            self.view_resets = None
+            if self._search_index():
+                self.search_index.rebuild_shard(self.index, jobs, self.file_stamp())
+    
+    def submit(self, ops: Dict[str, Optional[dict]], expected: Optional[Dict[str, Optional[dict]]] = None) -> int:
+        # Queued writes reach the view and its indexes right away, a record
+        # at a time, instead of through a rebuild of the whole shard. Writes
+        # listed in `expected` only land if the job is still stored as given.
+        with self.lock:
+            ticket = self.committer.submit(ops, expected)
+            for job_id, job_data in ops.items():
+                self._update_view(job_id, job_data)
+            return ticket
+    
+    def commit(self, ops: Dict[str, Optional[dict]]):
+        self.committer.wait(self.submit(ops))
+    
+    def _search_index(self) -> Optional["JobIndex"]:
+        # The index can be created by any process at any time, so writes
+        # look for it until it exists and keep it current from then on.
+        if self.search_index is None and self.open_search_index is not None:
+            self.search_index = self.open_search_index()
+        return self.search_index
+    
+    def remove(self):
+        if self.path.exists():
+            self.path.unlink()
+        self.file_lock.close()
+        if self.file_lock.path.exists():
+            self.file_lock.path.unlink()
+    
+    def stats(self) -> Dict[str, float]:
+        return {}
+    
+    def _stat_paths(self) -> List[Path]:
+        return [self.path]
+    
+    def file_stamp(self) -> str:
+        # A file rewritten twice within one filesystem timestamp tick can keep
+        # its inode, mtime and size, so every rewrite also bumps the lock
+        # file's sequence number (appends to a WAL only ever grow the log).
+        # The sequence is read first, as writers bump it last.
+        stamps = [str(self.file_lock.sequence())]
+        for path in self._stat_paths():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stamps.append("missing")
+                continue
+            stamps.append(f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}")
+        return "/".join(stamps)
+    
+    def _write_batch(self, ops: Dict[str, Optional[dict]], sync: bool, expected: Dict[str, Optional[dict]]) -> List[str]:
+        # Another process can only write between our writes, never during
+        # one, so whatever it wrote is read back in before ours goes on top.
+        # Conditional writes that no longer match the file are rejected.
+        with self.file_lock, self.lock:
+            previous_stamp = self.file_stamp()
+            if previous_stamp != self.stamp:
+                self._absorb(self._reload())
+            rejected = [job_id for job_id, job_data in expected.items() if self.jobs.get(job_id) != job_data]
+            if rejected:
+                ops = {job_id: job_data for job_id, job_data in ops.items() if job_id not in rejected}
+            # The file holds one job per line, and each job's line is kept
+            # between writes, so a write encodes only the jobs it changes.
+            # (json.dumps with an indent re-encodes every job in pure Python.)
+            jobs = dict(self.jobs)
+            if self.lines is None:
+                self.lines = {job_id: _encode_line(job_id, job_data) for job_id, job_data in jobs.items()}
+            lines = dict(self.lines)
+            for job_id, job_data in ops.items():
+                if job_data is None:
+                    jobs.pop(job_id, None)
+                    lines.pop(job_id, None)
+                else:
+                    jobs[job_id] = job_data
+                    lines[job_id] = _encode_line(job_id, job_data)
+            atomic_write(self.path, _join_lines(lines), sync=sync)
+            self.file_lock.bump()
+            # These are exactly the contents just written, and the view already
+            # holds them, so only another process's write makes load() read
+            # the file again.
+            self.jobs = jobs
+            self.lines = lines
+            self.stamp = self.file_stamp()
+            if self._search_index():
+                self.search_index.apply(self.index, ops, previous_stamp, self.file_stamp())
+            return rejected
+    
+    def _update_view(self, job_id: str, job_data: Optional[dict]):
+        previous = self.view.get(job_id)
+        if previous is not None:
+            self._index_job(previous, add=False)
+        if job_data is None:
+            self.view.pop(job_id, None)
+        else:
+            self.view[job_id] = job_data
+            self._index_job(job_data, add=True)
+    
+    def _index_job(self, job_data: dict, add: bool):
+        # Adds one record to the indexes, or takes it back out; the same
+        # rules as _rebuild_indexes, applied to a single job.
+        job_id = job_data["id"]
+        state = job_data.get("state")
+        self.state_counts[state] = self.state_counts.get(state, 0) + (1 if add else -1)
+        _sorted_update(self.created_index.setdefault(state, []), _created_key(job_data), add)
+        if state == JobState.PENDING.value:
+            for parent_id in job_data.get("depends_on") or []:
+                children = self.dependents_index.setdefault(parent_id, {})
+                count = children.get(job_id, 0) + (1 if add else -1)
+                if count > 0:
+                    children[job_id] = count
+                else:
+                    children.pop(job_id, None)
+                if not children:
+                    del self.dependents_index[parent_id]
+            if job_data.get("unmet_dependencies", 0) > 0:
+                if add:
+                    self.blocked_index.add(job_id)
+                else:
+                    self.blocked_index.discard(job_id)
+            else:
+                _sorted_update(self.ready_index, _ready_key(job_data), add)
+        elif state == JobState.FAILED.value and job_data.get("attempts", 0) < job_data.get("max_retries", 3):
+            _sorted_update(self.retry_index, (job_data.get("next_retry_at") or "", job_id), add)
+        elif state == JobState.PROCESSING.value and job_data.get("lease_expires_at"):
+            _sorted_update(self.lease_index, (job_data["lease_expires_at"], job_id), add)
+        
+        key = job_data.get("idempotency_key")
+        if key and state in IN_FLIGHT_STATES:
+            job_ids = self.idempotency_index.setdefault(key, set())
+            if add:
+                job_ids.add(job_id)
+            else:
+                job_ids.discard(job_id)
+            if not job_ids:
+                del self.idempotency_index[key]
+    
+    def _rebuild_indexes(self, jobs: Dict[str, dict]):
+        ready = []
+        retry = []
+        leases = []
+        keys: Dict[str, Set[str]] = {}
+        dependents: Dict[str, Dict[str, int]] = {}
+        blocked = set()
+        counts: Dict[str, int] = {}
+        created: Dict[str, List[Tuple[str, str]]] = {}
+        
+        for job_data in jobs.values():
+            state = job_data.get("state")
+            counts[state] = counts.get(state, 0) + 1
+            created.setdefault(state, []).append(_created_key(job_data))
+            if state == JobState.PENDING.value:
+                for parent_id in job_data.get("depends_on") or []:
+                    children = dependents.setdefault(parent_id, {})
+                    children[job_data["id"]] = children.get(job_data["id"], 0) + 1
+                if job_data.get("unmet_dependencies", 0) > 0:
+                    blocked.add(job_data["id"])
+                else:
+                    ready.append(_ready_key(job_data))
+            elif state == JobState.FAILED.value and job_data.get("attempts", 0) < job_data.get("max_retries", 3):
+                retry.append((job_data.get("next_retry_at") or "", job_data["id"]))
+            elif state == JobState.PROCESSING.value and job_data.get("lease_expires_at"):
+                leases.append((job_data["lease_expires_at"], job_data["id"]))
+            
+            if job_data.get("idempotency_key") and state in IN_FLIGHT_STATES:
+                keys.setdefault(job_data["idempotency_key"], set()).add(job_data["id"])
+        
+        ready.sort()
+        retry.sort()
+        leases.sort()
+        for entries in created.values():
+            entries.sort()
+        self.ready_index = ready
+        self.retry_index = retry
+        self.lease_index = leases
+        self.idempotency_index = keys
+        self.dependents_index = dependents
+        self.blocked_index = blocked
+        self.state_counts = counts
+        self.created_index = created
+    
+    def ready_candidates(self, now: datetime, limit: Optional[int]) -> List[dict]:
+        with self.lock:
+            jobs = self.load()
+            candidates = []
+            for _, _, job_id in self.ready_index:
+                job_data = jobs[job_id]
+                if _is_due(job_data.get("run_at"), now):
+                    candidates.append(job_data)
+                    if limit is not None and len(candidates) >= limit:
+                        break
+            return candidates
+    
+    def retry_candidates(self, now: datetime, limit: Optional[int]) -> List[dict]:
+        with self.lock:
+            jobs = self.load()
+            candidates = []
+            for _, job_id in self.retry_index:
+                job_data = jobs[job_id]
+                if not _is_due(job_data.get("next_retry_at"), now):
+                    break
+                candidates.append(job_data)
+                if limit is not None and len(candidates) >= limit:
+                    break
+            return candidates
+    
+    def claim_many(
+        self,
+        claims: List[Tuple[str, JobState]],
+        worker_id: Optional[str] = None,
+        lease_expires_at: Optional[str] = None
+    ) -> Tuple[List[Job], int]:
+        with self.lock:
+            jobs = self.load()
+            claimed = []
+            for job_id, expected_state in claims:
+                job_data = jobs.get(job_id)
+                if not job_data or job_data.get("state") != expected_state.value:
+                    continue
+                job = Job.from_dict(job_data)
+                job.mark_processing()
+                job.worker_id = worker_id
+                job.lease_expires_at = lease_expires_at
+                claimed.append(job)
+            
+            # The claims are visible to other claimers as soon as they are
+            # submitted, so the durable write is awaited outside the shard lock.
+            # Each claim is conditional on the job as seen here, so of two
+            # processes claiming the same job only the first write lands.
+            ticket = self.submit(
+                {job.id: job.to_dict() for job in claimed},
+                {job.id: jobs[job.id] for job in claimed}
+            ) if claimed else 0
+            return claimed, ticket
+    
+    def release(self, job_ids: List[str], worker_id: Optional[str] = None) -> int:
+        with self.lock:
+            jobs = self.load()
+            ops = {}
+            for job_id in job_ids:
+                job_data = jobs.get(job_id)
+                if not job_data or job_data.get("state") != JobState.PROCESSING.value:
+                    continue
+                if job_data.get("worker_id") != worker_id:
+                    continue
+                job = Job.from_dict(job_data)
+                job.release()
+                ops[job_id] = job.to_dict()
+            return self.submit(ops, {job_id: jobs[job_id] for job_id in ops}) if ops else 0
+    
+    def extend_leases(self, job_ids: List[str], worker_id: str, lease_expires_at: str) -> Tuple[List[str], int]:
+        with self.lock:
+            jobs = self.load()
+            ops = {}
+            for job_id in job_ids:
+                job_data = jobs.get(job_id)
+                if not job_data or job_data.get("state") != JobState.PROCESSING.value:
+                    continue
+                if job_data.get("worker_id") != worker_id:
+                    continue
+                ops[job_id] = dict(job_data, lease_expires_at=lease_expires_at)
+            return list(ops), self.submit(ops, {job_id: jobs[job_id] for job_id in ops}) if ops else 0
+    
+    def reclaim_expired(self, now: datetime) -> int:
+        with self.lock:
+            jobs = self.load()
+            expired = [job_id for expires_at, job_id in self.lease_index if _is_due(expires_at, now)]
+            if not expired:
+                return 0
+            ops = {}
+            for job_id in expired:
+                job = Job.from_dict(jobs[job_id])
+                job.release()
+                ops[job_id] = job.to_dict()
+            return self.submit(ops, {job_id: jobs[job_id] for job_id in ops})
+
+
+class JobStorage:
+    
+    def __init__(
+        self,
+        storage_path: str = "jobs.json",
+        shards: int = 1,
+        durability: str = "fsync",
+        commit_window: float = 0.002,
+        commit_batch: int = 64,
+        backend: str = "json",
+        wal_compact_records: int = 10000,
+        tracing: bool = True
+    ):
+        if shards < 1:
+            raise ValueError("Storage shard count must be at least 1")
+        if backend not in ("json", "wal"):
+            raise ValueError(f"Unknown storage backend: {backend}")
+        
+        self.storage_path = Path(storage_path)
+        self.shard_count = shards
+        self.backend = backend
+        self.wal_compact_records = wal_compact_records
+        self.committer_options = {"durability": durability, "window": commit_window, "max_batch": commit_batch}
+        paths = self._shard_paths()
+        strays = self._stray_shard_files(paths)
+        if backend == "json":
+            self._fold_write_ahead_logs(paths + strays)
+        # Shard files left over from a different shard count are merged back
+        # into the current layout, so changing `storage_shards` never loses jobs.
+        layout_changed = bool(strays) or (
+            shards > 1 and any(p.exists() for p in paths) and not all(p.exists() for p in paths)
+        )
+        self.shards = [self._open_shard(i, path) for i, path in enumerate(paths)]
+        self.enqueue_lock = threading.Lock()
+        self.dependency_lock = threading.RLock()
+        self.work_available = threading.Condition()
+        self.last_blocked_sweep = 0.0
+        if layout_changed:
+            self._rebalance(strays)
+        
+        # The search index is only maintained on writes once something has
+        # searched this store; until then writes pay a stat call for it.
+        self.search_index_path = self.storage_path.with_name(f"{self.storage_path.stem}.index.db")
+        self.search_index: Optional["JobIndex"] = None
+        self.search_index_lock = threading.Lock()
+        for shard in self.shards:
+            shard.open_search_index = self._open_search_index
+        
+        from .timeseries import MetricsHistory
+        from .trace import Tracer
+        self.history = MetricsHistory(self.storage_path.with_name(f"{self.storage_path.stem}.metrics.json"))
+        self.tracer = Tracer(self.storage_path.with_name(f"{self.storage_path.stem}.trace.jsonl"), enabled=tracing)
+    
+    def _open_shard(self, index: int, path: Path) -> StorageShard:
+        if self.backend == "wal":
+            from .wal import WalShard
+            return WalShard(index, path, self.committer_options, compact_records=self.wal_compact_records)
+        return StorageShard(index, path, self.committer_options)
+    
+    def _fold_write_ahead_logs(self, paths: List[Path]):
+        # A store previously opened with the WAL backend still has records in
+        # its log; fold them into the snapshot so the JSON backend sees them.
+        for path in paths:
+            if path.with_suffix(".wal").exists() or path.with_suffix(".wal.old").exists():
+                from .wal import WalShard
+                shard = WalShard(-1, path)
+                shard.save(shard.load())
+    
+    def _shard_paths(self) -> List[Path]:
+        if self.shard_count == 1:
+            return [self.storage_path]
+        return [
+            self.storage_path.with_name(f"{self.storage_path.stem}.{i}{self.storage_path.suffix}")
+            for i in range(self.shard_count)
+        ]
+    
+    def _stray_shard_files(self, layout: List[Path]) -> List[Path]:
+        pattern = re.compile(rf"^{re.escape(self.storage_path.stem)}\.\d+{re.escape(self.storage_path.suffix)}$")
+        directory = self.storage_path.parent
+        candidates = [p for p in directory.iterdir() if pattern.match(p.name)] if directory.exists() else []
+        if self.storage_path.exists():
+            candidates.append(self.storage_path)
+        return [p for p in candidates if p not in layout]
+    
+    def _rebalance(self, strays: List[Path]):
+        jobs: Dict[str, dict] = {}
+        stray_shards = [self._open_shard(-1, path) for path in strays]
+        for shard in stray_shards:
+            jobs.update(shard.load())
+        for shard in self.shards:
+            jobs.update(shard.load())
+        
+        buckets: List[Dict[str, dict]] = [{} for _ in self.shards]
+        for job_id, job_data in jobs.items():
+            buckets[self._shard_index(job_id)][job_id] = job_data
+        for shard, bucket in zip(self.shards, buckets):
+            shard.save(bucket)
+        for shard in stray_shards:
+            shard.remove()
+    
+    def _shard_index(self, job_id: str) -> int:
+        return zlib.crc32(job_id.encode("utf-8")) % self.shard_count
+    
+    def _shard_for(self, job_id: str) -> StorageShard:
+        return self.shards[self._shard_index(job_id)]
+    
+    def _load_jobs(self) -> Dict[str, dict]:
+        jobs: Dict[str, dict] = {}
+        for shard in self.shards:
+            jobs.update(shard.load())
+        return jobs
     
     def save_job(self, job: Job):
-        jobs = self._load_jobs()
-        jobs[job.id] = job.to_dict()
-        self._save_jobs(jobs)
+        self.save_jobs([job])
+    
+    def enqueue_job(self, job: Job) -> Tuple[Job, bool]:
+        # Enqueues sharing an idempotency key with an in-flight job collapse
+        # onto that job instead of creating a duplicate.
+        with self.enqueue_lock:
+            if job.idempotency_key:
+                existing = self.find_in_flight(job.idempotency_key)
+                if existing:
+                    return existing, False
+            
+            if job.depends_on:
+                parents = {parent_id: self.get_job(parent_id) for parent_id in job.depends_on}
+                missing = [parent_id for parent_id, parent in parents.items() if parent is None]
+                if missing:
+                    raise ValueError(f"Unknown dependencies: {', '.join(missing)}")
+                failed = [parent_id for parent_id, parent in parents.items() if parent.state == JobState.DEAD]
+                if failed:
+                    job.mark_dead(f"Dependency '{failed[0]}' failed")
+            
+            batches = []
+            if job.items is not None:
+                batches = self._expand_fanout(job)
+                # Batches are stored first, so the parent counts them as unmet.
+                if batches:
+                    self._insert_new(batches)
+            try:
+                self._insert_new([job])
+            except ValueError:
+                self._discard(batches)
+                raise
+        batch_ids = job.depends_on if job.fanout else []
+        for job_id in batch_ids + [job.id]:
+            self.tracer.record(job_id, "enqueued")
+        if job.state == JobState.PENDING and job.depends_on and not job.fanout and not job.unmet_dependencies:
+            self.tracer.record(job.id, "ready")
+        self.history.record_enqueued(1 + len(batch_ids), self.queue_depth())
+        return job, True
+    
+    def _insert_new(self, jobs: List[Job]):
+        # Each insert only lands if no job with its id is stored yet, so two
+        # processes enqueuing the same id cannot both think they created it.
+        lost = self.save_jobs(jobs, {job.id: None for job in jobs})
+        if lost:
+            self._discard([job for job in jobs if job.id not in lost])
+            raise ValueError(f"Job with id '{min(lost)}' already exists")
+    
+    def _discard(self, jobs: List[Job]):
+        # Takes back jobs this process just inserted, unless they changed since.
+        by_shard: Dict[int, Dict[str, Optional[dict]]] = {}
+        for job in jobs:
+            by_shard.setdefault(self._shard_index(job.id), {})[job.id] = job.to_dict()
+        self._wait_all([
+            (self.shards[index], self.shards[index].submit(dict.fromkeys(expected), expected))
+            for index, expected in by_shard.items()
+        ], force=True)
+    
+    def _expand_fanout(self, job: Job) -> List[Job]:
+        # A fan-out job becomes one batch job per `batch_size` items. The
+        # parent keeps only counts and waits on its batches like any other
+        # dependency.
+        if not isinstance(job.items, list) or not job.items:
+            raise ValueError("items must be a non-empty list")
+        from .executor import ITEM_MODES
+        if job.item_mode is not None and job.item_mode not in ITEM_MODES:
+            raise ValueError(f"item_mode must be one of: {', '.join(ITEM_MODES)}")
+        batch_size = 1 if job.batch_size is None else job.batch_size
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+        if job.state != JobState.PENDING:
+            return []
+        
+        items = [str(item) for item in job.items]
+        batches = []
+        for index, start in enumerate(range(0, len(items), batch_size)):
+            chunk = items[start:start + batch_size]
+            batches.append(Job(
+                job_id=f"{job.id}:{index}",
+                command=job.command,
+                max_retries=job.max_retries,
+                priority=job.priority,
+                run_at=job.run_at,
+                depends_on=list(job.depends_on),
+                limits=job.limits,
+                retry_policy=job.retry_policy,
+                items=chunk,
+                item_mode=job.item_mode,
+                item_status="." * len(chunk),
+                parent_id=job.id
+            ))
+        taken = [batch.id for batch in batches if self.get_job(batch.id)]
+        if taken:
+            raise ValueError(f"Job with id '{taken[0]}' already exists")
+        
+        job.fanout = {"items": len(items), "batches": len(batches), "batch_size": batch_size, "succeeded": 0, "failed": 0}
+        job.items = None
+        job.depends_on = [batch.id for batch in batches]
+        return batches
+    
+    def fanout_progress(self, job: Job) -> Dict[str, Any]:
+        # A fan-out parent depends on exactly its batches.
+        progress: Dict[str, Any] = {
+            "items": job.fanout["items"],
+            "succeeded": 0,
+            "failed": 0,
+            "pending": 0,
+            "batches": {state.value: 0 for state in JobState},
+            "failed_items": []
+        }
+        for batch_id in job.depends_on:
+            batch = self.get_job(batch_id)
+            if batch is None:
+                continue
+            progress["batches"][batch.state.value] += 1
+            for item, mark in zip(batch.items or [], batch.item_status or ""):
+                if mark == "+":
+                    progress["succeeded"] += 1
+                elif mark == "-":
+                    progress["failed"] += 1
+                    progress["failed_items"].append(item)
+        progress["pending"] = progress["items"] - progress["succeeded"] - progress["failed"]
+        return progress
+    
+    def _finish_fanout(self, job: Job, dead_batch: Optional[str] = None):
+        # The parent never runs a command of its own. It completes once every
+        # batch has, and it dies with the first batch that does.
+        progress = self.fanout_progress(job)
+        job.fanout = dict(job.fanout, succeeded=progress["succeeded"], failed=progress["failed"])
+        if dead_batch:
+            job.mark_dead(f"Batch '{dead_batch}' failed: {progress['failed']} of {progress['items']} items failed")
+        else:
+            job.mark_completed()
+    
+    def find_in_flight(self, idempotency_key: str) -> Optional[Job]:
+        for shard in self.shards:
+            with shard.lock:
+                jobs = shard.load()
+                job_ids = shard.idempotency_index.get(idempotency_key)
+                if job_ids:
+                    # Normally one; a job retried from the DLQ can share
+                    # its key with a newer one.
+                    return Job.from_dict(jobs[min(job_ids)])
+        return None
     
     def get_job(self, job_id: str) -> Optional[Job]:
-        jobs = self._load_jobs()
+        jobs = self._shard_for(job_id).load()
         job_data = jobs.get(job_id)
         if job_data:
             return Job.from_dict(job_data)
         return None
     
+    def iter_jobs(self, states: Optional[List[JobState]] = None) -> Iterator[Job]:
+        # Walks the store one shard at a time without building the whole job
+        # list, for exports and other scans over large stores.
+        wanted = {state.value for state in states} if states else None
+        for shard in self.shards:
+            for job_data in shard.iter_jobs():
+                if wanted is None or job_data.get("state") in wanted:
+                    yield Job.from_dict(job_data)
+    
+    def import_jobs(self, jobs: Iterable[Job], chunk_size: int = 1000, replace: bool = False) -> Tuple[int, int]:
+        # Jobs are committed a chunk at a time, so an import of any size
+        # holds at most one chunk in memory and an interrupted import keeps
+        # every chunk before the failure. Existing ids are skipped unless
+        # `replace` is set.
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        imported = 0
+        skipped = 0
+        chunk: List[Job] = []
+        for job in jobs:
+            chunk.append(job)
+            if len(chunk) >= chunk_size:
+                added = self._import_chunk(chunk, replace)
+                imported += added
+                skipped += len(chunk) - added
+                chunk = []
+        if chunk:
+            added = self._import_chunk(chunk, replace)
+            imported += added
+            skipped += len(chunk) - added
+        if imported:
+            self._notify_work()
+        return imported, skipped
+    
+    def _import_chunk(self, jobs: List[Job], replace: bool) -> int:
+        by_shard: Dict[int, Dict[str, dict]] = {}
+        for job in jobs:
+            by_shard.setdefault(self._shard_index(job.id), {})[job.id] = job.to_dict()
+        
+        tickets = []
+        added = 0
+        for index, ops in by_shard.items():
+            shard = self.shards[index]
+            with shard.lock:
+                if not replace:
+                    for job_id in shard.existing(ops):
+                        del ops[job_id]
+                if ops:
+                    # Without replace, a job another process imported first wins.
+                    expected = None if replace else dict.fromkeys(ops)
+                    tickets.append((shard, shard.submit(ops, expected)))
+                    added += len(ops)
+        return added - len(self._wait_all(tickets))
+    
+    def page_jobs(self, states: Optional[List[JobState]] = None, offset: int = 0, limit: int = 100) -> Tuple[int, List[Job]]:
+        # Jobs ordered by creation time, one page at a time. Every shard keeps
+        # its jobs of each state sorted by creation time, so the page start is
+        # found by binary search and the page merged from those runs; the cost
+        # depends on the page size, not on the size of the store. The shard
+        # locks are taken in order, so all runs come from one moment.
+        wanted = {state.value for state in states} if states else None
+        with ExitStack() as stack:
+            views = []
+            runs = []
+            for shard in self.shards:
+                stack.enter_context(shard.lock)
+                view = shard.load()
+                for state, run in shard.created_index.items():
+                    if run and (wanted is None or state in wanted):
+                        views.append(view)
+                        runs.append(run)
+            
+            total = sum(len(run) for run in runs)
+            starts = _rank_starts(runs, offset)
+            merged = heapq.merge(*[
+                [(key, position) for key in run[start:start + limit]]
+                for position, (run, start) in enumerate(zip(runs, starts))
+            ])
+            page = [views[position][job_id] for (_, job_id), position in islice(merged, limit)]
+        return total, [Job.from_dict(job_data) for job_data in page]
+    
+    def version(self) -> str:
+        # Changes whenever any shard's files or this process's pending writes do.
+        parts = []
+        for shard in self.shards:
+            with shard.lock:
+                parts.append(f"{shard.file_stamp()}#{shard.committer.generation}")
+        return "|".join(parts)
+    
     def get_all_jobs(self) -> List[Job]:
         jobs = self._load_jobs()
         return [Job.from_dict(job_data) for job_data in jobs.values()]
     
     def get_jobs_by_state(self, state: JobState) -> List[Job]:
-        all_jobs = self.get_all_jobs()
-        return [job for job in all_jobs if job.state == state]
+        # Filtering the raw records first means only the matching jobs are
+        # turned into Job objects.
+        return [
+            Job.from_dict(job_data)
+            for shard in self.shards
+            for job_data in shard.load().values()
+            if job_data.get("state") == state.value
+        ]
+    
+    def count_by_state(self) -> Dict[str, int]:
+        counts = {state.value: 0 for state in JobState}
+        for shard in self.shards:
+            with shard.lock:
+                shard.load()
+                for state, count in shard.state_counts.items():
+                    counts[state] = counts.get(state, 0) + count
+        return counts
+    
+    def queue_depth(self) -> int:
+        # Jobs still waiting to run, including blocked, scheduled and
+        # retrying ones.
+        counts = self.count_by_state()
+        return counts[JobState.PENDING.value] + counts[JobState.FAILED.value]
     
     def get_pending_jobs(self) -> List[Job]:
         all_jobs = self.get_jobs_by_state(JobState.PENDING)
         now = datetime.now(timezone.utc)
-        ready_jobs = []
-        
-        for job in all_jobs:
-            if job.run_at:
-                try:
-                    run_time = datetime.fromisoformat(job.run_at.replace('Z', '+00:00'))
-                    if run_time.tzinfo is None:
-                        run_time = run_time.replace(tzinfo=timezone.utc)
-                    if run_time > now:
-                        continue
-                except (ValueError, AttributeError):
-                    pass
-            
-            ready_jobs.append(job)
-        
+        ready_jobs = [job for job in all_jobs if _is_due(job.run_at, now)]
         ready_jobs.sort(key=lambda j: (-j.priority, j.created_at))
         return ready_jobs
     
     def get_failed_jobs(self) -> List[Job]:
-        all_jobs = self.get_all_jobs()
+        failed_jobs = self.get_jobs_by_state(JobState.FAILED)
         now = datetime.now(timezone.utc)
-        failed_jobs = []
-        
-        for job in all_jobs:
-            if job.state == JobState.FAILED and job.should_retry():
-                if job.next_retry_at:
-                    try:
-                        retry_time = datetime.fromisoformat(job.next_retry_at.replace('Z', '+00:00'))
-                        if retry_time.tzinfo is None:
-                            retry_time = retry_time.replace(tzinfo=timezone.utc)
-                        if retry_time <= now:
-                            failed_jobs.append(job)
-                    except (ValueError, AttributeError):
-                        failed_jobs.append(job)
-                else:
-                    failed_jobs.append(job)
-        
-        return failed_jobs
+        return [
+            job for job in failed_jobs
+            if job.should_retry() and _is_due(job.next_retry_at, now)
+        ]
     
     def get_dead_jobs(self) -> List[Job]:
         return self.get_jobs_by_state(JobState.DEAD)
     
+    def ready_stats(self) -> Tuple[int, float]:
+        now = datetime.now(timezone.utc)
+        depth = 0
+        oldest = None
+        for shard in self.shards:
+            for job_data in shard.ready_candidates(now, None) + shard.retry_candidates(now, None):
+                depth += 1
+                ready_since = job_data.get("next_retry_at") or job_data.get("run_at") or job_data.get("created_at")
+                try:
+                    ready_at = _parse_timestamp(ready_since)
+                except (ValueError, AttributeError):
+                    continue
+                if oldest is None or ready_at < oldest:
+                    oldest = ready_at
+        oldest_wait = (now - oldest).total_seconds() if oldest else 0.0
+        return depth, max(0.0, oldest_wait)
+    
+    def claim_next_job(self, worker_id: Optional[str] = None, lease_seconds: Optional[float] = None) -> Optional[Job]:
+        claimed = self.claim_jobs(1, worker_id, lease_seconds)
+        return claimed[0] if claimed else None
+    
+    def claim_jobs(
+        self,
+        limit: int,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        paused: Optional[Dict[str, int]] = None
+    ) -> List[Job]:
+        now = datetime.now(timezone.utc)
+        self._wait_all([(shard, shard.reclaim_expired(now)) for shard in self.shards])
+        
+        lease_expires_at = None
+        if lease_seconds:
+            lease_expires_at = (now + timedelta(seconds=lease_seconds)).isoformat().replace('+00:00', 'Z')
+        
+        # Each shard offers its best ready jobs; the heads are merged in global
+        # priority order, then claimed with one write per shard involved.
+        ready = []
+        for shard in self.shards:
+            ready.extend((_ready_key(job_data), shard) for job_data in shard.ready_candidates(now, limit))
+        ready.sort(key=lambda entry: entry[0])
+        picks = [(shard, key[2], JobState.PENDING) for key, shard in ready[:limit]]
+        
+        if not picks and time.monotonic() - self.last_blocked_sweep > 5.0:
+            self.last_blocked_sweep = time.monotonic()
+            self._sweep_blocked()
+        
+        if len(picks) < limit:
+            retries = []
+            for shard in self.shards:
+                # With open circuits some due retries are skipped, so every
+                # due retry is considered rather than just the first few.
+                retries.extend(
+                    ((job_data.get("next_retry_at") or "", job_data["id"]), shard, job_data)
+                    for job_data in shard.retry_candidates(now, None if paused else limit - len(picks))
+                )
+            retries.sort(key=lambda entry: entry[0])
+            allowance = dict(paused or {})
+            if allowance:
+                from .retry import error_signature
+            for key, shard, job_data in retries:
+                if len(picks) >= limit:
+                    break
+                if allowance:
+                    signature = error_signature(job_data.get("error_message"), job_data.get("failure_reason"))
+                    if signature in allowance:
+                        if allowance[signature] <= 0:
+                            continue
+                        allowance[signature] -= 1
+                picks.append((shard, key[1], JobState.FAILED))
+        
+        by_shard: Dict[int, List[Tuple[str, JobState]]] = {}
+        for shard, job_id, expected_state in picks:
+            by_shard.setdefault(shard.index, []).append((job_id, expected_state))
+        
+        claimed = []
+        tickets = []
+        for index, claims in by_shard.items():
+            shard = self.shards[index]
+            jobs, ticket = shard.claim_many(claims, worker_id, lease_expires_at)
+            claimed.extend(jobs)
+            tickets.append((shard, ticket))
+        # Whatever the durability mode, a claim is only handed out once it is
+        # known to have won.
+        lost = self._wait_all(tickets, force=True)
+        if lost:
+            claimed = [job for job in claimed if job.id not in lost]
+        
+        order = {job_id: position for position, (_, job_id, _) in enumerate(picks)}
+        claimed.sort(key=lambda job: order[job.id])
+        self._trace_claims(claimed, {job_id: state for _, job_id, state in picks}, worker_id)
+        return claimed
+    
+    def _trace_claims(self, claimed: List[Job], expected: Dict[str, JobState], worker_id: Optional[str]):
+        # A job became ready at its run_at or retry time, or when it was
+        # enqueued. Jobs waiting on dependencies are traced as ready when
+        # their last dependency completes instead.
+        if not self.tracer.enabled:
+            return
+        from .trace import trace_clock
+        now = time.time()
+        clock = trace_clock()
+        for job in claimed:
+            retry = expected[job.id] == JobState.FAILED
+            if retry or not job.depends_on:
+                due = [job.created_at, job.next_retry_at if retry else job.run_at]
+                try:
+                    ready_at = max(_parse_timestamp(value).timestamp() for value in due if value)
+                except (ValueError, AttributeError):
+                    ready_at = None
+                if ready_at is not None:
+                    self.tracer.record(job.id, "ready", at=clock - max(0.0, now - ready_at))
+            self.tracer.record(job.id, "claimed", worker=worker_id, at=clock)
+    
+    def release_jobs(self, jobs: List[Job], worker_id: Optional[str] = None):
+        by_shard: Dict[int, List[str]] = {}
+        for job in jobs:
+            by_shard.setdefault(self._shard_index(job.id), []).append(job.id)
+        self._wait_all([
+            (self.shards[index], self.shards[index].release(job_ids, worker_id))
+            for index, job_ids in by_shard.items()
+        ])
+        self._notify_work()
+    
+    def extend_leases(self, job_ids: List[str], worker_id: str, lease_seconds: float) -> List[str]:
+        lease_expires_at = (datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)).isoformat().replace('+00:00', 'Z')
+        by_shard: Dict[int, List[str]] = {}
+        for job_id in job_ids:
+            by_shard.setdefault(self._shard_index(job_id), []).append(job_id)
+        
+        held = []
+        tickets = []
+        for index, shard_job_ids in by_shard.items():
+            shard_held, ticket = self.shards[index].extend_leases(shard_job_ids, worker_id, lease_expires_at)
+            held.extend(shard_held)
+            tickets.append((self.shards[index], ticket))
+        lost = self._wait_all(tickets)
+        return [job_id for job_id in held if job_id not in lost]
+    
+    def save_jobs(self, jobs: List[Job], expected: Optional[Dict[str, Optional[dict]]] = None) -> Set[str]:
+        # Jobs listed in `expected` are only written while still stored as
+        # given; the ones that lost to another write are returned.
+        with self.dependency_lock:
+            finished = []
+            for job in jobs:
+                if job.state == JobState.PENDING and job.depends_on:
+                    job.unmet_dependencies = self._count_unmet(job)
+                    if job.fanout and not job.unmet_dependencies:
+                        self._finish_fanout(job)
+                if job.state in (JobState.COMPLETED, JobState.DEAD):
+                    # Only the save that finishes a job releases its children;
+                    # saving it again must not count it twice.
+                    previous = self._shard_for(job.id).load().get(job.id)
+                    if previous is not None and previous.get("state") != job.state.value:
+                        finished.append(job)
+            tickets = self._submit(jobs, expected)
+        lost = self._wait_all(tickets, force=expected is not None)
+        
+        finished = [job for job in finished if job.id not in lost]
+        if finished:
+            self._resolve_dependents(finished)
+        if any(job.state == JobState.PENDING for job in jobs):
+            self._notify_work()
+        return lost
+    
+    def save_results(self, results: List[Dict[str, Any]]) -> Tuple[List[Job], List[str]]:
+        # Applies runs reported by remote workers to the jobs they claimed.
+        # A result lands only while its worker still holds the job's lease,
+        # as a conditional write against the leased record. Returns the
+        # saved jobs and the ids whose lease was gone.
+        jobs = []
+        expected: Dict[str, Optional[dict]] = {}
+        rejected = []
+        for result in results:
+            job_id = result["id"]
+            current = self._shard_for(job_id).load().get(job_id)
+            if (
+                job_id in expected or current is None
+                or current.get("state") != JobState.PROCESSING.value
+                or current.get("worker_id") != result.get("worker_id")
+            ):
+                rejected.append(job_id)
+                continue
+            job = Job.from_dict(current)
+            job.apply_result(result)
+            jobs.append(job)
+            expected[job_id] = current
+        
+        lost = self.save_jobs(jobs, expected) if jobs else set()
+        return [job for job in jobs if job.id not in lost], rejected + [job.id for job in jobs if job.id in lost]
+    
+    def _submit(self, jobs: List[Job], expected: Optional[Dict[str, Optional[dict]]] = None) -> List[Tuple[StorageShard, int]]:
+        by_shard: Dict[int, Dict[str, Optional[dict]]] = {}
+        for job in jobs:
+            by_shard.setdefault(self._shard_index(job.id), {})[job.id] = job.to_dict()
+        return [
+            (
+                self.shards[index],
+                self.shards[index].submit(ops, {job_id: expected[job_id] for job_id in ops if job_id in expected} if expected else None)
+            )
+            for index, ops in by_shard.items()
+        ]
+    
+    def _count_unmet(self, job: Job) -> int:
+        # A parent that no longer exists counts as met.
+        unmet = 0
+        for parent_id in job.depends_on:
+            parent = self._shard_for(parent_id).load().get(parent_id)
+            if parent and parent.get("state") != JobState.COMPLETED.value:
+                unmet += 1
+        return unmet
+    
+    def get_dependents(self, job_id: str) -> List[Job]:
+        return [child for child, _ in self._dependents_of({job_id})]
+    
+    def _dependents_of(self, parent_ids) -> List[Tuple[Job, List[str]]]:
+        # One load per shard covers every parent, so resolving a bulk update
+        # does not re-read the store once per finished job.
+        found = []
+        for shard in self.shards:
+            with shard.lock:
+                jobs = shard.load()
+                children: Dict[str, List[str]] = {}
+                for parent_id in parent_ids:
+                    for child_id, count in shard.dependents_index.get(parent_id, {}).items():
+                        children.setdefault(child_id, []).extend([parent_id] * count)
+                found.extend((Job.from_dict(jobs[child_id]), parents) for child_id, parents in children.items())
+        return found
+    
+    def _resolve_dependents(self, finished: List[Job]):
+        # Only the children of a finished job are touched. A completed (or
+        # deleted) parent comes off each child's unmet-dependency count, and
+        # a dead parent fails its children and, transitively, their own
+        # dependents.
+        tickets = []
+        with self.dependency_lock:
+            frontier = finished
+            while frontier:
+                parents = {job.id: job for job in frontier}
+                frontier = []
+                updates = []
+                for child, parent_ids in self._dependents_of(parents):
+                    dead = [parent_id for parent_id in parent_ids if parents[parent_id].state == JobState.DEAD]
+                    if dead:
+                        if child.fanout:
+                            self._finish_fanout(child, dead_batch=dead[0])
+                        else:
+                            child.mark_dead(f"Dependency '{dead[0]}' failed")
+                        frontier.append(child)
+                    else:
+                        unmet = max(0, child.unmet_dependencies - len(parent_ids))
+                        if unmet == child.unmet_dependencies:
+                            continue
+                        child.unmet_dependencies = unmet
+                        child.updated_at = child._now()
+                        if not unmet and not child.fanout:
+                            self.tracer.record(child.id, "ready")
+                        if child.fanout and not unmet:
+                            self._finish_fanout(child)
+                            frontier.append(child)
+                    updates.append(child)
+                tickets.extend(self._submit(updates))
+        self._wait_all(tickets)
+        if tickets:
+            self._notify_work()
+    
+    def _sweep_blocked(self):
+        # Another process may have enqueued a child just as its parent
+        # finished here; recounting blocked jobs now and then unsticks them.
+        blocked = []
+        for shard in self.shards:
+            with shard.lock:
+                jobs = shard.load()
+                blocked.extend(Job.from_dict(jobs[job_id]) for job_id in shard.blocked_index)
+        changed = [job for job in blocked if self._count_unmet(job) != job.unmet_dependencies]
+        if changed:
+            self.save_jobs(changed)
+    
+    def _notify_work(self):
+        with self.work_available:
+            self.work_available.notify_all()
+    
+    def wait_for_work(self, timeout: float):
+        with self.work_available:
+            self.work_available.wait(timeout)
+    
+    def _wait_all(self, tickets: List[Tuple[StorageShard, int]], force: bool = False) -> Set[str]:
+        # Returns the jobs whose conditional writes lost to another process.
+        lost: Set[str] = set()
+        for shard, ticket in tickets:
+            if ticket:
+                lost |= shard.committer.wait(ticket, force)
+        return lost
+    
+    def _open_search_index(self, create: bool = False) -> Optional["JobIndex"]:
+        with self.search_index_lock:
+            if self.search_index is None and (create or self.search_index_path.exists()):
+                from .index import JobIndex
+                self.search_index = JobIndex(self.search_index_path)
+            return self.search_index
+    
+    def _sync_search_index(self):
+        self._open_search_index(create=True)
+        for shard in self.shards:
+            shard.search_index = self.search_index
+        self.search_index.drop_shards_from(len(self.shards))
+        
+        # Shards written without updating the index, e.g. while it was being
+        # created, are re-indexed from scratch.
+        for shard in self.shards:
+            shard.committer.flush()
+            with shard.lock:
+                stamp = shard.file_stamp()
+                if self.search_index.stamp(shard.index) != stamp:
+                    self.search_index.rebuild_shard(shard.index, shard.load(), stamp)
+    
+    def search_jobs(
+        self,
+        text: Optional[str] = None,
+        states: Optional[List[JobState]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        time_field: str = "created_at",
+        limit: Optional[int] = None
+    ) -> List[Job]:
+        self._sync_search_index()
+        job_ids = self.search_index.search(
+            text=text,
+            states=[state.value for state in states] if states else None,
+            since=since,
+            until=until,
+            time_field=time_field,
+            limit=limit
+        )
+        jobs = (self._shard_for(job_id).load().get(job_id) for job_id in job_ids)
+        return [Job.from_dict(job_data) for job_data in jobs if job_data is not None]
+    
+    def select_jobs(
+        self,
+        states: Optional[List[JobState]] = None,
+        error_contains: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        older_than: Optional[float] = None
+    ) -> List[Job]:
+        wanted = {state.value for state in states} if states else None
+        needle = error_contains.lower() if error_contains else None
+        since_at = _parse_timestamp(since) if since else None
+        until_at = _parse_timestamp(until) if until else None
+        if older_than is not None:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+            until_at = min(until_at, cutoff) if until_at else cutoff
+        
+        selected = []
+        for job_data in self._load_jobs().values():
+            if wanted and job_data.get("state") not in wanted:
+                continue
+            if needle and needle not in (job_data.get("error_message") or "").lower():
+                continue
+            if since_at or until_at:
+                try:
+                    updated_at = _parse_timestamp(job_data.get("updated_at"))
+                except (ValueError, AttributeError):
+                    continue
+                if (since_at and updated_at < since_at) or (until_at and updated_at > until_at):
+                    continue
+            selected.append(Job.from_dict(job_data))
+        return selected
+    
+    def _apply_bulk(self, jobs: List[Job], expected: Dict[str, Tuple[str, str]], delete: bool = False) -> List[str]:
+        by_shard: Dict[int, List[Job]] = {}
+        for job in jobs:
+            by_shard.setdefault(self._shard_index(job.id), []).append(job)
+        
+        applied = []
+        tickets = []
+        for index, shard_jobs in by_shard.items():
+            shard = self.shards[index]
+            with shard.lock:
+                current = shard.load()
+                ops = {}
+                for job in shard_jobs:
+                    # Jobs that changed since they were selected, e.g. a DLQ job
+                    # retried by someone else, are left alone.
+                    job_data = current.get(job.id)
+                    if not job_data or (job_data.get("state"), job_data.get("updated_at")) != expected[job.id]:
+                        continue
+                    ops[job.id] = None if delete else job.to_dict()
+                if ops:
+                    tickets.append((shard, shard.submit(ops, {job_id: current[job_id] for job_id in ops})))
+                    applied.extend(ops)
+        lost = self._wait_all(tickets)
+        return [job_id for job_id in applied if job_id not in lost]
+    
+    def retry_dead_jobs(
+        self,
+        job_ids: Optional[List[str]] = None,
+        error_contains: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        rate: Optional[float] = None
+    ) -> List[str]:
+        if job_ids is not None and not (error_contains or since or until):
+            # Named jobs are looked up directly instead of scanning the store.
+            jobs = [job for job in map(self.get_job, set(job_ids)) if job and job.state == JobState.DEAD]
+        else:
+            jobs = self.select_jobs([JobState.DEAD], error_contains, since, until)
+            if job_ids is not None:
+                wanted = set(job_ids)
+                jobs = [job for job in jobs if job.id in wanted]
+        jobs.sort(key=lambda j: j.updated_at or "")
+        expected = {job.id: (job.state.value, job.updated_at) for job in jobs}
+        
+        # With a rate, requeued jobs become ready gradually instead of all
+        # landing in the ready queue at once.
+        now = datetime.now(timezone.utc)
+        with self.dependency_lock:
+            for i, job in enumerate(jobs):
+                job.state = JobState.PENDING
+                job.attempts = 0
+                job.error_message = None
+                job.failure_reason = None
+                job.next_retry_at = None
+                job.updated_at = job._now()
+                if rate:
+                    job.run_at = (now + timedelta(seconds=i / rate)).isoformat().replace('+00:00', 'Z')
+                if job.depends_on:
+                    job.unmet_dependencies = self._count_unmet(job)
+            retried = self._apply_bulk(jobs, expected)
+        
+        if retried:
+            self._notify_work()
+        return retried
+    
+    def delete_jobs(self, **filters) -> List[str]:
+        jobs = self.select_jobs(**filters)
+        deleted = self._apply_bulk(jobs, {job.id: (job.state.value, job.updated_at) for job in jobs}, delete=True)
+        
+        # Children count a missing parent as met.
+        gone = set(deleted)
+        unfinished = [job for job in jobs if job.id in gone and job.state.value in IN_FLIGHT_STATES]
+        if unfinished:
+            self._resolve_dependents(unfinished)
+        return deleted
+    
+    def cancel_jobs(self, **filters) -> List[str]:
+        states = filters.pop("states", None) or [JobState.PENDING, JobState.FAILED]
+        if any(state not in (JobState.PENDING, JobState.FAILED) for state in states):
+            raise ValueError("Only pending and failed jobs can be cancelled")
+        
+        jobs = self.select_jobs(states, **filters)
+        expected = {job.id: (job.state.value, job.updated_at) for job in jobs}
+        for job in jobs:
+            job.mark_dead("Cancelled")
+            job.failure_reason = "cancelled"
+        cancelled = self._apply_bulk(jobs, expected)
+        
+        if cancelled:
+            applied = set(cancelled)
+            self._resolve_dependents([job for job in jobs if job.id in applied])
+        return cancelled
+    
     def delete_job(self, job_id: str) -> bool:
-        jobs = self._load_jobs()
-        if job_id in jobs:
-            del jobs[job_id]
-            self._save_jobs(jobs)
-            return True
-        return False
+        shard = self._shard_for(job_id)
+        with shard.lock:
+            job_data = shard.load().get(job_id)
+            if job_data is None:
+                return False
+            ticket = shard.submit({job_id: None})
+        shard.committer.wait(ticket)
+        if job_data.get("state") in IN_FLIGHT_STATES:
+            self._resolve_dependents([Job.from_dict(job_data)])
+        return True
+    
+    def flush(self):
+        for shard in self.shards:
+            shard.committer.flush()
+    
+    def commit_stats(self) -> Dict[str, int]:
+        batches = sum(shard.committer.batches for shard in self.shards)
+        records = sum(shard.committer.records for shard in self.shards)
+        return {"batches": batches, "records": records}
+    
+    def cache_stats(self) -> Dict[str, float]:
+        hits = sum(shard.cache_hits for shard in self.shards)
+        misses = sum(shard.cache_misses for shard in self.shards)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups * 100, 2) if lookups else 0
+        }
+    
+    def backend_stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {}
+        for shard in self.shards:
+            for key, value in shard.stats().items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
     
     def clear_all(self):
-        self._save_jobs({})
+        for shard in self.shards:
+            shard.save({})
+
+
+def open_storage(config: Config, storage_path: str = "jobs.json") -> JobStorage:
+    return JobStorage(
+        storage_path,
+        shards=config.get("storage_shards", 1),
+        durability=config.get("storage_durability", "fsync"),
+        commit_window=config.get("storage_commit_window_ms", 2.0) / 1000.0,
+        commit_batch=config.get("storage_commit_batch", 64),
+        backend=config.get("storage_backend", "json"),
+        wal_compact_records=config.get("wal_compact_records", 10000),
+        tracing=config.get("trace_enabled", True)
+    )
@@ -0,0 +1,113 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+COMMANDS = ("stats", "stop", "drain", "scale")
+REQUEST_LIMIT = 65536
+CONNECT_TIMEOUT = 5.0
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and hasattr(socketserver, "ThreadingUnixStreamServer")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    
+    def handle(self):
+        # One JSON request per line, answered with one JSON line.
+        line = self.rfile.readline(REQUEST_LIMIT)
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            response = self.server.supervisor.handle(request)
+        except ValueError as e:
+            response = {"error": str(e)}
+        except Exception as e:
+            response = {"error": f"Unexpected error: {e}"}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class Supervisor:
+    # Serves a running WorkerManager to other processes over a unix socket,
+    # so `worker stop`, `status` or the web server reach the workers that
+    # are actually running instead of a manager of their own. Without a
+    # socket path the manager is only reachable from its own process.
+    
+    def __init__(self, manager, socket_path: Optional[str] = "worker.sock"):
+        self.manager = manager
+        self.socket_path = Path(socket_path) if socket_path else None
+        self.server: Optional[socketserver.BaseServer] = None
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        if not self.socket_path or not supported():
+            return
+        if self.socket_path.exists():
+            if send_command("stats", socket_path=str(self.socket_path)) is not None:
+                raise RuntimeError(f"Workers are already running under another supervisor ({self.socket_path})")
+            # Left behind by a supervisor that did not shut down cleanly.
+            self.socket_path.unlink()
+        
+        self.server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), _Handler)
+        self.server.daemon_threads = True
+        self.server.supervisor = self
+        os.chmod(self.socket_path, 0o600)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def close(self):
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        command = request.get("command")
+        if command == "stats":
+            return self.manager.stats()
+        if command in ("stop", "drain"):
+            # Answered right away; shutting down can take as long as the
+            # longest running job.
+            target = self.manager.stop_workers if command == "stop" else self.manager.drain_workers
+            threading.Thread(target=target, daemon=True).start()
+            return {"success": True, "message": f"Workers are {'stopping' if command == 'stop' else 'draining'}"}
+        if command == "scale":
+            count = request.get("count")
+            if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+                raise ValueError("Worker count must be at least 1")
+            previous = self.manager.scale_workers(count)
+            return {"success": True, "message": f"Scaled from {previous} to {count} worker(s)"}
+        raise ValueError(f"Unknown command '{command}', expected one of: {', '.join(COMMANDS)}")
+
+
+def send_command(command: str, socket_path: str = "worker.sock", **params) -> Optional[Dict[str, Any]]:
+    # Returns None when no supervisor is listening on `socket_path`.
+    if not supported() or not os.path.exists(socket_path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(CONNECT_TIMEOUT)
+    try:
+        client.connect(socket_path)
+        client.sendall((json.dumps(dict(params, command=command)) + "\n").encode("utf-8"))
+        with client.makefile("rb") as reply:
+            line = reply.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    except OSError as e:
+        raise RuntimeError(f"Supervisor did not answer: {e}")
+    finally:
+        client.close()
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise RuntimeError("Supervisor sent an invalid reply")
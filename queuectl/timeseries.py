@@ -0,0 +1,232 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from .commit import atomic_write
+from .models import Job, JobState
+
+# Per-second buckets cover the last ten minutes and per-minute buckets the
+# last day; anything older is dropped on the next flush.
+RESOLUTIONS = {"seconds": (1, 600), "minutes": (60, 1440)}
+FLUSH_INTERVAL = 1.0
+LOCK_TIMEOUT = 0.5
+LOCK_STALE_SECONDS = 10.0
+
+# Latencies are counted in log-scaled bins a quarter power of two wide, so
+# a bucket's p95 is exact to within about 19% and buckets from several
+# processes add up without keeping individual samples.
+BINS_PER_DOUBLING = 4
+
+# A bucket is [enqueued, completed, failed, latency_sum, {bin: count}, queue_depth].
+ENQUEUED, COMPLETED, FAILED, LATENCY_SUM, LATENCY_BINS, DEPTH = range(6)
+
+_histories: "weakref.WeakSet[MetricsHistory]" = weakref.WeakSet()
+
+
+def _latency_bin(seconds: float) -> int:
+    millis = seconds * 1000.0
+    if millis <= 1.0:
+        return 0
+    return math.ceil(BINS_PER_DOUBLING * math.log2(millis))
+
+
+def _bin_upper_bound(index: int) -> float:
+    return 2 ** (index / BINS_PER_DOUBLING) / 1000.0
+
+
+def _empty_bucket() -> list:
+    return [0, 0, 0, 0.0, {}, None]
+
+
+def _merge_bucket(target: list, delta: list):
+    for field in (ENQUEUED, COMPLETED, FAILED, LATENCY_SUM):
+        target[field] += delta[field]
+    bins = target[LATENCY_BINS]
+    for index, count in delta[LATENCY_BINS].items():
+        bins[index] = bins.get(index, 0) + count
+    if delta[DEPTH] is not None:
+        target[DEPTH] = delta[DEPTH]
+
+
+def _percentile(bins: Dict[str, int], fraction: float) -> Optional[float]:
+    total = sum(bins.values())
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for index in sorted(bins, key=int):
+        seen += bins[index]
+        if seen >= rank:
+            return _bin_upper_bound(int(index))
+    return None
+
+
+class MetricsHistory:
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_suffix(".lock")
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Dict[str, list]] = {name: {} for name in RESOLUTIONS}
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        _histories.add(self)
+    
+    def _bucket(self, now: float) -> List[list]:
+        buckets = []
+        for name, (width, _) in RESOLUTIONS.items():
+            key = str(int(now // width * width))
+            buckets.append(self.pending[name].setdefault(key, _empty_bucket()))
+        return buckets
+    
+    def record_enqueued(self, count: int = 1, queue_depth: Optional[int] = None):
+        with self.lock:
+            for bucket in self._bucket(time.time()):
+                bucket[ENQUEUED] += count
+                if queue_depth is not None:
+                    bucket[DEPTH] = queue_depth
+            self.dirty = True
+        self.flush()
+    
+    def record_results(self, jobs: Iterable[Job], queue_depth: Optional[int] = None):
+        # Called with the jobs a worker has just finished running: completed
+        # ones, failed ones waiting for a retry and ones moved to the DLQ.
+        with self.lock:
+            buckets = self._bucket(time.time())
+            for job in jobs:
+                field = COMPLETED if job.state == JobState.COMPLETED else FAILED
+                for bucket in buckets:
+                    bucket[field] += 1
+                    if job.execution_time is not None:
+                        bucket[LATENCY_SUM] += job.execution_time
+                        index = str(_latency_bin(job.execution_time))
+                        bucket[LATENCY_BINS][index] = bucket[LATENCY_BINS].get(index, 0) + 1
+            if queue_depth is not None:
+                for bucket in buckets:
+                    bucket[DEPTH] = queue_depth
+            self.dirty = True
+        self.flush()
+    
+    def _read(self) -> Dict[str, Dict[str, list]]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, IOError):
+            data = {}
+        return {name: data.get(name, {}) if isinstance(data, dict) else {} for name in RESOLUTIONS}
+    
+    def _acquire_lock(self) -> bool:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(str(self.lock_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    stale = time.time() - os.stat(self.lock_path).st_mtime > LOCK_STALE_SECONDS
+                except FileNotFoundError:
+                    continue
+                if stale:
+                    self._release_lock()
+                    continue
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+    
+    def _release_lock(self):
+        try:
+            self.lock_path.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def flush(self, force: bool = False):
+        # Each process keeps its own counts and adds them to the shared file
+        # at most once per FLUSH_INTERVAL. If the file is busy they are kept
+        # for the next flush rather than holding up a worker.
+        with self.lock:
+            if not self.dirty or (not force and time.monotonic() - self.last_flush < FLUSH_INTERVAL):
+                return
+            pending = self.pending
+            self.pending = {name: {} for name in RESOLUTIONS}
+            self.dirty = False
+            self.last_flush = time.monotonic()
+        
+        if self._acquire_lock():
+            try:
+                data = self._read()
+                now = time.time()
+                for name, (width, count) in RESOLUTIONS.items():
+                    buckets = data[name]
+                    for key, delta in pending[name].items():
+                        _merge_bucket(buckets.setdefault(key, _empty_bucket()), delta)
+                    oldest = now - width * count
+                    data[name] = {key: bucket for key, bucket in buckets.items() if int(key) > oldest}
+                atomic_write(self.path, json.dumps(data, separators=(",", ":")), sync=False)
+                return
+            except OSError as e:
+                print(f"Failed to save metrics history: {e}")
+            finally:
+                self._release_lock()
+        
+        with self.lock:
+            # Counts recorded meanwhile are newer, so they are merged last.
+            for name, buckets in self.pending.items():
+                for key, delta in buckets.items():
+                    _merge_bucket(pending[name].setdefault(key, _empty_bucket()), delta)
+            self.pending = pending
+            self.dirty = True
+    
+    def series(self, window: float) -> Dict[str, Any]:
+        # Answers from the buckets alone, with one entry per bucket in the
+        # window so charts need no gap handling. Queue depth is only sampled
+        # when something happens, so it carries forward between samples.
+        name = "seconds" if window <= RESOLUTIONS["seconds"][0] * RESOLUTIONS["seconds"][1] else "minutes"
+        width, count = RESOLUTIONS[name]
+        if window <= 0:
+            raise ValueError("Window must be positive")
+        if window > width * count:
+            raise ValueError(f"Window can be at most {width * count} seconds")
+        
+        data = self._read()[name]
+        with self.lock:
+            for key, delta in self.pending[name].items():
+                _merge_bucket(data.setdefault(key, _empty_bucket()), delta)
+        
+        end = int(time.time() // width * width)
+        start = end - max(1, math.ceil(window / width)) * width + width
+        depth = None
+        for key in sorted((key for key in data if int(key) < start), key=int):
+            if data[key][DEPTH] is not None:
+                depth = data[key][DEPTH]
+        
+        points = []
+        for moment in range(start, end + width, width):
+            bucket = data.get(str(moment), _empty_bucket())
+            if bucket[DEPTH] is not None:
+                depth = bucket[DEPTH]
+            runs = sum(bucket[LATENCY_BINS].values())
+            p95 = _percentile(bucket[LATENCY_BINS], 0.95)
+            points.append({
+                "time": datetime.fromtimestamp(moment, timezone.utc).isoformat().replace('+00:00', 'Z'),
+                "enqueued": bucket[ENQUEUED],
+                "completed": bucket[COMPLETED],
+                "failed": bucket[FAILED],
+                "latency_mean": round(bucket[LATENCY_SUM] / runs, 3) if runs else None,
+                "latency_p95": round(p95, 3) if p95 is not None else None,
+                "queue_depth": depth
+            })
+        return {"resolution": width, "window": len(points) * width, "points": points}
+
+
+@atexit.register
+def _flush_all():
+    for history in list(_histories):
+        history.flush(force=True)
@@ -0,0 +1,207 @@
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from .commit import FileLock
+
+EVENTS = ("enqueued", "ready", "claimed", "spawned", "exited", "persisted")
+FLUSH_INTERVAL = 1.0
+FLUSH_EVENTS = 1000
+ROTATE_BYTES = 64 << 20
+
+# Trace times are the monotonic clock shifted onto the wall clock once per
+# process. Spans never run backwards or jump when the wall clock is set,
+# and processes on one host share CLOCK_MONOTONIC, so their events line up.
+_EPOCH_OFFSET = time.time() - time.monotonic()
+
+_tracers: "weakref.WeakSet[Tracer]" = weakref.WeakSet()
+
+
+def trace_clock() -> float:
+    return _EPOCH_OFFSET + time.monotonic()
+
+
+class Tracer:
+    
+    def __init__(self, path: Path, enabled: bool = True):
+        self.path = Path(path)
+        self.rotated_path = self.path.with_name(f"{self.path.name}.old")
+        # Taken only to rotate, so that processes which see the log past
+        # ROTATE_BYTES together move it aside once.
+        self.rotate_lock = FileLock(self.path.with_name(f"{self.path.name}.lock"))
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.buffer: List[str] = []
+        self.last_flush = time.monotonic()
+        _tracers.add(self)
+    
+    def record(
+        self,
+        job_id: str,
+        event: str,
+        worker: Optional[str] = None,
+        at: Optional[float] = None,
+        cached: bool = False
+    ):
+        if not self.enabled:
+            return
+        entry = {
+            "job": job_id,
+            "event": event,
+            "ts": round(trace_clock() if at is None else at, 6),
+            "worker": worker,
+            "pid": os.getpid()
+        }
+        # Set on the persisted event of an attempt answered from the result cache.
+        if cached:
+            entry["cached"] = True
+        line = json.dumps(entry, separators=(",", ":"))
+        with self.lock:
+            self.buffer.append(line)
+            due = len(self.buffer) >= FLUSH_EVENTS or time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+    
+    def flush(self):
+        # Events are appended in one write per flush. O_APPEND keeps writes
+        # from several processes whole, and the log is rotated aside once it
+        # passes ROTATE_BYTES so the previous generation is still exported.
+        with self.lock:
+            lines = self.buffer
+            self.buffer = []
+            self.last_flush = time.monotonic()
+        if not lines:
+            return
+        try:
+            if self._size() >= ROTATE_BYTES:
+                with self.rotate_lock:
+                    if self._size() >= ROTATE_BYTES:
+                        os.replace(self.path, self.rotated_path)
+            fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Failed to write job trace: {e}")
+    
+    def _size(self) -> int:
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+    
+    def events(self, since: Optional[float] = None, job_ids: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        self.flush()
+        for path in (self.rotated_path, self.path):
+            try:
+                f = open(path, 'r')
+            except FileNotFoundError:
+                continue
+            with f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                        ts = event["ts"]
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if since is not None and ts < since:
+                        continue
+                    if job_ids and event.get("job") not in job_ids:
+                        continue
+                    yield event
+
+
+def chrome_trace(events: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    # Each worker process becomes a trace process with one row per worker
+    # thread, holding a span per attempt split into start (claim to spawn),
+    # run (spawn to exit) and persist (exit to the stored result). Time jobs
+    # spend waiting goes on a separate "queue" process as async spans: wait
+    # (for run_at, dependencies or a retry backoff) and queued (ready but
+    # not yet claimed). Idle stretches on a worker row are utilization gaps.
+    by_job: Dict[str, List[Dict[str, Any]]] = {}
+    for event in events:
+        by_job.setdefault(event["job"], []).append(event)
+    
+    trace: List[Dict[str, Any]] = []
+    processes: Dict[str, int] = {}
+    threads = set()
+    
+    def micros(ts: float) -> int:
+        return int(ts * 1000000)
+    
+    def track(worker: Optional[str]):
+        host_pid, _, thread = (worker or "unknown").rpartition(":")
+        if not host_pid:
+            host_pid, thread = thread, "0"
+        pid = processes.setdefault(host_pid, len(processes) + 1)
+        tid = int(thread) if thread.isdigit() else zlib.crc32(thread.encode("utf-8"))
+        if (pid, tid) not in threads:
+            threads.add((pid, tid))
+            trace.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": f"worker {thread}"}})
+        return pid, tid
+    
+    def span(name: str, start: Optional[float], end: Optional[float], pid: int, tid: int, args: Dict[str, Any]):
+        if start is not None and end is not None and end >= start:
+            trace.append({
+                "ph": "X", "name": name, "cat": "job", "pid": pid, "tid": tid,
+                "ts": micros(start), "dur": micros(end) - micros(start), "args": args
+            })
+    
+    def wait(name: str, start: Optional[float], end: Optional[float], async_id: int, job_id: str):
+        if start is not None and end is not None and end > start:
+            common = {"name": name, "cat": "queue", "pid": 0, "tid": 0, "id": async_id, "args": {"job": job_id}}
+            trace.append(dict(common, ph="b", ts=micros(start)))
+            trace.append(dict(common, ph="e", ts=micros(end)))
+    
+    for async_id, (job_id, job_events) in enumerate(by_job.items(), 1):
+        job_events.sort(key=lambda event: (event["ts"], EVENTS.index(event["event"]) if event["event"] in EVENTS else 0))
+        waiting_since = ready = claimed = spawned = exited = None
+        worker = None
+        attempt = 0
+        for event in job_events:
+            kind, ts = event["event"], event["ts"]
+            if kind == "enqueued":
+                waiting_since = ts
+            elif kind == "ready":
+                ready = ts
+            elif kind == "claimed":
+                if claimed is not None:
+                    # The previous claim was released or its lease expired.
+                    ready = max(ready if ready is not None else claimed, claimed)
+                wait("wait", waiting_since, ready, async_id, job_id)
+                wait("queued", ready if ready is not None else waiting_since, ts, async_id, job_id)
+                claimed, worker = ts, event.get("worker")
+                attempt += 1
+                waiting_since = ready = spawned = exited = None
+            elif kind == "spawned":
+                spawned = ts
+            elif kind == "exited":
+                exited = ts
+            elif kind == "persisted" and claimed is not None:
+                pid, tid = track(worker)
+                args = {"job": job_id, "attempt": attempt}
+                if event.get("cached"):
+                    args["cached"] = True
+                span(job_id, claimed, ts, pid, tid, args)
+                span("start", claimed, spawned, pid, tid, args)
+                span("run", spawned, exited, pid, tid, args)
+                span("persist", exited if exited is not None else claimed, ts, pid, tid, args)
+                waiting_since = ts
+                claimed = spawned = exited = None
+    
+    trace.append({"ph": "M", "name": "process_name", "pid": 0, "args": {"name": "queue"}})
+    for host_pid, pid in processes.items():
+        trace.append({"ph": "M", "name": "process_name", "pid": pid, "args": {"name": f"worker {host_pid}"}})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+@atexit.register
+def _flush_all():
+    for tracer in list(_tracers):
+        tracer.flush()
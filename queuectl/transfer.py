@@ -0,0 +1,70 @@
+import gzip
+import json
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+from .models import Job, JobState
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def export_stream(jobs: Iterable[Job], compress: bool = False, batch_bytes: int = 1 << 16) -> Iterator[bytes]:
+    # One job per line. Lines are gathered into chunks of roughly
+    # `batch_bytes`, so a stream of small jobs is not written a line at a time.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer: List[bytes] = []
+    size = 0
+    for job in jobs:
+        line = (json.dumps(job.to_dict()) + "\n").encode("utf-8")
+        buffer.append(line)
+        size += len(line)
+        if size >= batch_bytes:
+            data = b"".join(buffer)
+            buffer = []
+            size = 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    
+    data = b"".join(buffer)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def _rewrite_state(job: Job, state: JobState):
+    if state == JobState.PENDING:
+        # The same reset as a DLQ retry, so the job gets its full retries.
+        job.release()
+        job.attempts = 0
+        job.next_retry_at = None
+    else:
+        job.state = state
+        job.worker_id = None
+        job.lease_expires_at = None
+        job.updated_at = job._now()
+
+
+def read_jobs(
+    stream: BinaryIO,
+    states: Optional[List[JobState]] = None,
+    rewrite_states: Optional[Dict[JobState, JobState]] = None
+) -> Iterator[Job]:
+    # Gzipped exports are recognised by their magic bytes, whatever the file
+    # is called. Both kinds are read a line at a time.
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+    
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            job = Job.from_dict(json.loads(line))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Skipping line {line_number}: {e}")
+            continue
+        if states and job.state not in states:
+            continue
+        if rewrite_states and job.state in rewrite_states:
+            _rewrite_state(job, rewrite_states[job.state])
+        yield job
@@ -0,0 +1,287 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .commit import atomic_write
+from .storage import StorageShard
+
+
+class WalShard(StorageShard):
+    
+    def __init__(self, index: int, path: Path, committer_options: Optional[dict] = None, compact_records: int = 10000):
+        self.log_path = path.with_suffix(".wal")
+        self.rotated_log_path = path.with_suffix(".wal.old")
+        self.compact_records = compact_records
+        self.jobs: Dict[str, dict] = {}
+        self.log_identity: Optional[Tuple[int, int]] = None
+        # The file lock's sequence number as of the last replay. Compaction
+        # and save() bump it, since a new log can reuse an old one's inode.
+        self.log_epoch = 0
+        self.log_offset = 0
+        self.log_records = 0
+        self.log_dirty_tail = False
+        self.compacting = False
+        self.compact_lock_path = path.with_suffix(".wal.lock")
+        self.compactions = 0
+        self.replayed_records = 0
+        self.replay_seconds = 0.0
+        super().__init__(index, path, committer_options)
+        
+        start = time.perf_counter()
+        with self.lock:
+            self.replayed_records = self._replay()
+        self.replay_seconds = time.perf_counter() - start
+        
+        # Compacting an oversized log up front keeps the next startup's replay
+        # bounded by roughly `compact_records` records.
+        if self.log_records >= self.compact_records:
+            self.compact()
+    
+    def _log_stat(self) -> Optional[os.stat_result]:
+        try:
+            return os.stat(self.log_path)
+        except FileNotFoundError:
+            return None
+    
+    def _replay(self) -> int:
+        # Read first: if a compaction lands during the replay, the epoch no
+        # longer matches afterwards and the next refresh replays again.
+        self.log_epoch = self.file_lock.sequence()
+        jobs = {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+                jobs = data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, IOError):
+            jobs = {}
+        
+        self.jobs = jobs
+        records = 0
+        if self.rotated_log_path.exists():
+            records += self._apply_log(self.rotated_log_path, 0)[0]
+        
+        stat = self._log_stat()
+        self.log_identity = (stat.st_dev, stat.st_ino) if stat else None
+        self.log_offset = 0
+        self.log_records = 0
+        self.log_dirty_tail = False
+        if stat:
+            applied, self.log_offset, self.log_dirty_tail = self._apply_log(self.log_path, 0)
+            self.log_records = applied
+            records += applied
+        return records
+    
+    def _apply_log(self, path: Path, offset: int, changes: Optional[dict] = None) -> Tuple[int, int, bool]:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        
+        # A trailing line without a newline is a write still in progress (or
+        # torn by a crash); it is left unconsumed until it is complete.
+        lines = data.split(b"\n")
+        consumed = len(data) - len(lines[-1])
+        applied = 0
+        for line in lines[:-1]:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                job_id = record["id"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if record.get("job") is None:
+                self.jobs.pop(job_id, None)
+            else:
+                self.jobs[job_id] = record["job"]
+            if changes is not None:
+                changes[job_id] = record.get("job")
+            applied += 1
+        return applied, offset + consumed, bool(lines[-1])
+    
+    def _refresh(self) -> Optional[Dict[str, Optional[dict]]]:
+        # Returns the records tailed from the log, or None if the shard had
+        # to be replayed from its snapshot.
+        epoch = self.file_lock.sequence()
+        stat = self._log_stat()
+        identity = (stat.st_dev, stat.st_ino) if stat else None
+        if epoch != self.log_epoch or identity != self.log_identity or (stat and stat.st_size < self.log_offset):
+            # Another process compacted the log; rebuild from its snapshot.
+            self._replay()
+            return None
+        changes: Dict[str, Optional[dict]] = {}
+        if stat and stat.st_size > self.log_offset:
+            applied, self.log_offset, self.log_dirty_tail = self._apply_log(self.log_path, self.log_offset, changes)
+            self.log_records += applied
+        return changes
+    
+    def _reload(self) -> Optional[Dict[str, Optional[dict]]]:
+        return self._refresh()
+    
+    def _ensure_file(self):
+        if not self.path.exists():
+            atomic_write(self.path, json.dumps({}))
+    
+    def _read_file(self) -> Dict[str, dict]:
+        with self.lock:
+            self._absorb(self._refresh())
+            return self.jobs
+    
+    def _stat_paths(self) -> List[Path]:
+        return [self.path, self.log_path]
+    
+    def _stream_file(self) -> Iterator[Tuple[str, dict]]:
+        # The log is replayed into memory anyway, so there is nothing to stream.
+        with self.lock:
+            jobs = list(self._read_file().items())
+        yield from jobs
+    
+    def _write_batch(self, ops: Dict[str, Optional[dict]], sync: bool, expected: Dict[str, Optional[dict]]) -> List[str]:
+        # Appends from all processes are serialized by the shard's file lock,
+        # so the log tailed here is the whole log: a conditional write (a
+        # claim) that still matches it is the one that wins.
+        with self.file_lock, self.lock:
+            self._absorb(self._refresh())
+            rejected = [job_id for job_id, job_data in expected.items() if self.jobs.get(job_id) != job_data]
+            if rejected:
+                ops = {job_id: job_data for job_id, job_data in ops.items() if job_id not in rejected}
+            if not ops:
+                return rejected
+            lines = [json.dumps({"id": job_id, "job": job_data}) for job_id, job_data in ops.items()]
+            payload = ("\n".join(lines) + "\n").encode("utf-8")
+            previous_stamp = self.file_stamp()
+            if self.log_dirty_tail:
+                payload = b"\n" + payload
+            fd = os.open(str(self.log_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload)
+                if sync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            # Tails this batch's own records, which the view already holds.
+            self._absorb(self._refresh())
+            self.stamp = self.file_stamp()
+            if self._search_index():
+                self.search_index.apply(self.index, ops, previous_stamp, self.file_stamp())
+            needs_compaction = self.log_records >= self.compact_records and not self.compacting
+            if needs_compaction:
+                self.compacting = True
+        
+        if needs_compaction:
+            threading.Thread(target=self.compact, daemon=True).start()
+        return rejected
+    
+    def _acquire_compact_lock(self) -> bool:
+        try:
+            fd = os.open(str(self.compact_lock_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            try:
+                stale = time.time() - os.stat(self.compact_lock_path).st_mtime > 300
+            except FileNotFoundError:
+                stale = True
+            if not stale:
+                return False
+            self._release_compact_lock()
+            return self._acquire_compact_lock()
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+    
+    def _release_compact_lock(self):
+        try:
+            self.compact_lock_path.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def compact(self):
+        with self.lock:
+            self.compacting = True
+        if not self._acquire_compact_lock():
+            self.compacting = False
+            return
+        
+        try:
+            self._compact()
+        finally:
+            self._release_compact_lock()
+            self.compacting = False
+    
+    def _compact(self):
+        with self.file_lock, self.lock:
+            self._absorb(self._refresh())
+            previous_stamp = self.file_stamp()
+            if self.rotated_log_path.exists():
+                # A previous compaction was interrupted before its snapshot landed.
+                atomic_write(self.path, json.dumps(self.jobs, indent=2))
+                self.rotated_log_path.unlink()
+            if not self.log_identity:
+                return
+            os.replace(self.log_path, self.rotated_log_path)
+            self.log_epoch = self.file_lock.bump()
+            rotated_offset = self.log_offset
+            snapshot = dict(self.jobs)
+            self.log_identity = None
+            self.log_offset = 0
+            self.log_records = 0
+            self.log_dirty_tail = False
+        
+        atomic_write(self.path, json.dumps(snapshot, indent=2))
+        
+        with self.file_lock, self.lock:
+            # Records another process appended to the old log after the
+            # rotation are carried over so they survive the truncation.
+            with open(self.rotated_log_path, 'rb') as f:
+                f.seek(rotated_offset)
+                leftover = f.read()
+            leftover = leftover[:len(leftover) - len(leftover.split(b"\n")[-1])]
+            if leftover.strip():
+                fd = os.open(str(self.log_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, leftover)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            self.rotated_log_path.unlink()
+            self.file_lock.bump()
+            self._absorb(self._refresh())
+            if self._search_index():
+                # The contents are unchanged; only the files behind them moved.
+                self.search_index.apply(self.index, {}, previous_stamp, self.file_stamp())
+            self.compactions += 1
+    
+    def save(self, jobs: Dict[str, dict]):
+        self.committer.flush()
+        with self.file_lock, self.lock:
+            try:
+                atomic_write(self.path, json.dumps(jobs, indent=2))
+                for path in (self.log_path, self.rotated_log_path):
+                    if path.exists():
+                        path.unlink()
+            except OSError as e:
+                raise RuntimeError(f"Failed to save jobs: {e}")
+            self.log_epoch = self.file_lock.bump()
+            self.jobs = dict(jobs)
+            self.log_identity = None
+            self.log_offset = 0
+            self.log_records = 0
+            self.log_dirty_tail = False
+            self.stamp = self.file_stamp()
+            self.view_resets = None
+            if self._search_index():
+                self.search_index.rebuild_shard(self.index, self.jobs, self.file_stamp())
+    
+    def remove(self):
+        self.file_lock.close()
+        for path in (self.path, self.log_path, self.rotated_log_path, self.compact_lock_path, self.file_lock.path):
+            if path.exists():
+                path.unlink()
+    
+    def stats(self) -> Dict[str, float]:
+        return {
+            "replayed_records": self.replayed_records,
+            "replay_seconds": self.replay_seconds,
+            "log_records": self.log_records,
+            "compactions": self.compactions
+        }
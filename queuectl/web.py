@@ -1,11 +1,18 @@
+import hashlib
 import os
+import time
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 from flask_cors import CORS
-from .storage import JobStorage
+from .storage import open_storage, parse_duration
 from .models import Job, JobState
-from .worker import WorkerManager
 from .config import Config
+from .cache import ResultCache
+from .executor import top_resource_consumers
+from .retry import RetryPolicy
+from .transfer import export_stream
+from .schedule import ScheduleStore
+from .supervisor import send_command
 
 module_dir = Path(__file__).parent
 template_dir = module_dir / 'templates'
@@ -16,9 +23,39 @@ app = Flask(__name__,
             static_folder=str(static_dir))
 CORS(app)
 
-storage = JobStorage()
 app_config = Config()
-worker_manager = WorkerManager(storage, app_config)
+storage = open_storage(app_config)
+# Built when workers are first started from the dashboard, along with its
+# supervisor, result cache, circuit breaker and scheduler.
+_worker_manager = None
+
+
+def get_worker_manager():
+    global _worker_manager
+    if _worker_manager is None:
+        from .worker import WorkerManager
+        _worker_manager = WorkerManager(storage, app_config)
+    return _worker_manager
+
+
+def _local_workers():
+    # The worker manager, if this process is running workers.
+    if _worker_manager is not None and _worker_manager.running:
+        return _worker_manager
+    return None
+
+
+def _worker_stats():
+    # Workers started here are asked directly; otherwise whichever process
+    # runs `queuectl worker start` answers over its control socket.
+    manager = _local_workers()
+    if manager:
+        return manager.stats()
+    try:
+        stats = send_command("stats")
+    except RuntimeError:
+        return None
+    return stats if stats and "error" not in stats else None
 
 
 @app.route('/')
@@ -28,33 +65,66 @@ def index():
 
 @app.route('/api/status')
 def get_status():
-    all_jobs = storage.get_all_jobs()
-    
-    counts = {
-        "pending": 0,
-        "processing": 0,
-        "completed": 0,
-        "failed": 0,
-        "dead": 0
-    }
-    
-    for job in all_jobs:
-        counts[job.state.value] = counts.get(job.state.value, 0) + 1
+    counts = storage.count_by_state()
     
     return jsonify({
-        "total_jobs": len(all_jobs),
+        "total_jobs": sum(counts.values()),
         "pending": counts['pending'],
         "processing": counts['processing'],
         "completed": counts['completed'],
         "failed": counts['failed'],
         "dead": counts['dead'],
-        "active_workers": worker_manager.get_active_worker_count()
+        "active_workers": (_worker_stats() or {}).get("active_count", 0),
+        "storage": dict(backend=storage.backend, read_cache=storage.cache_stats(), **storage.backend_stats())
     })
 
 
+# Job listings leave out output and item lists; the detail view loads them.
+LIST_OMITTED_FIELDS = ("stdout", "stderr", "items", "item_status")
+
+# Bounds on what a remote worker may ask for in one claim or heartbeat.
+MAX_CLAIM_LIMIT = 100
+MAX_CLAIM_WAIT = 30.0
+MAX_LEASE_SECONDS = 24 * 3600
+
+
+def _paged_jobs(state):
+    # With `limit` the listing is paged and returns a summary of each job.
+    # An unchanged store answers a repeated request with 304 Not Modified,
+    # so a dashboard polling an idle queue costs a few stat calls.
+    try:
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = min(max(1, request.args.get('limit', 100, type=int)), 1000)
+        states = [JobState(state)] if state else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    etag = hashlib.sha1(f"{storage.version()}:{state}:{offset}:{limit}".encode("utf-8")).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    total, jobs = storage.page_jobs(states, offset, limit)
+    response = jsonify({
+        "total": total,
+        "offset": offset,
+        "jobs": [
+            {key: value for key, value in job.to_dict().items() if key not in LIST_OMITTED_FIELDS}
+            for job in jobs
+        ]
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/api/jobs')
 def get_jobs():
     state = request.args.get('state')
+    if 'limit' in request.args or 'offset' in request.args:
+        return _paged_jobs(state)
     
     if state:
         try:
@@ -86,13 +156,68 @@ def enqueue_job():
         command=data['command'],
         max_retries=data.get('max_retries', app_config.get('max_retries', 3)),
         priority=data.get('priority', 5),
-        run_at=data.get('run_at')
+        run_at=data.get('run_at'),
+        idempotency_key=data.get('idempotency_key'),
+        cache_ttl=data.get('cache_ttl'),
+        depends_on=data.get('depends_on'),
+        limits=data.get('limits'),
+        retry_policy=data.get('retry_policy'),
+        items=data.get('items'),
+        item_mode=data.get('item_mode'),
+        batch_size=data.get('batch_size')
     )
     
-    storage.save_job(job)
+    try:
+        RetryPolicy.for_job(job, app_config)
+        job, created = storage.enqueue_job(job)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not created:
+        return jsonify(dict(job.to_dict(), deduplicated=True)), 200
     return jsonify(job.to_dict()), 201
 
 
+@app.route('/api/jobs/search')
+def search_jobs():
+    state = request.args.get('state')
+    limit = request.args.get('limit', type=int)
+    time_field = request.args.get('by', 'created')
+    if time_field not in ('created', 'completed'):
+        return jsonify({"error": "by must be 'created' or 'completed'"}), 400
+    
+    try:
+        jobs = storage.search_jobs(
+            text=request.args.get('q'),
+            states=[JobState(state)] if state else None,
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            time_field=f"{time_field}_at",
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify([job.to_dict() for job in jobs])
+
+
+@app.route('/api/jobs/export')
+def export_jobs():
+    try:
+        states = [JobState(state) for state in request.args.getlist('state')]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    # Jobs are streamed as they are read, so an export of any size never
+    # sits in memory on the server.
+    chunks = export_stream(storage.iter_jobs(states or None), compress=compress)
+    filename = "jobs.jsonl.gz" if compress else "jobs.jsonl"
+    return Response(
+        stream_with_context(chunks),
+        mimetype="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 @app.route('/api/jobs/<job_id>')
 def get_job(job_id):
     job = storage.get_job(job_id)
@@ -120,6 +245,21 @@ def get_job_output(job_id):
         })
 
 
+@app.route('/api/jobs/<job_id>/items')
+def get_job_items(job_id):
+    job = storage.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if job.fanout:
+        return jsonify(storage.fanout_progress(job))
+    if job.items is not None:
+        status = job.item_status or "." * len(job.items)
+        labels = {"+": "succeeded", "-": "failed", ".": "pending"}
+        return jsonify([{"item": item, "status": labels[mark]} for item, mark in zip(job.items, status)])
+    return jsonify({"error": "Job has no items"}), 400
+
+
 @app.route('/api/jobs/<job_id>/retry', methods=['POST'])
 def retry_job(job_id):
     job = storage.get_job(job_id)
@@ -130,14 +270,35 @@ def retry_job(job_id):
     if job.state != JobState.DEAD:
         return jsonify({"error": "Job is not in Dead Letter Queue"}), 400
     
-    job.state = JobState.PENDING
-    job.attempts = 0
-    job.error_message = None
-    job.next_retry_at = None
-    job.updated_at = job._now()
-    
-    storage.save_job(job)
-    return jsonify(job.to_dict())
+    if not storage.retry_dead_jobs(job_ids=[job_id]):
+        return jsonify({"error": "Job changed while it was being retried"}), 409
+    return jsonify(storage.get_job(job_id).to_dict())
+
+
+@app.route('/api/schedules')
+def get_schedules():
+    return jsonify(list(ScheduleStore().load().values()))
+
+
+@app.route('/api/schedules', methods=['POST'])
+def add_schedule():
+    data = request.json
+    if not data:
+        return jsonify({"error": "Schedule must have 'id' and 'command' fields"}), 400
+    try:
+        if data.get('retry_policy') is not None:
+            RetryPolicy.for_job(Job(job_id='', command='', retry_policy=data['retry_policy']), app_config)
+        definition = ScheduleStore().add(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(definition), 201
+
+
+@app.route('/api/schedules/<schedule_id>', methods=['DELETE'])
+def delete_schedule(schedule_id):
+    if not ScheduleStore().remove(schedule_id):
+        return jsonify({"error": "Schedule not found"}), 404
+    return jsonify({"message": f"Schedule '{schedule_id}' removed"})
 
 
 @app.route('/api/dlq')
@@ -146,6 +307,68 @@ def get_dlq():
     return jsonify([job.to_dict() for job in dead_jobs])
 
 
+def _bulk_filters(data):
+    states = data.get('states')
+    older_than = data.get('older_than')
+    return {
+        "states": [JobState(state) for state in states] if states else None,
+        "error_contains": data.get('error_contains'),
+        "since": data.get('since'),
+        "until": data.get('until'),
+        "older_than": parse_duration(older_than) if older_than is not None else None
+    }
+
+
+@app.route('/api/dlq/retry', methods=['POST'])
+def retry_dlq_jobs():
+    data = request.json or {}
+    rate = data.get('rate')
+    if rate is not None and (not isinstance(rate, (int, float)) or rate <= 0):
+        return jsonify({"error": "rate must be a positive number"}), 400
+    
+    try:
+        retried = storage.retry_dead_jobs(
+            job_ids=data.get('job_ids'),
+            error_contains=data.get('error_contains'),
+            since=data.get('since'),
+            until=data.get('until'),
+            rate=rate
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": len(retried), "job_ids": retried})
+
+
+@app.route('/api/dlq/purge', methods=['POST'])
+def purge_dlq():
+    data = dict(request.json or {}, states=[JobState.DEAD.value])
+    try:
+        deleted = storage.delete_jobs(**_bulk_filters(data))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": len(deleted), "job_ids": deleted})
+
+
+@app.route('/api/jobs/bulk', methods=['POST'])
+def bulk_jobs():
+    data = request.json or {}
+    action = data.get('action')
+    if action not in ('delete', 'cancel'):
+        return jsonify({"error": "action must be 'delete' or 'cancel'"}), 400
+    if action == 'delete' and not data.get('states'):
+        return jsonify({"error": "Bulk delete requires 'states'"}), 400
+    
+    try:
+        filters = _bulk_filters(data)
+        if action == 'delete':
+            job_ids = storage.delete_jobs(**filters)
+        else:
+            job_ids = storage.cancel_jobs(**filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": len(job_ids), "job_ids": job_ids})
+
+
 @app.route('/api/config')
 def get_config():
     all_config = app_config.get_all()
@@ -156,31 +379,14 @@ def get_config():
 def set_config():
     data = request.json
     
-    if not data or 'key' not in data or 'value' not in data:
+    if not isinstance(data, dict) or not isinstance(data.get('key'), str) or 'value' not in data:
         return jsonify({"error": "Must provide 'key' and 'value'"}), 400
     
     key = data['key']
     value = data['value']
     
-    key_map = {
-        "max-retries": "max_retries",
-        "backoff-base": "backoff_base",
-        "worker-poll-interval": "worker_poll_interval",
-        "job-timeout": "job_timeout"
-    }
-    
-    internal_key = key_map.get(key, key)
-    
     try:
-        if internal_key in ["max_retries", "job_timeout"]:
-            value = int(value)
-        elif internal_key in ["backoff_base", "worker_poll_interval"]:
-            value = float(value)
-    except ValueError:
-        return jsonify({"error": f"Invalid value type for '{key}'"}), 400
-    
-    try:
-        app_config.set(internal_key, value)
+        _, value = app_config.set_option(key, value)
         return jsonify({"success": True, "key": key, "value": value})
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
@@ -188,43 +394,255 @@ def set_config():
 
 @app.route('/api/workers/start', methods=['POST'])
 def start_workers():
-    data = request.json or {}
+    data = _json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
     count = data.get('count', 1)
+    min_workers = data.get('min')
+    max_workers = data.get('max')
     
+    if not _is_int(count) or any(bound is not None and not _is_int(bound) for bound in (min_workers, max_workers)):
+        return jsonify({"error": "count, min and max must be integers"}), 400
     if count < 1:
         return jsonify({"error": "Worker count must be at least 1"}), 400
     
-    if worker_manager.running:
+    if _local_workers():
         return jsonify({"error": "Workers are already running"}), 400
     
     try:
-        worker_manager.start_workers(count)
+        if min_workers is not None or max_workers is not None:
+            min_workers = min_workers if min_workers is not None else 1
+            max_workers = max_workers if max_workers is not None else max(min_workers, count)
+            if min_workers < 1 or max_workers < min_workers:
+                return jsonify({"error": "Autoscale bounds must satisfy 1 <= min <= max"}), 400
+            get_worker_manager().start_autoscale(min_workers, max_workers)
+            return jsonify({
+                "success": True,
+                "message": f"Autoscaling between {min_workers} and {max_workers} worker(s)",
+                "count": min_workers
+            })
+        
+        get_worker_manager().start_workers(count)
         return jsonify({"success": True, "message": f"Started {count} worker(s)", "count": count})
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _supervisor_command(command, **params):
+    try:
+        reply = send_command(command, **params)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 502
+    if reply is None:
+        return jsonify({"error": "No workers are running"}), 400
+    if "error" in reply:
+        return jsonify(reply), 400
+    return jsonify(reply)
+
+
 @app.route('/api/workers/stop', methods=['POST'])
 def stop_workers():
-    if not worker_manager.running:
-        return jsonify({"error": "No workers are running"}), 400
+    manager = _local_workers()
+    if not manager:
+        return _supervisor_command("stop")
     
     try:
-        worker_manager.stop_workers()
+        manager.stop_workers()
         return jsonify({"success": True, "message": "All workers stopped"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/workers/drain', methods=['POST'])
+def drain_workers():
+    manager = _local_workers()
+    if not manager:
+        return _supervisor_command("drain")
+    
+    # Answered right away, as over the socket; draining waits for every job.
+    manager.supervisor.handle({"command": "drain"})
+    return jsonify({"success": True, "message": "Workers are draining"})
+
+
+@app.route('/api/workers/scale', methods=['POST'])
+def scale_workers():
+    count = (request.json or {}).get('count')
+    manager = _local_workers()
+    if not manager:
+        return _supervisor_command("scale", count=count)
+    
+    try:
+        return jsonify(manager.supervisor.handle({"command": "scale", "count": count}))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @app.route('/api/workers/status')
 def get_workers_status():
+    stats = _worker_stats()
+    if not stats:
+        return jsonify({
+            "running": False,
+            "active_count": 0,
+            "total_workers": 0,
+            "autoscale": None,
+            "circuits": _worker_manager.circuit_status() if _worker_manager else [],
+            "workers": []
+        })
+    
     return jsonify({
-        "running": worker_manager.running,
-        "active_count": worker_manager.get_active_worker_count(),
-        "total_workers": len(worker_manager.workers)
+        "running": stats["running"],
+        "pid": stats["pid"],
+        "active_count": stats["active_count"],
+        "total_workers": len(stats["workers"]),
+        "autoscale": stats["autoscale"],
+        "circuits": stats["circuits"],
+        "workers": stats["workers"] + stats["retiring"]
     })
 
 
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _json_object():
+    # The request body as a dict, or None when it is missing, not JSON or
+    # not an object.
+    data = request.get_json(silent=True)
+    if data is None and not request.get_data():
+        return {}
+    return data if isinstance(data, dict) else None
+
+
+def _job_ids(data):
+    job_ids = data.get('job_ids', [])
+    if not isinstance(job_ids, list) or not all(isinstance(job_id, str) for job_id in job_ids):
+        raise ValueError("job_ids must be a list of strings")
+    return job_ids
+
+
+def _lease_seconds(data) -> float:
+    lease_seconds = data.get('lease_seconds')
+    if lease_seconds is None:
+        return app_config.get('worker_lease_seconds', 600)
+    if not _is_number(lease_seconds) or not lease_seconds > 0:
+        raise ValueError("lease_seconds must be a positive number")
+    return min(lease_seconds, MAX_LEASE_SECONDS)
+
+
+@app.route('/api/claim', methods=['POST'])
+def claim_jobs():
+    data = request.json or {}
+    worker_id = data.get('worker_id')
+    if not worker_id:
+        return jsonify({"error": "worker_id is required"}), 400
+    
+    limit = data.get('limit', 1)
+    wait = data.get('wait', 0)
+    paused = data.get('paused')
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    if not _is_number(wait) or not wait >= 0:
+        return jsonify({"error": "wait must be a non-negative number"}), 400
+    if paused is not None and (
+        not isinstance(paused, dict) or not all(isinstance(count, int) for count in paused.values())
+    ):
+        return jsonify({"error": "paused must map error signatures to counts"}), 400
+    try:
+        lease_seconds = _lease_seconds(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    limit = min(limit, MAX_CLAIM_LIMIT)
+    deadline = time.monotonic() + min(wait, MAX_CLAIM_WAIT)
+    
+    # Long poll: hold the request until a job is ready or the wait runs out.
+    # Enqueues through this server wake it at once; other processes' writes
+    # are noticed on the next short wait.
+    while True:
+        jobs = storage.claim_jobs(limit, worker_id, lease_seconds, paused=paused)
+        remaining = deadline - time.monotonic()
+        if jobs or remaining <= 0:
+            break
+        storage.wait_for_work(min(remaining, 0.5))
+    
+    return jsonify({"jobs": [job.to_dict() for job in jobs]})
+
+
+@app.route('/api/heartbeat', methods=['POST'])
+def heartbeat():
+    data = _json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    worker_id = data.get('worker_id')
+    if not worker_id or not isinstance(worker_id, str):
+        return jsonify({"error": "worker_id is required"}), 400
+    
+    try:
+        job_ids = _job_ids(data)
+        lease_seconds = _lease_seconds(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    held = storage.extend_leases(job_ids, worker_id, lease_seconds)
+    return jsonify({"held": held})
+
+
+@app.route('/api/complete', methods=['POST'])
+def complete_jobs():
+    data = _json_object()
+    results = data.get('jobs', []) if data is not None else None
+    if not isinstance(results, list) or not all(
+        isinstance(result, dict) and isinstance(result.get('id'), str) and isinstance(result.get('worker_id'), str)
+        for result in results
+    ):
+        return jsonify({"error": "jobs must be a list of results with an id and worker_id"}), 400
+    
+    # Only the outcome of the run is taken from the worker, and only while
+    # it still holds the lease; otherwise the job was reclaimed and may
+    # already be running elsewhere.
+    try:
+        saved, rejected = storage.save_results(results)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid result: {e}"}), 400
+    
+    if saved:
+        storage.history.record_results(saved, storage.queue_depth())
+        for job in saved:
+            storage.tracer.record(job.id, "persisted", worker=job.worker_id, cached=job.cache_hit)
+    response = {"saved": [job.id for job in saved], "rejected": rejected}
+    if rejected:
+        response["error"] = "Lease no longer held for: " + ", ".join(rejected)
+        return jsonify(response), 409
+    return jsonify(response)
+
+
+@app.route('/api/release', methods=['POST'])
+def release_jobs():
+    data = _json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    worker_id = data.get('worker_id')
+    try:
+        job_ids = _job_ids(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    jobs = [job for job in (storage.get_job(job_id) for job_id in job_ids) if job]
+    storage.release_jobs(jobs, worker_id)
+    return jsonify({"released": [job.id for job in jobs]})
+
+
+@app.route('/api/ready')
+def get_ready_stats():
+    depth, oldest_wait = storage.ready_stats()
+    return jsonify({"depth": depth, "oldest_wait": round(oldest_wait, 3)})
+
+
 @app.route('/api/metrics')
 def get_metrics():
     all_jobs = storage.get_all_jobs()
@@ -266,12 +684,24 @@ def get_metrics():
                 "job_id": slowest_job.id if slowest_job else None,
                 "time": round(slowest_job.execution_time, 3) if slowest_job else None
             }
-        }
+        },
+        "top_consumers": top_resource_consumers(all_jobs),
+        "result_cache": ResultCache(max_entries=app_config.get("result_cache_max_entries", 1000)).stats()
     }
     
     return jsonify(metrics)
 
 
+@app.route('/api/metrics/timeseries')
+def get_metrics_timeseries():
+    # Throughput, latency and queue depth over the last `window`, per second
+    # for windows up to ten minutes and per minute beyond that.
+    try:
+        return jsonify(storage.history.series(parse_duration(request.args.get('window', '10m'))))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @app.route('/api/jobs/<job_id>', methods=['DELETE'])
 def delete_job(job_id):
     job = storage.get_job(job_id)
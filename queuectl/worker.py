@@ -1,33 +1,68 @@
 import os
 import signal
+import socket
 import sys
 import time
 import threading
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from .storage import JobStorage
 from .models import Job, JobState
-from .executor import JobExecutor
+from .executor import JobExecutor, LIMIT_FAILURES, RESOURCE_FIELDS
 from .config import Config
+from .autoscale import Autoscaler
+from .cache import ResultCache
+from .commit import try_lock_file, unlock_file
+from .retry import CircuitBreaker, RetryPolicy, error_signature
+from .schedule import Scheduler
+from .timeseries import MetricsHistory
+from .trace import Tracer, trace_clock
+from .supervisor import Supervisor
 from datetime import datetime, timedelta, timezone
 
 
 class Worker:
     
-    def __init__(self, worker_id: int, storage: JobStorage, config: Config):
+    def __init__(
+        self,
+        worker_id: int,
+        storage: JobStorage,
+        config: Config,
+        result_cache: Optional[ResultCache] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        history: Optional[MetricsHistory] = None,
+        tracer: Optional[Tracer] = None
+    ):
         self.worker_id = worker_id
         self.storage = storage
         self.config = config
+        self.result_cache = result_cache
+        self.circuit_breaker = circuit_breaker
+        self.history = history
+        self.tracer = tracer
         self.executor = JobExecutor(config)
         self.running = False
         self.current_job: Optional[Job] = None
         self.thread: Optional[threading.Thread] = None
+        self.lease_owner = f"{socket.gethostname()}:{os.getpid()}:{worker_id}"
+        self.prefetch = max(1, config.get("worker_prefetch", 1))
+        self.report_batch = max(1, config.get("worker_report_batch", 1))
+        self.prefetched: Deque[Tuple[Job, float]] = deque()
+        self.results: List[Job] = []
+        self.started = time.monotonic()
+        self.job_started: Optional[float] = None
+        self.busy_seconds = 0.0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.claim_latencies: Deque[float] = deque(maxlen=100)
     
     def start(self):
         if self.running:
             return
         
         self.running = True
+        self.started = time.monotonic()
         self.thread = threading.Thread(target=self._work_loop, daemon=False)
         self.thread.start()
     
@@ -36,117 +71,306 @@ class Worker:
         if self.thread:
             self.thread.join(timeout=10)
     
+    def drain(self):
+        # Finish the current job and hand back anything prefetched, without
+        # blocking the caller on the worker thread.
+        self.running = False
+    
+    def is_alive(self) -> bool:
+        return bool(self.thread and self.thread.is_alive())
+    
     def _work_loop(self):
         poll_interval = self.config.get("worker_poll_interval", 1.0)
-        backoff_base = self.config.get("backoff_base", 2.0)
         
         while self.running:
             try:
                 job = self._get_next_job()
                 
                 if job:
-                    self._process_job(job, backoff_base)
+                    self._process_job(job)
                 else:
-                    time.sleep(poll_interval)
+                    self._flush_results()
+                    if self.history:
+                        self.history.flush()
+                    if self.tracer:
+                        self.tracer.flush()
+                    self.storage.wait_for_work(poll_interval)
             
             except Exception as e:
                 print(f"Worker {self.worker_id} error: {e}", file=sys.stderr)
                 time.sleep(poll_interval)
+        
+        try:
+            self._release_prefetched()
+            self._flush_results()
+        except Exception as e:
+            print(f"Worker {self.worker_id} error: {e}", file=sys.stderr)
     
     def _get_next_job(self) -> Optional[Job]:
-        pending_jobs = self.storage.get_pending_jobs()
-        if pending_jobs:
-            job = pending_jobs[0]
-            if self._claim_job(job):
-                return job
-        
-        failed_jobs = self.storage.get_failed_jobs()
-        if failed_jobs:
-            job = failed_jobs[0]
-            if self._claim_job(job):
-                return job
+        job_timeout = self.config.get("job_timeout", 300)
+        # A lease must outlive at least one full run of the last prefetched job.
+        lease_seconds = max(self.config.get("worker_lease_seconds", 600), job_timeout * 2)
         
+        if self.prefetched and self.prefetched[0][1] - time.monotonic() < job_timeout:
+            self._flush_results()
+            self._release_prefetched()
+        
+        if not self.prefetched:
+            self._flush_results()
+            allowance = self.circuit_breaker.reserve() if self.circuit_breaker else {}
+            claimed = []
+            claim_started = time.monotonic()
+            try:
+                claimed = self.storage.claim_jobs(self.prefetch, self.lease_owner, lease_seconds, paused=allowance or None)
+            finally:
+                self.claim_latencies.append(time.monotonic() - claim_started)
+                if allowance:
+                    self.circuit_breaker.settle(
+                        allowance, [error_signature(job.error_message, job.failure_reason) for job in claimed]
+                    )
+            deadline = time.monotonic() + lease_seconds
+            self.prefetched.extend((job, deadline) for job in claimed)
+        
+        if self.prefetched:
+            return self.prefetched.popleft()[0]
         return None
     
-    def _claim_job(self, job: Job) -> bool:
-        current_job = self.storage.get_job(job.id)
-        if not current_job or current_job.state != job.state:
-            return False
-        
-        current_job.mark_processing()
-        self.storage.save_job(current_job)
-        return True
+    def _release_prefetched(self):
+        if not self.prefetched:
+            return
+        jobs = [job for job, _ in self.prefetched]
+        self.prefetched.clear()
+        self.storage.release_jobs(jobs, self.lease_owner)
+    
+    def _report(self, job: Job):
+        self.results.append(job)
+        if len(self.results) >= self.report_batch:
+            self._flush_results()
     
-    def _process_job(self, job: Job, backoff_base: float):
+    def _flush_results(self):
+        if not self.results:
+            return
+        self.storage.save_jobs(self.results)
+        if self.history:
+            self.history.record_results(self.results, self.storage.queue_depth())
+        if self.tracer:
+            for job in self.results:
+                self.tracer.record(job.id, "persisted", worker=self.lease_owner, cached=job.cache_hit)
+        self.results = []
+    
+    def _process_job(self, job: Job):
+        self.job_started = time.monotonic()
         self.current_job = job
+        job.started_at = job._now()
+        previous_signature = error_signature(job.error_message, job.failure_reason)
         
         try:
-            success, error_message, execution_data = self.executor.execute(job)
+            cache_key = None
+            cached = None
+            if job.cache_ttl and self.result_cache:
+                cache_key = ResultCache.key_for(job.command)
+                lookup_started = trace_clock()
+                cached = self.result_cache.get(cache_key)
+            
+            if cached:
+                # A hit is recorded like a run in which the lookup stands in
+                # for the process and no resources were used.
+                success, error_message = True, None
+                lookup_finished = trace_clock()
+                execution_data = {
+                    "stdout": cached.get("stdout"),
+                    "stderr": cached.get("stderr"),
+                    "execution_time": lookup_finished - lookup_started,
+                    "spawned_at": lookup_started,
+                    "exited_at": lookup_finished
+                }
+            else:
+                success, error_message, execution_data = self.executor.execute(job)
             
+            job.cache_hit = bool(cached)
             job.stdout = execution_data.get("stdout")
             job.stderr = execution_data.get("stderr")
             job.execution_time = execution_data.get("execution_time")
+            for field in RESOURCE_FIELDS:
+                setattr(job, field, execution_data.get(field))
+            if "item_status" in execution_data:
+                job.item_status = execution_data["item_status"]
+            if self.tracer:
+                for event in ("spawned", "exited"):
+                    if execution_data.get(f"{event}_at") is not None:
+                        self.tracer.record(job.id, event, worker=self.lease_owner, at=execution_data[f"{event}_at"])
             
             if success:
                 job.mark_completed()
-                self.storage.save_job(job)
+                self._report(job)
+                self._record_outcome(previous_signature, None)
+                if cache_key and not job.cache_hit:
+                    self.result_cache.put(cache_key, execution_data, job.cache_ttl)
             else:
                 job.mark_failed(error_message)
+                job.failure_reason = execution_data.get("failure_reason")
                 
-                if job.should_retry():
-                    delay = job.calculate_retry_delay(backoff_base)
-                    next_retry = datetime.now(timezone.utc) + timedelta(seconds=delay)
-                    job.next_retry_at = next_retry.isoformat().replace('+00:00', 'Z')
-                    job.state = JobState.FAILED
-                    self.storage.save_job(job)
+                if job.failure_reason in LIMIT_FAILURES and not self.config.get("retry_limit_breaches", False):
+                    job.mark_dead(f"Resource limit exceeded: {error_message}")
+                    self._report(job)
                 else:
-                    job.mark_dead(f"Max retries ({job.max_retries}) exceeded. Last error: {error_message}")
-                    self.storage.save_job(job)
+                    self._retry_or_bury(job, error_message)
+                self._record_outcome(previous_signature, error_signature(error_message, job.failure_reason))
         
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             job.mark_failed(error_msg)
-            
-            if job.should_retry():
-                delay = job.calculate_retry_delay(backoff_base)
-                next_retry = datetime.now(timezone.utc) + timedelta(seconds=delay)
-                job.next_retry_at = next_retry.isoformat().replace('+00:00', 'Z')
-                job.state = JobState.FAILED
-                self.storage.save_job(job)
-            else:
-                job.mark_dead(error_msg)
-                self.storage.save_job(job)
+            job.failure_reason = "error"
+            self._retry_or_bury(job, error_msg, bury_message=error_msg)
+            self._record_outcome(previous_signature, error_signature(error_msg, job.failure_reason))
         
         finally:
             self.current_job = None
+            self.busy_seconds += time.monotonic() - self.job_started
+            self.job_started = None
+            if job.state == JobState.COMPLETED:
+                self.jobs_done += 1
+            else:
+                self.jobs_failed += 1
+    
+    def _retry_or_bury(self, job: Job, error_message: str, bury_message: Optional[str] = None):
+        if job.should_retry():
+            try:
+                delay = RetryPolicy.for_job(job, self.config).delay(job.attempts)
+            except ValueError as e:
+                print(f"Worker {self.worker_id}: invalid retry policy for job '{job.id}': {e}", file=sys.stderr)
+                delay = job.calculate_retry_delay(self.config.get("backoff_base", 2.0))
+            next_retry = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            job.next_retry_at = next_retry.isoformat().replace('+00:00', 'Z')
+            job.state = JobState.FAILED
+        else:
+            job.mark_dead(bury_message or f"Max retries ({job.max_retries}) exceeded. Last error: {error_message}")
+        self._report(job)
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        job, job_started = self.current_job, self.job_started
+        running_for = now - job_started if job and job_started else 0.0
+        uptime = now - self.started
+        latencies = sorted(self.claim_latencies)
+        if job:
+            state = "busy"
+        else:
+            state = "idle" if self.running else "draining"
+        return {
+            "id": self.worker_id,
+            "state": state,
+            "current_job": job.id if job else None,
+            "current_job_seconds": round(running_for, 3),
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+            "busy_fraction": round((self.busy_seconds + running_for) / uptime, 3) if uptime > 0 else 0.0,
+            "uptime": round(uptime, 1),
+            # Over the last 100 claims, including polls that found nothing.
+            "claim_latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2) if latencies else None
+            }
+        }
+    
+    def _record_outcome(self, previous_signature: Optional[str], signature: Optional[str]):
+        if self.circuit_breaker:
+            self.circuit_breaker.record(previous_signature, signature)
 
 
 class WorkerManager:
     
-    def __init__(self, storage: JobStorage, config: Config, pid_file: str = "worker.pid"):
+    def __init__(
+        self,
+        storage: JobStorage,
+        config: Config,
+        pid_file: Optional[str] = "worker.pid",
+        socket_path: Optional[str] = "worker.sock"
+    ):
         self.storage = storage
         self.config = config
-        self.pid_file = Path(pid_file)
+        self.pid_file = Path(pid_file) if pid_file else None
+        self.pid_fd: Optional[int] = None
+        # Other processes reach these workers through the supervisor's socket;
+        # `stopped` is set once they have all been shut down, from any side.
+        self.supervisor = Supervisor(self, socket_path)
+        self.stopped = threading.Event()
         self.workers: list[Worker] = []
+        self.retiring: list[Worker] = []
         self.running = False
+        self.autoscaler: Optional[Autoscaler] = None
+        self.result_cache = ResultCache(max_entries=config.get("result_cache_max_entries", 1000))
+        self.circuit_breaker = CircuitBreaker(config)
+        # Recurring jobs are materialized by whichever worker process holds
+        # the scheduler lock; remote workers have no local store to fire into.
+        self.scheduler = Scheduler(storage) if isinstance(storage, JobStorage) else None
+        # Remote workers' results are recorded and traced by the server that
+        # stores them, which does not see their spawn and exit times.
+        self.history = storage.history if isinstance(storage, JobStorage) else None
+        self.tracer = storage.tracer if isinstance(storage, JobStorage) else None
+        self._next_worker_id = 1
+        self._lock = threading.Lock()
     
     def start_workers(self, count: int):
         if self.running:
             print("Workers are already running")
             return
         
+        # The pid file stays locked while these workers run, so of two
+        # `worker start`s racing in one directory only one gets past here.
+        if self.pid_file:
+            self.pid_fd = try_lock_file(self.pid_file)
+            if self.pid_fd is None:
+                raise RuntimeError(f"Workers are already running ({self.pid_file} is locked)")
+        try:
+            # Refuses to start while another process's workers are serving the socket.
+            self.supervisor.start()
+        except BaseException:
+            self._release_pid_file()
+            raise
+        self.stopped.clear()
         self.running = True
+        self.add_workers(count)
+        if self.scheduler:
+            self.scheduler.start()
         
-        for i in range(count):
-            worker = Worker(i + 1, self.storage, self.config)
-            worker.start()
-            self.workers.append(worker)
-        
-        with open(self.pid_file, 'w') as f:
-            f.write(str(os.getpid()))
+        if self.pid_fd is not None:
+            os.ftruncate(self.pid_fd, 0)
+            os.write(self.pid_fd, str(os.getpid()).encode())
         
         print(f"Started {count} worker(s)")
     
+    def start_autoscale(self, min_workers: int, max_workers: int):
+        if self.running:
+            print("Workers are already running")
+            return
+        
+        self.start_workers(min_workers)
+        self.autoscaler = Autoscaler(self, min_workers, max_workers)
+        self.autoscaler.start()
+        print(f"Autoscaling between {min_workers} and {max_workers} worker(s)")
+    
+    def add_workers(self, count: int):
+        with self._lock:
+            for _ in range(count):
+                worker = Worker(
+                    self._next_worker_id, self.storage, self.config,
+                    self.result_cache, self.circuit_breaker, self.history, self.tracer
+                )
+                self._next_worker_id += 1
+                worker.start()
+                self.workers.append(worker)
+    
+    def retire_workers(self, count: int):
+        with self._lock:
+            self.retiring = [w for w in self.retiring if w.is_alive()]
+            # Idle workers are retired first so running jobs are not delayed.
+            candidates = sorted(self.workers, key=lambda w: w.current_job is not None)
+            for worker in candidates[:count]:
+                worker.drain()
+                self.workers.remove(worker)
+                self.retiring.append(worker)
+    
     def stop_workers(self):
         if not self.running:
             print("No workers are running")
@@ -154,25 +378,97 @@ class WorkerManager:
         
         print("Stopping workers gracefully...")
         self.running = False
+        if self.autoscaler:
+            self.autoscaler.stop()
+        if self.scheduler:
+            self.scheduler.stop()
         
         max_wait = 30
         start_time = time.time()
         
         while time.time() - start_time < max_wait:
-            all_idle = all(w.current_job is None for w in self.workers)
+            all_idle = all(w.current_job is None for w in self.workers + self.retiring)
             if all_idle:
                 break
             time.sleep(0.5)
         
-        for worker in self.workers:
+        for worker in self.workers + self.retiring:
             worker.stop()
         
         self.workers.clear()
+        self.retiring.clear()
+        self._shutdown()
+        print("All workers stopped")
+    
+    def drain_workers(self):
+        # Unlike stop_workers, waits for every running job however long it takes.
+        if not self.running:
+            print("No workers are running")
+            return
         
-        if self.pid_file.exists():
-            self.pid_file.unlink()
+        print("Draining workers...")
+        self.running = False
+        if self.autoscaler:
+            self.autoscaler.stop()
+        if self.scheduler:
+            self.scheduler.stop()
         
-        print("All workers stopped")
+        with self._lock:
+            workers = self.workers + self.retiring
+            for worker in workers:
+                worker.drain()
+        for worker in workers:
+            if worker.thread:
+                worker.thread.join()
+        
+        self.workers.clear()
+        self.retiring.clear()
+        self._shutdown()
+        print("All workers drained")
+    
+    def _shutdown(self):
+        self.autoscaler = None
+        self.supervisor.close()
+        self._release_pid_file()
+        self.stopped.set()
+    
+    def _release_pid_file(self):
+        if self.pid_fd is not None:
+            unlock_file(self.pid_file, self.pid_fd)
+            self.pid_fd = None
+    
+    def scale_workers(self, count: int) -> int:
+        if not self.running:
+            raise ValueError("No workers are running")
+        if self.autoscaler:
+            raise ValueError("Workers are autoscaled; start them without --min/--max to scale by hand")
+        previous = len(self.workers)
+        if count > previous:
+            self.add_workers(count - previous)
+        elif count < previous:
+            self.retire_workers(previous - count)
+        return previous
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = list(self.workers)
+            self.retiring = [w for w in self.retiring if w.is_alive()]
+            retiring = list(self.retiring)
+        return {
+            "pid": os.getpid(),
+            "running": self.running,
+            "active_count": len([w for w in workers if w.running]),
+            "workers": [w.stats() for w in workers],
+            "retiring": [w.stats() for w in retiring],
+            "autoscale": self.autoscale_status(),
+            "circuits": self.circuit_status()
+        }
     
     def get_active_worker_count(self) -> int:
         return len([w for w in self.workers if w.running])
+    
+    def autoscale_status(self) -> Optional[dict]:
+        return self.autoscaler.status() if self.autoscaler else None
+    
+    def circuit_status(self) -> List[dict]:
+        return self.circuit_breaker.status()
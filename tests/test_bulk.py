@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return JobStorage(str(tmp_path / "jobs.json"), shards=3, durability="write", tracing=False)
+
+
+def _timestamp(seconds_ago):
+    moment = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+    return moment.isoformat().replace('+00:00', 'Z')
+
+
+def _dead(job_id, error, seconds_ago=0):
+    job = Job(job_id, "false", attempts=3)
+    job.mark_dead(error)
+    job.updated_at = _timestamp(seconds_ago)
+    return job
+
+
+def test_dlq_retry_selects_by_error_and_time(storage):
+    storage.save_jobs([
+        _dead("timeout-old", "Command timed out", 7200),
+        _dead("timeout-new", "command TIMED OUT", 60),
+        _dead("crash", "Segmentation fault", 60),
+        Job("pending", "true")
+    ])
+    
+    assert storage.retry_dead_jobs(error_contains="timed out", since=_timestamp(3600)) == ["timeout-new"]
+    job = storage.get_job("timeout-new")
+    assert (job.state, job.attempts, job.error_message) == (JobState.PENDING, 0, None)
+    assert sorted(storage.retry_dead_jobs(job_ids=["crash", "pending", "missing"])) == ["crash"]
+    assert storage.retry_dead_jobs(job_ids=["crash"]) == []
+    assert [job.id for job in storage.get_dead_jobs()] == ["timeout-old"]
+
+
+def test_dlq_retry_with_a_rate_spreads_jobs_out(storage):
+    storage.save_jobs([_dead(f"job-{i}", "boom", 60 - i) for i in range(4)])
+    retried = storage.retry_dead_jobs(rate=2)
+    assert retried == [f"job-{i}" for i in range(4)]
+    run_at = [datetime.fromisoformat(storage.get_job(job_id).run_at.replace('Z', '+00:00')) for job_id in retried]
+    gaps = [(later - earlier).total_seconds() for earlier, later in zip(run_at, run_at[1:])]
+    assert gaps == pytest.approx([0.5, 0.5, 0.5], abs=0.01)
+
+
+def test_bulk_delete_and_purge_keep_unmatched_jobs(storage):
+    storage.save_jobs([
+        _dead("dead-old", "boom", 7200),
+        _dead("dead-new", "boom", 60),
+        Job("pending", "true")
+    ])
+    done = Job("done", "true")
+    done.mark_completed()
+    done.updated_at = _timestamp(7200)
+    storage.save_job(done)
+    
+    assert sorted(storage.delete_jobs(states=[JobState.DEAD, JobState.COMPLETED], older_than=3600)) == ["dead-old", "done"]
+    assert sorted(job.id for job in storage.get_all_jobs()) == ["dead-new", "pending"]
+    assert storage.delete_jobs(states=[JobState.DEAD], error_contains="other") == []
+
+
+def test_cancel_marks_waiting_jobs_dead(storage):
+    storage.save_jobs([Job("waiting", "true"), Job("running", "true", priority=9)])
+    storage.enqueue_job(Job("child", "true", depends_on=["running"]))
+    assert storage.claim_next_job("worker").id == "running"
+    
+    assert sorted(storage.cancel_jobs()) == ["child", "waiting"]
+    for job_id in ("child", "waiting"):
+        job = storage.get_job(job_id)
+        assert (job.state, job.failure_reason) == (JobState.DEAD, "cancelled")
+    assert storage.get_job("running").state == JobState.PROCESSING
+    with pytest.raises(ValueError, match="Only pending and failed"):
+        storage.cancel_jobs(states=[JobState.PROCESSING])
+
+
+def test_bulk_changes_skip_jobs_changed_since_selection(storage):
+    storage.save_jobs([_dead("a", "boom"), _dead("b", "boom")])
+    selected = storage.select_jobs([JobState.DEAD])
+    storage.retry_dead_jobs(job_ids=["a"])
+    
+    expected = {job.id: (job.state.value, job.updated_at) for job in selected}
+    assert storage._apply_bulk(selected, expected, delete=True) == ["b"]
+    assert storage.get_job("a").state == JobState.PENDING
@@ -0,0 +1,43 @@
+from queuectl.cache import ResultCache
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+
+def test_caches_sharing_a_file_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "results_cache.json")
+    first, second = ResultCache(path), ResultCache(path)
+    assert first.get("a") is None
+    first.put("a", {"stdout": "first"}, 60)
+    assert second.get("a")["stdout"] == "first"
+    second.put("b", {"stdout": "second"}, 60)
+    first.put("c", {"stdout": "third"}, 60)
+    first.flush()
+    second.flush()
+    
+    cache = ResultCache(path)
+    assert {key: cache.get(key)["stdout"] for key in "abc"} == {"a": "first", "b": "second", "c": "third"}
+    assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_cache_key_ignores_unrelated_environment(monkeypatch):
+    key = ResultCache.key_for("make report")
+    monkeypatch.setenv("SHLVL", "7")
+    monkeypatch.setenv("TERM_SESSION_ID", "another-shell")
+    assert ResultCache.key_for("make report") == key
+    monkeypatch.setenv("PATH", "/opt/other/bin")
+    assert ResultCache.key_for("make report") != key
+
+
+def test_enqueues_with_one_idempotency_key_collapse_while_in_flight(tmp_path):
+    storage = JobStorage(str(tmp_path / "jobs.json"), durability="write", tracing=False)
+    first, created = storage.enqueue_job(Job("report-1", "true", idempotency_key="daily"))
+    assert created
+    same, created = storage.enqueue_job(Job("report-2", "true", idempotency_key="daily"))
+    assert (same.id, created) == ("report-1", False)
+    assert storage.get_job("report-2") is None
+    
+    first.mark_completed()
+    storage.save_job(first)
+    later, created = storage.enqueue_job(Job("report-3", "true", idempotency_key="daily"))
+    assert (later.id, created) == ("report-3", True)
+    assert storage.get_job("report-3").state == JobState.PENDING
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from queuectl.commit import GroupCommitter
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CLAIMER = """
+import os, sys, time
+from queuectl.storage import JobStorage
+storage = JobStorage("jobs.json", durability="write", backend=sys.argv[1], wal_compact_records=50, tracing=False)
+claimed = []
+idle = 0
+while idle < 20:
+    jobs = storage.claim_jobs(5, f"worker-{os.getpid()}", 600)
+    if not jobs:
+        idle += 1
+        time.sleep(0.02)
+        continue
+    idle = 0
+    for job in jobs:
+        job.mark_completed()
+        claimed.append(job.id)
+    storage.save_jobs(jobs)
+storage.flush()
+print(" ".join(claimed))
+"""
+
+
+def test_committer_rejects_writes_whose_condition_no_longer_holds():
+    stored = {"a": {"v": 1}, "b": {"v": 1}}
+    
+    def write_batch(ops, sync, expected):
+        rejected = [job_id for job_id, job_data in expected.items() if stored.get(job_id) != job_data]
+        for job_id, job_data in ops.items():
+            if job_id not in rejected:
+                stored[job_id] = job_data
+        return rejected
+    
+    committer = GroupCommitter(write_batch, window=0, durability="write")
+    resets = committer.resets
+    ticket = committer.submit({"a": {"v": 2}, "b": {"v": 2}}, {"a": {"v": 1}, "b": {"v": 0}})
+    assert committer.wait(ticket) == {"b"}
+    assert stored == {"a": {"v": 2}, "b": {"v": 1}}
+    assert committer.resets == resets + 1
+    committer.close()
+
+
+def test_conditional_write_loses_to_another_process(tmp_path):
+    first = JobStorage(str(tmp_path / "jobs.json"), durability="write", tracing=False)
+    second = JobStorage(str(tmp_path / "jobs.json"), durability="write", tracing=False)
+    first.save_job(Job("job-1", "true"))
+    first.flush()
+    
+    shard = first.shards[0]
+    seen = shard.load()["job-1"]
+    assert second.claim_next_job("second").id == "job-1"
+    ticket = shard.submit({"job-1": dict(seen, state=JobState.PROCESSING.value, worker_id="first")}, {"job-1": seen})
+    assert shard.committer.wait(ticket) == {"job-1"}
+    assert first.get_job("job-1").worker_id == "second"
+    assert first.claim_next_job("first") is None
+
+
+@pytest.mark.parametrize("backend", ["json", "wal"])
+def test_processes_never_claim_the_same_job(tmp_path, backend):
+    storage = JobStorage(str(tmp_path / "jobs.json"), durability="write", backend=backend, tracing=False)
+    storage.import_jobs(Job(f"job-{i}", "true") for i in range(200))
+    storage.flush()
+    
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    workers = [
+        subprocess.Popen([sys.executable, "-c", CLAIMER, backend], cwd=tmp_path, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    claimed = []
+    for worker in workers:
+        output, _ = worker.communicate(timeout=120)
+        assert worker.returncode == 0
+        claimed.extend(output.split())
+    
+    assert len(claimed) == 200
+    assert len(set(claimed)) == 200
+    storage = JobStorage(str(tmp_path / "jobs.json"), backend=backend, tracing=False)
+    assert storage.count_by_state().get("completed") == 200
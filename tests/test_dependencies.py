@@ -0,0 +1,60 @@
+import pytest
+
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return JobStorage(str(tmp_path / "jobs.json"), shards=3, durability="write", tracing=False)
+
+
+def _finish(storage, job_id, state=JobState.COMPLETED):
+    job = storage.claim_next_job("worker")
+    assert job.id == job_id
+    if state == JobState.COMPLETED:
+        job.mark_completed()
+    else:
+        job.mark_dead("boom")
+    storage.save_job(job)
+
+
+def test_children_become_ready_as_their_parents_complete(storage):
+    storage.enqueue_job(Job("a", "true"))
+    storage.enqueue_job(Job("b", "true", depends_on=["a"]))
+    storage.enqueue_job(Job("c", "true", depends_on=["a"]))
+    storage.enqueue_job(Job("d", "true", depends_on=["b", "c"]))
+    assert [storage.get_job(job_id).unmet_dependencies for job_id in "abcd"] == [0, 1, 1, 2]
+    
+    _finish(storage, "a")
+    assert [storage.get_job(job_id).unmet_dependencies for job_id in "bcd"] == [0, 0, 2]
+    _finish(storage, "b")
+    assert storage.get_job("d").unmet_dependencies == 1
+    _finish(storage, "c")
+    _finish(storage, "d")
+    assert storage.claim_next_job("worker") is None
+
+
+def test_a_dead_parent_fails_its_dependents_transitively(storage):
+    storage.enqueue_job(Job("a", "true"))
+    storage.enqueue_job(Job("b", "true", depends_on=["a"]))
+    storage.enqueue_job(Job("c", "true", depends_on=["b"]))
+    storage.enqueue_job(Job("other", "true", priority=1))
+    
+    _finish(storage, "a", JobState.DEAD)
+    assert [storage.get_job(job_id).state for job_id in "bc"] == [JobState.DEAD, JobState.DEAD]
+    assert storage.get_job("c").error_message == "Dependency 'b' failed"
+    assert {job.id for job in storage.get_dead_jobs()} == {"a", "b", "c"}
+    
+    late, _ = storage.enqueue_job(Job("late", "true", depends_on=["c"]))
+    assert late.state == JobState.DEAD
+    with pytest.raises(ValueError, match="Unknown dependencies"):
+        storage.enqueue_job(Job("orphan", "true", depends_on=["missing"]))
+
+
+def test_deleting_an_unfinished_parent_releases_its_children(storage):
+    storage.enqueue_job(Job("a", "true"))
+    storage.enqueue_job(Job("b", "true", depends_on=["a"]))
+    assert storage.delete_job("a")
+    assert storage.get_job("b").unmet_dependencies == 0
+    assert storage.claim_next_job("worker").id == "b"
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+from queuectl.config import Config
+from queuectl.executor import JobExecutor, resource
+from queuectl.models import Job
+
+pytestmark = pytest.mark.skipif(
+    resource is None or not hasattr(resource, "prlimit"), reason="limits are applied with prlimit"
+)
+
+
+@pytest.fixture
+def executor(tmp_path):
+    return JobExecutor(Config(str(tmp_path / "config.json")))
+
+
+def _run(executor, command, **limits):
+    return executor.execute(Job("job", command, limits=limits))
+
+
+def test_breaches_are_reported_when_the_limit_caused_them(executor):
+    _, message, data = _run(executor, f"{sys.executable} -c 'x = bytearray(400 << 20)'", memory_mb=100)
+    assert data["failure_reason"] == "memory_limit"
+    assert message == "Memory limit of 100 MB exceeded"
+    
+    _, _, data = _run(executor, f"{sys.executable} -c 'while True: pass'", cpu_seconds=1)
+    assert data["failure_reason"] == "cpu_limit"
+    
+    _, _, data = _run(executor, f"{sys.executable} -c 'files = [open(\"/dev/null\") for _ in range(50)]'", max_open_files=8)
+    assert data["failure_reason"] == "open_files_limit"
+
+
+def test_other_crashes_are_not_blamed_on_limits(executor):
+    for signal_name in ("SEGV", "ABRT", "KILL"):
+        _, _, data = _run(executor, f"kill -{signal_name} $$", memory_mb=500, cpu_seconds=30)
+        assert data["failure_reason"] == "exit_code"
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="needs sched_setaffinity")
+def test_niceness_and_affinity_reach_the_command(executor):
+    cpu = min(os.sched_getaffinity(0))
+    command = "cut -d' ' -f19 /proc/self/stat; grep Cpus_allowed_list /proc/self/status"
+    success, _, data = _run(executor, command, nice=4, cpu_affinity=str(cpu))
+    assert success
+    niceness, affinity = data["stdout"].splitlines()
+    assert int(niceness) == min(19, os.getpriority(os.PRIO_PROCESS, 0) + 4)
+    assert affinity.split()[-1] == str(cpu)
+
+
+def test_input_reaches_a_limited_command_intact(executor):
+    job = Job("job", "cat", items=["a", "b c"], item_mode="stdin", limits={"memory_mb": 200})
+    success, _, data = executor.execute(job)
+    assert success
+    assert data["stdout"] == "a\nb c\n"
@@ -0,0 +1,63 @@
+import pytest
+
+from queuectl.config import Config
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+from queuectl.worker import Worker
+
+CHECK_ITEMS = 'for item in {}; do [ "$item" != bad ] || exit 1; done'
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return JobStorage(str(tmp_path / "jobs.json"), shards=2, durability="write", tracing=False)
+
+
+def _run_all(storage, tmp_path):
+    worker = Worker(1, storage, Config(str(tmp_path / "config.json")))
+    while True:
+        job = worker._get_next_job()
+        if job is None:
+            break
+        worker._process_job(job)
+        worker._flush_results()
+
+
+def test_parent_completes_once_every_batch_has(storage, tmp_path):
+    storage.enqueue_job(Job("fan", CHECK_ITEMS, items=["a", "b", "c", "d", "e"], batch_size=2))
+    storage.enqueue_job(Job("after", "true", depends_on=["fan"]))
+    parent = storage.get_job("fan")
+    assert parent.depends_on == ["fan:0", "fan:1", "fan:2"]
+    assert storage.get_job("fan:2").items == ["e"]
+    
+    _run_all(storage, tmp_path)
+    parent = storage.get_job("fan")
+    assert parent.state == JobState.COMPLETED
+    assert (parent.fanout["succeeded"], parent.fanout["failed"]) == (5, 0)
+    assert storage.get_job("after").state == JobState.COMPLETED
+    progress = storage.fanout_progress(parent)
+    assert progress["batches"]["completed"] == 3 and progress["pending"] == 0
+
+
+def test_parent_dies_with_its_first_dead_batch(storage, tmp_path):
+    storage.enqueue_job(Job("fan", CHECK_ITEMS, items=["a", "bad", "c", "d"], batch_size=2, max_retries=1))
+    storage.enqueue_job(Job("after", "true", depends_on=["fan"]))
+    
+    _run_all(storage, tmp_path)
+    batch = storage.get_job("fan:0")
+    assert (batch.state, batch.item_status) == (JobState.DEAD, "+-")
+    parent = storage.get_job("fan")
+    assert parent.state == JobState.DEAD
+    assert parent.error_message.startswith("Batch 'fan:0' failed: 1 of 4 items failed")
+    assert storage.fanout_progress(parent)["failed_items"] == ["bad"]
+    assert storage.get_job("after").state == JobState.DEAD
+
+
+def test_fanout_input_is_validated(storage):
+    with pytest.raises(ValueError, match="non-empty list"):
+        storage.enqueue_job(Job("empty", "true", items=[]))
+    with pytest.raises(ValueError, match="batch_size"):
+        storage.enqueue_job(Job("zero", "true", items=["a"], batch_size=0))
+    storage.enqueue_job(Job("fan:0", "true"))
+    with pytest.raises(ValueError, match="already exists"):
+        storage.enqueue_job(Job("fan", "true", items=["a"]))
@@ -0,0 +1,99 @@
+import pytest
+
+from queuectl import retry
+from queuectl.config import Config
+from queuectl.models import Job
+from queuectl.retry import CircuitBreaker, RetryPolicy, error_signature
+from queuectl.storage import JobStorage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(tmp_path, clock):
+    config = Config(str(tmp_path / "config.json"))
+    for key, value in (("circuit_failure_threshold", 3), ("circuit_window", 60.0), ("circuit_cooldown", 30.0)):
+        config.set(key, value)
+    return CircuitBreaker(config)
+
+
+def test_delays_follow_the_strategy_and_cap():
+    exponential = RetryPolicy(base=2, max_delay=10, jitter="none")
+    assert [exponential.delay(n) for n in range(1, 6)] == [2, 4, 8, 10, 10]
+    assert exponential.delay(10000) == 10
+    assert RetryPolicy("fixed", base=7, jitter="none").delay(5) == 7
+    schedule = RetryPolicy("schedule", schedule=[1, 5, 30], jitter="none")
+    assert [schedule.delay(n) for n in range(0, 6)] == [1, 1, 5, 30, 30, 30]
+    
+    for _ in range(200):
+        assert 0 <= RetryPolicy(base=2, jitter="full").delay(3) <= 8
+        assert 4 <= RetryPolicy(base=2, jitter="equal").delay(3) <= 8
+
+
+def test_job_policies_override_the_config(tmp_path):
+    config = Config(str(tmp_path / "config.json"))
+    config.set("retry_jitter", "none")
+    job = Job("job", "false", retry_policy={"strategy": "fixed", "base": 3})
+    assert RetryPolicy.for_job(job, config).delay(4) == 3
+    with pytest.raises(ValueError, match="Unknown retry policy fields"):
+        RetryPolicy.from_dict({"strategy": "fixed", "bsae": 3})
+    with pytest.raises(ValueError, match="schedule"):
+        RetryPolicy("schedule", schedule=[])
+
+
+def test_signatures_ignore_volatile_details():
+    first = error_signature("Traceback...\nconnect to port 5432 failed after 1.5s", "exit_code")
+    second = error_signature("connect to port 5433 failed after 2s", "exit_code")
+    assert first == second == "exit_code: connect to port # failed after #s"
+    assert error_signature("\n \n") is None
+
+
+def test_circuit_opens_probes_and_closes(breaker, clock):
+    signature = "exit_code: db down"
+    breaker.record(None, signature)
+    breaker.record(signature, signature)
+    clock[0] += 61
+    breaker.record(signature, signature)
+    assert breaker.status() == []
+    breaker.record(signature, signature)
+    breaker.record(signature, signature)
+    assert [circuit["state"] for circuit in breaker.status()] == ["open"]
+    assert breaker.reserve() == {signature: 0}
+    
+    clock[0] += 30
+    assert breaker.reserve() == {signature: 1}
+    assert breaker.reserve() == {signature: 0}
+    breaker.record(signature, signature)
+    assert [circuit["state"] for circuit in breaker.status()] == ["open"]
+    assert breaker.reserve() == {signature: 0}
+    
+    clock[0] += 30
+    allowance = breaker.reserve()
+    breaker.settle(allowance, [])
+    assert breaker.reserve() == {signature: 1}
+    clock[0] += 30
+    assert breaker.reserve() == {signature: 1}
+    breaker.record(signature, None)
+    assert breaker.status() == []
+    assert breaker.reserve() == {}
+
+
+def test_claims_skip_retries_behind_an_open_circuit(tmp_path):
+    storage = JobStorage(str(tmp_path / "jobs.json"), durability="write", tracing=False)
+    jobs = []
+    for i, error in enumerate(["db down at 10:01", "db down at 10:02", "disk full", "db down at 10:03"]):
+        job = Job(f"job-{i}", "false")
+        job.mark_failed(error)
+        job.failure_reason = "exit_code"
+        job.next_retry_at = f"2000-01-01T00:00:0{i}Z"
+        jobs.append(job)
+    storage.save_jobs(jobs)
+    
+    signature = error_signature("db down at 10:01", "exit_code")
+    claimed = storage.claim_jobs(4, "worker", 600, paused={signature: 1})
+    assert [job.id for job in claimed] == ["job-0", "job-2"]
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+import pytest
+
+from queuectl.models import Job
+from queuectl.schedule import ScheduleStore, Scheduler, _parse_time
+from queuectl.storage import JobStorage
+
+
+def _storage(tmp_path):
+    return JobStorage(str(tmp_path / "jobs.json"), shards=2, durability="write", tracing=False)
+
+
+def test_enqueue_never_overwrites_a_job_from_another_process(tmp_path):
+    first, second = _storage(tmp_path), _storage(tmp_path)
+    first.enqueue_job(Job("job", "echo first"))
+    with pytest.raises(ValueError, match="already exists"):
+        second.enqueue_job(Job("job", "echo second"))
+    assert second.get_job("job").command == "echo first"
+    
+    first.enqueue_job(Job("fan", "true"))
+    with pytest.raises(ValueError, match="'fan' already exists"):
+        second.enqueue_job(Job("fan", "true", items=["a", "b"]))
+    assert first.get_job("fan:0") is None and first.get_job("fan:1") is None
+
+
+def test_one_scheduler_holds_the_lock_at_a_time(tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.json"))
+    first, second = Scheduler(_storage(tmp_path), store), Scheduler(_storage(tmp_path), store)
+    assert first._hold_lock() and first._hold_lock()
+    assert not second._hold_lock()
+    first.stop()
+    assert second._hold_lock()
+    assert not first._hold_lock()
+    second.stop()
+
+
+def test_a_fire_reached_by_two_holders_is_enqueued_once(tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.json"))
+    definition = store.add({"id": "tick", "command": "true", "every": "60s"})
+    fire_at = _parse_time(definition["next_fire_at"])
+    schedulers = [Scheduler(_storage(tmp_path), store) for _ in range(2)]
+    for scheduler in schedulers:
+        scheduler._refresh(force=True)
+    storage = schedulers[1].storage
+    checks = []
+    
+    def get_job(job_id):
+        # The second holder checks before the first one's instance lands.
+        checks.append(job_id)
+        return None if len(checks) == 1 else JobStorage.get_job(storage, job_id)
+    
+    storage.get_job = get_job
+    for scheduler in schedulers:
+        scheduler._fire("tick", fire_at + timedelta(seconds=1))
+    
+    instances = [job for job in _storage(tmp_path).get_all_jobs() if job.id.startswith("tick@")]
+    assert len(instances) == 1
+    assert store.load()["tick"]["last_job_id"] == instances[0].id
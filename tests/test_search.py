@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+
+def _storage(tmp_path, backend="json"):
+    return JobStorage(str(tmp_path / "jobs.json"), shards=2, durability="write", backend=backend, tracing=False)
+
+
+@pytest.mark.parametrize("backend", ["json", "wal"])
+def test_writers_started_before_the_index_keep_it_current(tmp_path, backend):
+    writer = _storage(tmp_path, backend)
+    writer.save_jobs([Job("backup-1", "tar czf /tmp/a.tgz /srv"), Job("other", "true")])
+    writer.flush()
+    
+    searcher = _storage(tmp_path, backend)
+    assert [job.id for job in searcher.search_jobs("tar czf")] == ["backup-1"]
+    
+    rebuilds = []
+    rebuild_shard = searcher.search_index.rebuild_shard
+    searcher.search_index.rebuild_shard = lambda *args: (rebuilds.append(args[0]), rebuild_shard(*args))
+    job = writer.get_job("other")
+    job.command = "tar czf /tmp/b.tgz /home"
+    writer.save_jobs([job, Job("backup-3", "tar czf /tmp/c.tgz /etc")])
+    writer.flush()
+    
+    assert sorted(job.id for job in searcher.search_jobs("tar czf")) == ["backup-1", "backup-3", "other"]
+    assert rebuilds == []
+
+
+def test_index_stores_only_searchable_columns(tmp_path):
+    storage = _storage(tmp_path)
+    job = Job("job", "echo hello", items=["x" * 1000])
+    job.mark_dead("exploded")
+    storage.save_job(job)
+    found = storage.search_jobs("exploded", states=[JobState.DEAD])
+    assert [job.items for job in found] == [["x" * 1000]]
+    
+    conn = sqlite3.connect(str(storage.search_index_path))
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+    conn.close()
+    assert columns == ["id", "shard", "state", "created_at", "completed_at", "command", "error_message"]
+
+
+def test_plain_listings_do_not_create_the_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from queuectl import cli
+    monkeypatch.setattr(cli, "_storage", None)
+    monkeypatch.setattr(cli, "_app_config", None)
+    storage = JobStorage("jobs.json", tracing=False)
+    storage.save_jobs([Job(f"job-{i}", "true") for i in range(5)])
+    storage.flush()
+    
+    result = CliRunner().invoke(cli.cli, ["list", "--limit", "2"])
+    assert result.exit_code == 0, result.output
+    assert "job-1" in result.output and "job-2" not in result.output
+    assert not storage.search_index_path.exists()
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Simple commands may cost at most this much on top of a bare interpreter.
+STARTUP_BUDGET = 0.1
+RUNS = 5
+
+# Imported only by the commands that need them.
+HEAVY_MODULES = ("flask", "sqlite3", "subprocess", "queuectl.storage", "queuectl.worker", "queuectl.web")
+
+
+def _best_time(args, cwd):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    best = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=cwd, env=env, capture_output=True)
+        elapsed = time.perf_counter() - start
+        assert result.returncode == 0, result.stderr.decode()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@pytest.mark.parametrize("command", [["--help"], ["config", "show"], ["status"]])
+def test_simple_commands_start_quickly(tmp_path, command):
+    baseline = _best_time(["-c", "pass"], tmp_path)
+    elapsed = _best_time(["-m", "queuectl.cli"] + command, tmp_path)
+    assert elapsed - baseline < STARTUP_BUDGET, (
+        f"queuectl {' '.join(command)} took {elapsed * 1000:.0f}ms "
+        f"({baseline * 1000:.0f}ms for a bare interpreter)"
+    )
+
+
+@pytest.mark.parametrize("code,modules", [
+    ("import queuectl.cli", HEAVY_MODULES),
+    ("from queuectl.cli import cli; cli.main(['--help'], standalone_mode=False)", HEAVY_MODULES),
+    # The dashboard builds its worker stack only when workers are started.
+    ("import queuectl.web", ("queuectl.worker", "queuectl.autoscale")),
+])
+def test_startup_skips_heavy_imports(tmp_path, code, modules):
+    code = (
+        "import sys\n"
+        f"{code}\n"
+        f"sys.stderr.write(' '.join(m for m in {modules!r} if m in sys.modules))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stderr == "", f"imported at startup: {result.stderr}"
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from queuectl.config import Config
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+
+def _storage(tmp_path, **options):
+    options.setdefault("durability", "write")
+    return JobStorage(str(tmp_path / "jobs.json"), **options)
+
+
+def _shard_ids(path):
+    with open(path) as f:
+        return set(json.load(f))
+
+
+@pytest.mark.parametrize("before,after", [(1, 4), (4, 3), (3, 1)])
+def test_changing_shard_count_rebalances_every_job(tmp_path, before, after):
+    storage = _storage(tmp_path, shards=before)
+    storage.save_jobs([Job(f"job-{i}", "true") for i in range(50)])
+    storage.flush()
+    
+    storage = _storage(tmp_path, shards=after)
+    assert sorted(job.id for job in storage.get_all_jobs()) == sorted(f"job-{i}" for i in range(50))
+    files = sorted(p.name for p in tmp_path.glob("jobs*.json"))
+    if after == 1:
+        assert files == ["jobs.json"]
+    else:
+        assert files == sorted(f"jobs.{i}.json" for i in range(after))
+        for shard in storage.shards:
+            assert all(storage._shard_index(job_id) == shard.index for job_id in _shard_ids(shard.path))
+
+
+def test_config_parses_dashed_keys_once(tmp_path):
+    config = Config(str(tmp_path / "config.json"))
+    assert config.set_option("storage-shards", "4") == ("storage_shards", 4)
+    assert config.set_option("trace-enabled", "False") == ("trace_enabled", False)
+    assert config.set_option("backoff_base", 3) == ("backoff_base", 3.0)
+    with pytest.raises(ValueError, match="Invalid value type"):
+        config.set_option("storage-shards", "many")
+    with pytest.raises(ValueError, match="positive integer"):
+        config.set_option("storage-shards", "0")
+    with pytest.raises(ValueError, match="Unknown configuration key"):
+        config.set_option("no-such-key", "1")
+    assert Config(str(tmp_path / "config.json")).get("storage_shards") == 4
+
+
+def test_pages_follow_creation_order_across_shards_and_states(tmp_path):
+    storage = JobStorage(str(tmp_path / "jobs.json"), shards=3, durability="write", tracing=False)
+    jobs = []
+    for i in range(60):
+        job = Job(f"job-{i:02d}", "true")
+        job.created_at = f"2026-01-01T00:00:{59 - i // 2:02d}Z"
+        if i % 3 == 0:
+            job.mark_completed()
+        jobs.append(job)
+    storage.save_jobs(jobs)
+    done = storage.claim_next_job("worker")
+    done.mark_completed()
+    storage.save_job(done)
+    
+    def expected(states):
+        matching = [job for job in storage.get_all_jobs() if not states or job.state in states]
+        return [job.id for job in sorted(matching, key=lambda job: (job.created_at, job.id))]
+    
+    for states in (None, [JobState.COMPLETED], [JobState.PENDING, JobState.PROCESSING]):
+        ids = expected(states)
+        for offset in (0, 1, 7, len(ids) - 1, len(ids), len(ids) + 5):
+            total, page = storage.page_jobs(states, offset, 10)
+            assert total == len(ids)
+            assert [job.id for job in page] == ids[offset:offset + 10]
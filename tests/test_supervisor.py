@@ -0,0 +1,63 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from queuectl.supervisor import send_command, supported
+
+ROOT = Path(__file__).resolve().parent.parent
+
+pytestmark = pytest.mark.skipif(not supported(), reason="the supervisor needs unix sockets")
+
+
+def _start(tmp_path):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.Popen(
+        [sys.executable, "-m", "queuectl.cli", "worker", "start"],
+        cwd=tmp_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+
+def _wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_racing_starts_leave_one_supervisor(tmp_path):
+    supervisors = [_start(tmp_path) for _ in range(3)]
+    try:
+        _wait_for(lambda: sum(process.poll() is not None for process in supervisors) == 2)
+        refused = [process for process in supervisors if process.poll() is not None]
+        for process in refused:
+            assert process.returncode == 1
+            assert "already running" in process.stderr.read()
+        running = next(process for process in supervisors if process.poll() is None)
+        _wait_for(lambda: send_command("stats", socket_path=str(tmp_path / "worker.sock")) is not None)
+        assert (tmp_path / "worker.pid").read_text() == str(running.pid)
+    finally:
+        for process in supervisors:
+            if process.poll() is None:
+                process.kill()
+            process.communicate()
+
+
+def test_sigterm_shuts_down_and_cleans_up(tmp_path):
+    process = _start(tmp_path)
+    try:
+        _wait_for(lambda: (tmp_path / "worker.pid").exists() and (tmp_path / "worker.pid").read_text())
+        _wait_for(lambda: (tmp_path / "schedules.lock").exists())
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=60)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    assert process.returncode == 0
+    assert "All workers stopped" in output
+    for name in ("worker.sock", "worker.pid", "schedules.lock"):
+        assert not (tmp_path / name).exists()
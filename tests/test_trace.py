@@ -0,0 +1,28 @@
+from queuectl import trace
+from queuectl.trace import Tracer
+
+
+def test_processes_rotating_together_keep_the_previous_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace, "ROTATE_BYTES", 200)
+    path = tmp_path / "jobs.trace.jsonl"
+    first, second = Tracer(path), Tracer(path)
+    for i in range(5):
+        first.record(f"old-{i}", "enqueued")
+    first.flush()
+    
+    # The second process sees the full log just before the first one
+    # rotates it, then flushes right after.
+    first.record("new-0", "enqueued")
+    second.record("new-1", "enqueued")
+    sizes = iter([True])
+    
+    def stale_size():
+        if next(sizes, False):
+            first.flush()
+            return trace.ROTATE_BYTES
+        return Tracer._size(second)
+    
+    second._size = stale_size
+    second.flush()
+    
+    assert [event["job"] for event in second.events()] == [f"old-{i}" for i in range(5)] + ["new-0", "new-1"]
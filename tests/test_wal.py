@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+ROOT = Path(__file__).resolve().parent.parent
+
+APPENDER = """
+import sys
+from queuectl.models import Job
+from queuectl.storage import JobStorage
+storage = JobStorage("jobs.json", durability="write", backend="wal", wal_compact_records=20, tracing=False)
+for i in range(300):
+    storage.save_job(Job(f"{sys.argv[1]}-{i}", "true"))
+storage.flush()
+print(storage.shards[0].stats()["compactions"])
+"""
+
+
+def _storage(tmp_path, backend, **options):
+    return JobStorage(str(tmp_path / "jobs.json"), durability="write", backend=backend, tracing=False, **options)
+
+
+def test_switching_backends_keeps_every_job(tmp_path):
+    storage = _storage(tmp_path, "json", shards=2)
+    storage.save_jobs([Job(f"job-{i}", "true") for i in range(20)])
+    storage.flush()
+    
+    storage = _storage(tmp_path, "wal", shards=2)
+    job = storage.get_job("job-3")
+    job.mark_completed()
+    storage.save_jobs([job, Job("job-wal", "true")])
+    storage.flush()
+    assert any(p.suffix == ".wal" for p in tmp_path.iterdir())
+    
+    storage = _storage(tmp_path, "json", shards=2)
+    assert len(storage.get_all_jobs()) == 21
+    assert storage.get_job("job-3").state == JobState.COMPLETED
+    assert not any(p.suffix in (".wal", ".old") for p in tmp_path.iterdir())
+
+
+def test_compaction_keeps_records_appended_concurrently(tmp_path):
+    _storage(tmp_path, "wal")
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    appenders = [
+        subprocess.Popen(
+            [sys.executable, "-c", APPENDER, name],
+            cwd=tmp_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        for name in ("a", "b")
+    ]
+    compactions = 0
+    for appender in appenders:
+        output, errors = appender.communicate(timeout=120)
+        assert appender.returncode == 0, errors
+        compactions += int(output)
+    assert compactions > 0
+    
+    storage = _storage(tmp_path, "wal")
+    assert sorted(job.id for job in storage.get_all_jobs()) == sorted(f"{name}-{i}" for name in "ab" for i in range(300))
@@ -0,0 +1,94 @@
+import pytest
+
+from queuectl.config import Config
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from queuectl import web
+    storage = JobStorage(str(tmp_path / "jobs.json"), durability="write", tracing=False)
+    monkeypatch.setattr(web, "storage", storage)
+    monkeypatch.setattr(web, "app_config", Config(str(tmp_path / "config.json")))
+    client = web.app.test_client()
+    client.storage = storage
+    return client
+
+
+def test_results_land_only_while_the_lease_is_held(client):
+    client.storage.save_jobs([Job("kept", "true"), Job("lost", "true")])
+    kept, lost = client.storage.claim_jobs(2, "worker-a", 600)
+    client.storage.release_jobs([lost], "worker-a")
+    assert client.storage.claim_jobs(1, "worker-b", 600)[0].id == "lost"
+    
+    for job in (kept, lost):
+        job.mark_completed()
+        job.stdout = "done\n"
+    kept_result = dict(kept.result_dict(), command="rm -rf /", max_retries=99)
+    response = client.post("/api/complete", json={"jobs": [kept_result, lost.result_dict()]})
+    assert response.status_code == 409
+    assert response.get_json()["saved"] == ["kept"]
+    assert response.get_json()["rejected"] == ["lost"]
+    
+    saved = client.storage.get_job("kept")
+    assert (saved.state, saved.stdout, saved.command, saved.max_retries) == (JobState.COMPLETED, "done\n", "true", 3)
+    assert client.storage.get_job("lost").worker_id == "worker-b"
+    
+    response = client.post("/api/complete", json={"jobs": [kept.result_dict()]})
+    assert response.status_code == 409
+
+
+def test_failed_results_count_an_attempt(client):
+    client.storage.save_job(Job("job", "false"))
+    job = client.storage.claim_jobs(1, "worker", 600)[0]
+    job.mark_failed("exit 1")
+    response = client.post("/api/complete", json={"jobs": [job.result_dict()]})
+    assert response.status_code == 200
+    saved = client.storage.get_job("job")
+    assert (saved.state, saved.attempts, saved.lease_expires_at) == (JobState.FAILED, 1, None)
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/complete", {"jobs": [1]}),
+    ("/api/complete", [1]),
+    ("/api/complete", {"jobs": {"id": "job"}}),
+    ("/api/complete", {"jobs": [{"id": "job", "worker_id": "worker", "state": "pending"}]}),
+    ("/api/heartbeat", {"worker_id": "worker", "job_ids": 5}),
+    ("/api/heartbeat", {"worker_id": "worker", "job_ids": [5]}),
+    ("/api/release", {"worker_id": "worker", "job_ids": [5]}),
+    ("/api/release", [1]),
+    ("/api/workers/start", {"count": "2"}),
+    ("/api/workers/start", {"count": 2, "max": 2.5}),
+])
+def test_malformed_bodies_are_rejected(client, path, body):
+    if path == "/api/complete":
+        client.storage.save_job(Job("job", "true"))
+        client.storage.claim_jobs(1, "worker", 600)
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    
+    response = client.post(path, data="{", content_type="application/json")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_bulk_endpoints_apply_filters(client):
+    dead = Job("dead", "false")
+    dead.mark_dead("Command timed out")
+    client.storage.save_jobs([dead, Job("pending", "true")])
+    
+    assert client.post("/api/jobs/bulk", json={"action": "delete"}).status_code == 400
+    assert client.post("/api/jobs/bulk", json={"action": "cancel", "states": ["completed"]}).status_code == 400
+    response = client.post("/api/dlq/retry", json={"error_contains": "timed out", "rate": 0})
+    assert response.status_code == 400
+    
+    response = client.post("/api/jobs/bulk", json={"action": "cancel"})
+    assert response.get_json()["job_ids"] == ["pending"]
+    response = client.post("/api/dlq/purge", json={"error_contains": "Cancelled"})
+    assert response.get_json()["job_ids"] == ["pending"]
+    response = client.post("/api/dlq/retry", json={"error_contains": "timed out"})
+    assert response.get_json()["job_ids"] == ["dead"]
+    assert [job.id for job in client.storage.get_all_jobs()] == ["dead"]
@@ -0,0 +1,89 @@
+import time
+
+from queuectl.cache import ResultCache
+from queuectl.config import Config
+from queuectl.models import Job, JobState
+from queuectl.storage import JobStorage
+from queuectl.worker import Worker
+
+
+def _setup(tmp_path, **settings):
+    config = Config(str(tmp_path / "config.json"))
+    config.set("worker_poll_interval", 0.05)
+    for key, value in settings.items():
+        config.set(key, value)
+    storage = JobStorage(str(tmp_path / "jobs.json"), durability="write", tracing=False)
+    return config, storage
+
+
+def _wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_worker_claims_and_reports_in_batches(tmp_path):
+    config, storage = _setup(tmp_path, worker_prefetch=5, worker_report_batch=5)
+    storage.save_jobs([Job(f"job-{i:02d}", "true") for i in range(12)])
+    claims, saves = [], []
+    claim_jobs, save_jobs = storage.claim_jobs, storage.save_jobs
+    
+    def counting_claim(limit, *args, **kwargs):
+        claimed = claim_jobs(limit, *args, **kwargs)
+        if claimed:
+            claims.append((limit, len(claimed)))
+        return claimed
+    
+    def counting_save(jobs):
+        saves.append(len(jobs))
+        save_jobs(jobs)
+    
+    storage.claim_jobs, storage.save_jobs = counting_claim, counting_save
+    worker = Worker(1, storage, config)
+    worker.start()
+    try:
+        _wait_for(lambda: storage.count_by_state().get("completed") == 12)
+    finally:
+        worker.stop()
+    assert claims == [(5, 5), (5, 5), (5, 2)]
+    assert saves == [5, 5, 2]
+
+
+def test_prefetched_jobs_are_released_to_the_queue(tmp_path):
+    config, storage = _setup(tmp_path, worker_prefetch=4)
+    storage.save_jobs([Job(f"job-{i}", "true") for i in range(6)])
+    worker = Worker(1, storage, config)
+    
+    job = worker._get_next_job()
+    assert job.state == JobState.PROCESSING
+    assert len(worker.prefetched) == 3
+    worker._release_prefetched()
+    counts = storage.count_by_state()
+    assert (counts["pending"], counts["processing"]) == (5, 1)
+    assert storage.get_job(job.id).worker_id == worker.lease_owner
+
+
+def test_cache_hits_are_recorded_like_runs(tmp_path):
+    config, _ = _setup(tmp_path)
+    storage = JobStorage(str(tmp_path / "jobs.json"), durability="write")
+    cache = ResultCache(str(tmp_path / "results_cache.json"))
+    worker = Worker(1, storage, config, result_cache=cache, history=storage.history, tracer=storage.tracer)
+    for job_id in ("first", "second"):
+        storage.save_job(Job(job_id, "echo cached", cache_ttl=60))
+        worker._process_job(worker._get_next_job())
+        worker._flush_results()
+    storage.tracer.flush()
+    
+    first, second = storage.get_job("first"), storage.get_job("second")
+    assert (first.cache_hit, second.cache_hit) == (False, True)
+    assert second.stdout == first.stdout == "cached\n"
+    assert second.state == JobState.COMPLETED
+    assert second.execution_time is not None
+    assert second.cpu_user_time is None and second.max_rss_kb is None
+    events = {event["event"]: event for event in storage.tracer.events(job_ids=["second"])}
+    assert {"spawned", "exited", "persisted"} <= set(events)
+    assert events["persisted"].get("cached") is True
+    points = storage.history.series(60)["points"]
+    assert sum(point["completed"] for point in points) == 2
+    assert worker.jobs_done == 2